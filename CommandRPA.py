@@ -1,9 +1,10 @@
 import sys
 import os
 import traceback
-from lib.paramSetting import setParam, getParam, loadParams
+from lib.paramSetting import setParam, getParam, loadParams, saveParamCache
+from lib.shutdownSetting import register_shutdown_hook
 from lib.loggerSetting import setLogger
-from lib.decoratorSetting import instrumented
+from lib.decoratorSetting import instrumented, setInstrumentEnabled
 
 default_init_file_path = 'init.yaml'
 
@@ -38,6 +39,11 @@ def init(init_file_path):
                 file_path = os.path.join(root, filename)
                 loadParams(file_path)
 
+    # 読込結果のキャッシュ(PARAM_CACHE_FILE)は解析したファイルをまとめて保存する
+    # 以降に読み込んだファイル(load等)は終了時に保存する
+    saveParamCache()
+    register_shutdown_hook(saveParamCache)
+
     # ロガー設定
     try:
         setLogger()
@@ -50,6 +56,7 @@ def commandRPA(version):
     """CommandRPAを実行する
     
     sys引数がある場合、第一引数をcommandファイルパスとして読み込む。
+    第一引数が'-'の場合は標準入力からcommandを逐次読み込む。
     sys引数がない場合、対話形式で実行するModeを呼び出す。
     
     Args:
@@ -62,14 +69,15 @@ def commandRPA(version):
     if len(sys.argv) > 1:
         # テキストファイルベースのRPA読み込み
         from readLines import readFile
+        from compileLines import isStreamSource
         
         file_path = sys.argv[1]
         search_dir = getParam('COMMAND_FOLDER', '')
         full_path = os.path.join(search_dir, file_path)
         
-        if   os.path.isfile(file_path):
+        if   os.path.isfile(file_path) or isStreamSource(file_path):
             target_file = file_path
-        elif os.path.isfile(full_path):
+        elif os.path.isfile(full_path) or isStreamSource(full_path):
             target_file = full_path
         else:
             raise FileNotFoundError(f"ファイルが見つかりません: '{file_path}' or '{full_path}'")
@@ -91,12 +99,14 @@ def commandRPA(version):
 # メイン実行
 if __name__ == '__main__':
     # 第二引数(オプション)からparameterの読込を行う
+    cli_params = {}
     if len(sys.argv) > 2:
         for arg in sys.argv[2:]:
             if '=' in arg:
                 key, value = arg.split('=', 1)
                 key = key.strip()
                 value = value.strip()
+                cli_params[key] = value
                 setParam(key, value)
             else:
                 raise Exception(f'第二引数以降はkey=valueの形式にしてください')
@@ -106,6 +116,38 @@ if __name__ == '__main__':
     # 指定されていない場合はdefault_init_file_path(init.yaml)を読み込む
     init_file_path = getParam('init_file_path', default_init_file_path)
     init(init_file_path)
+
+    # parameterファイルの値より第二引数以降の指定を優先する
+    for key, value in cli_params.items():
+        setParam(key, value)
+
+    # 呼び出しログ(instrumented)の有効/無効
+    setInstrumentEnabled(getParam('instrumented.enabled', True, cast_type=bool))
+
+    # トレース(instrumentedの呼び出しのタイムライン出力)
+    if getParam('trace.enabled', False, cast_type=bool):
+        from lib.traceSetting import enableTracer
+        enableTracer()
+
+    # 実行中のパラメータファイルの変更の反映
+    if getParam('param_reload.enabled', False, cast_type=bool):
+        from lib.reloadSetting import enableParamReload
+        enableParamReload()
+
+    # メトリクス(呼び出し回数・実行時間のヒストグラム等のPrometheus形式での出力)
+    if getParam('metrics.enabled', False, cast_type=bool):
+        from lib.metricsSetting import enableMetrics
+        enableMetrics()
+
+    # プロファイル(行ごとの実行時間の計測)
+    if getParam('profile.enabled', False, cast_type=bool):
+        from lib.profilerSetting import enableProfiler
+        enableProfiler()
+
+    # アクション単位のcProfile(profile.actionsに指定したアクションのみ)
+    if getParam('profile.actions', ''):
+        from lib.profilerSetting import enableActionProfiler
+        enableActionProfiler()
     version = getParam('version', 'invalid_version')
     
     try:
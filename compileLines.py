@@ -0,0 +1,508 @@
+'''コマンドファイルを命令列にコンパイルする
+
+readLinesで1行ずつ解析していた処理を事前に1回だけ行い、
+行ごとの命令(Instruction)と制御構文(if/elif/else/fi, for/while/repeat/done等)の
+ジャンプ先を確定させた命令列(Program)を生成する。
+サブルーチン(def～end)の本体は別の命令列として命令に保持する。
+'''
+import io
+import os
+import stat
+import sys
+import hashlib
+import pickle
+from lib.paramSetting import getParam
+from lib.loggerSetting import getMyLogger
+from lib.customFunction import patternMatchSplit
+from lib.templateSetting import compileTemplate
+
+# 命令の種類
+KIND_ACTION = 'action'
+KIND_IF     = 'if'
+KIND_ELIF   = 'elif'
+KIND_ELSE   = 'else'
+KIND_FI     = 'fi'
+KIND_FOR      = 'for'
+KIND_WHILE    = 'while'
+KIND_REPEAT   = 'repeat'
+KIND_BREAK    = 'break'
+KIND_CONTINUE = 'continue'
+KIND_DONE     = 'done'
+KIND_DEF      = 'def'
+KIND_END      = 'end'
+
+# ループの開始
+LOOP_KINDS = (KIND_FOR, KIND_WHILE, KIND_REPEAT)
+
+# ジャンプテーブルを構築する制御構文
+FLOW_KINDS = (KIND_IF, KIND_ELIF, KIND_ELSE, KIND_FI) + LOOP_KINDS + (KIND_BREAK, KIND_CONTINUE, KIND_DONE)
+
+# 閉じるまで1行ずつ実行できないブロックの開始(対話モードではまとめて実行する)
+BLOCK_START_KINDS = LOOP_KINDS + (KIND_DEF,)
+
+# 標準入力から読み込む場合のファイル名
+STDIN_PATH = '-'
+
+# ディスクキャッシュの形式(Instruction等の構造を変更した場合は更新する)
+CACHE_VERSION = 4
+CACHE_SUFFIX  = '.rpac'
+
+
+class Instruction:
+    """コンパイル済みの1行分の命令
+
+    Attributes:
+        file_path (str): 命令が記述されたファイル
+        line_no (int): 行番号(1始まり)
+        line (str): 行の文字列(前後の空白除去済み)
+        action (str): コマンド部
+        args (str): 引数部
+        kind (str): 命令の種類(KIND_ACTION or FLOW_KINDS)
+        command (str): 解決するコマンド名(key=value形式の行は'set')
+        dynamic (bool): コマンド部・引数部に変数(${...})を含むか
+        templates (tuple[Template] or None): 変数を含む場合の(コマンド部, 引数部)のテンプレート
+        jump (int): 条件が偽の場合のジャンプ先(次の分岐)。
+            done/break/continueの場合は対応するループの開始位置
+        end (int): 対応するfi(ループの開始の場合はdone)の位置
+        body (Program or None): defの場合はサブルーチン本体の命令列
+
+    Note:
+        命令列はキャッシュを通して並列実行(parallel.mode: thread)の子シナリオと共有するため、
+        実行時に解決するアクション関数などは命令に保持しない。
+    """
+    __slots__ = (
+        'file_path', 'line_no', 'line', 'action', 'args', 'kind',
+        'command', 'dynamic', 'templates', 'jump', 'end', 'body',
+    )
+
+    def __init__(self, file_path, line_no, line, action, args, kind):
+        self.file_path = file_path
+        self.line_no   = line_no
+        self.line      = line
+        self.action    = action
+        self.args      = args
+        self.kind      = kind
+        self.dynamic   = '${' in action or '${' in args
+        self.templates = (compileTemplate(action), compileTemplate(args)) if self.dynamic else None
+        self.jump      = None
+        self.end       = None
+        self.body      = None
+
+        # 代入ショートカット(key=value)はsetとして扱う
+        if kind == KIND_ACTION and '=' in action:
+            self.command = 'set'
+            self.args    = action
+        else:
+            self.command = action
+
+    def __repr__(self):
+        return f'<{self.file_path}:{self.line_no} {self.line}>'
+
+
+class Program:
+    """コンパイル済みの命令列
+
+    Attributes:
+        file_path (str): コンパイル元のファイル
+        instructions (list[Instruction]): 命令列
+    """
+
+    def __init__(self, file_path, instructions):
+        self.file_path    = file_path
+        self.instructions = instructions
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+class ProgramBuilder:
+    """命令を1つずつ追加して命令列を組み立てる
+
+    制御構文の対応関係を追跡し、ブロックが閉じた時点でジャンプ先を確定させる。
+
+    Attributes:
+        file_path (str): エラー表示用のファイル名
+        instructions (list[Instruction]): 追加済みの命令
+    """
+
+    def __init__(self, file_path='<string>'):
+        self.file_path    = file_path
+        self.instructions = []
+        # 閉じていないブロックのスタック
+        # - if  : (KIND_IF, [if, elif..., elseの位置])
+        # - loop: (KIND_DONE, ループの開始位置)
+        self.block_stack  = []
+        # 定義中のサブルーチン(def～end)
+        self.def_instruction = None
+        self.def_builder     = None
+
+    def addLine(self, line, line_no):
+        """1行を解析して命令として追加する
+
+        Args:
+            line (str): コマンドファイルの1行
+            line_no (int): 行番号
+
+        Returns:
+            bool: 命令を追加した場合True(空行・コメント行はFalse)
+
+        Raises:
+            SyntaxError: 制御構文の対応が取れていない場合
+        """
+        line = line.strip()
+        # 空行・コメント行は命令にしない
+        if line == '' or line.startswith('#'):
+            return False
+
+        file_path = self.file_path
+        instructions = self.instructions
+        block_stack = self.block_stack
+
+        action, args = patternMatchSplit(':', line)
+
+        # def～endの間はサブルーチン本体として別の命令列にする
+        if self.def_builder is not None:
+            if action == KIND_DEF:
+                raise SyntaxError(f'def inside def ({file_path}:{line_no})')
+            if action != KIND_END:
+                return self.def_builder.addLine(line, line_no)
+            self.def_instruction.body = self.def_builder.build()
+            instructions.append(self.def_instruction)
+            self.def_instruction = None
+            self.def_builder = None
+            return True
+
+        if action == KIND_DEF:
+            if not args:
+                raise SyntaxError(f'def without name ({file_path}:{line_no})')
+            self.def_instruction = Instruction(file_path, line_no, line, action, args, KIND_DEF)
+            self.def_builder = ProgramBuilder(file_path)
+            return True
+        if action == KIND_END:
+            raise SyntaxError(f'end without def ({file_path}:{line_no})')
+
+        kind = action if action in FLOW_KINDS else KIND_ACTION
+        index = len(instructions)
+        instruction = Instruction(file_path, line_no, line, action, args, kind)
+
+        if kind == KIND_IF:
+            block_stack.append((KIND_IF, [index]))
+        elif kind in (KIND_ELIF, KIND_ELSE):
+            if not block_stack or block_stack[-1][0] != KIND_IF:
+                raise SyntaxError(f'{action} without if ({file_path}:{line_no})')
+            branches = block_stack[-1][1]
+            if instructions[branches[-1]].kind == KIND_ELSE:
+                raise SyntaxError(f'{action} after else ({file_path}:{line_no})')
+            branches.append(index)
+        elif kind == KIND_FI:
+            if not block_stack or block_stack[-1][0] != KIND_IF:
+                raise SyntaxError(f'fi without if ({file_path}:{line_no})')
+            _, branches = block_stack.pop()
+            for branch, next_branch in zip(branches, branches[1:] + [index]):
+                instructions[branch].jump = next_branch
+                instructions[branch].end  = index
+        elif kind in LOOP_KINDS:
+            block_stack.append((KIND_DONE, index))
+        elif kind == KIND_DONE:
+            if not block_stack or block_stack[-1][0] != KIND_DONE:
+                raise SyntaxError(f'done without loop ({file_path}:{line_no})')
+            _, header = block_stack.pop()
+            instructions[header].end = index
+            instruction.jump = header
+        elif kind in (KIND_BREAK, KIND_CONTINUE):
+            # if等の内側からも最も内側のループを対象にする
+            for block_kind, header in reversed(block_stack):
+                if block_kind == KIND_DONE:
+                    instruction.jump = header
+                    break
+            else:
+                raise SyntaxError(f'{action} outside loop ({file_path}:{line_no})')
+
+        instructions.append(instruction)
+        return True
+
+    def isClosed(self):
+        """全てのブロックが閉じているか
+
+        Returns:
+            bool: 閉じていないブロックがない場合True
+        """
+        return not self.block_stack and self.def_builder is None
+
+    def build(self):
+        """追加済みの命令から命令列を生成する
+
+        Returns:
+            Program: コンパイル済みの命令列
+
+        Raises:
+            SyntaxError: 閉じていないブロックがある場合
+        """
+        if self.def_builder is not None:
+            unclosed = self.def_instruction
+            raise SyntaxError(f'def without end ({self.file_path}:{unclosed.line_no})')
+        if self.block_stack:
+            block_kind, position = self.block_stack[-1]
+            if block_kind == KIND_IF:
+                unclosed = self.instructions[position[0]]
+                raise SyntaxError(f'if without fi ({self.file_path}:{unclosed.line_no})')
+            unclosed = self.instructions[position]
+            raise SyntaxError(f'{unclosed.action} without done ({self.file_path}:{unclosed.line_no})')
+        return Program(self.file_path, self.instructions)
+
+
+def compileLines(lines, file_path='<string>', start_line=1):
+    """行のリストを命令列にコンパイルする
+
+    空行・コメント行は命令に含めない。
+    制御構文は対応関係を解析し、各分岐・ループのジャンプ先(jump)と
+    ブロック終端(end)を命令に設定する。
+
+    Args:
+        lines (Iterable[str]): コマンドファイルの各行
+        file_path (str, optional): エラー表示用のファイル名
+        start_line (int, optional): 先頭行の行番号
+
+    Returns:
+        Program: コンパイル済みの命令列
+
+    Raises:
+        SyntaxError: 制御構文の対応が取れていない場合
+    """
+    builder = ProgramBuilder(file_path)
+    for line_no, line in enumerate(lines, start_line):
+        builder.addLine(line, line_no)
+    return builder.build()
+
+
+def iterPrograms(lines, file_path='<string>', start_line=1):
+    """行を逐次読み込み、トップレベルの文ごとに命令列を生成する
+
+    ブロック(if～fi, for～done, def～end等)の外では1行ごとに、ブロック内では閉じた時点で
+    命令列を返すため、全行を読み込む前に実行を開始できる。
+    保持する行は実行中のブロック分のみとなる。
+
+    Args:
+        lines (Iterable[str]): コマンドファイルの各行(遅延読み込み可)
+        file_path (str, optional): エラー表示用のファイル名
+        start_line (int, optional): 先頭行の行番号
+
+    Yields:
+        Program: トップレベルの文1つ分の命令列
+
+    Raises:
+        SyntaxError: 制御構文の対応が取れていない場合
+    """
+    builder = ProgramBuilder(file_path)
+    for line_no, line in enumerate(lines, start_line):
+        if builder.addLine(line, line_no) and builder.isClosed():
+            yield builder.build()
+            builder = ProgramBuilder(file_path)
+    builder.build()
+
+
+def isStreamSource(file_path):
+    """逐次読み込みで実行すべき入力元か判定する
+
+    Args:
+        file_path (str): コマンドファイルのパス
+
+    Returns:
+        bool: 標準入力('-')または名前付きパイプ(FIFO)の場合True
+    """
+    if file_path == STDIN_PATH:
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(file_path).st_mode)
+    except OSError as e:
+        return False
+
+
+def openScenario(file_path, encoding='utf-8'):
+    """コマンドファイルを開く
+
+    Args:
+        file_path (str): コマンドファイルのパス('-'の場合は標準入力)
+        encoding (str, optional): ファイルの文字コード
+
+    Returns:
+        TextIO: 開いたファイル(行単位で遅延読み込みできる)
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+    """
+    try:
+        if file_path == STDIN_PATH:
+            # 標準入力はclose時に閉じないようにする
+            return open(sys.stdin.fileno(), 'r', encoding=encoding, closefd=False)
+        return open(file_path, 'r', encoding=encoding)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f'指定されたファイルが見つかりません: "{file_path}"')
+
+
+def compileFile(file_path, encoding='utf-8'):
+    """コマンドファイルを読み込んで命令列にコンパイルする
+
+    Args:
+        file_path (str): コマンドファイルのパス
+        encoding (str, optional): ファイルの文字コード
+
+    Returns:
+        Program: コンパイル済みの命令列
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        SyntaxError: 制御構文の対応が取れていない場合
+    """
+    with openScenario(file_path, encoding) as f:
+        lines = f.readlines()
+
+    return compileLines(lines, file_path)
+
+
+# コンパイル済みシナリオのキャッシュ(絶対パス→(mtime, size, ハッシュ, Program))
+_program_cache = {}
+
+def getCachePath(abs_path):
+    """ディスクキャッシュの保存先を取得する
+
+    Args:
+        abs_path (str): コマンドファイルの絶対パス
+
+    Returns:
+        str: キャッシュファイルのパス
+
+    Params:
+        program_cache.dir (str): 保存先フォルダ。空の場合はコマンドファイルと同じフォルダの__rpacache__
+    """
+    cache_dir = getParam('program_cache.dir', '')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.dirname(abs_path), '__rpacache__')
+    # 別フォルダの同名ファイルと衝突しないようにパスのハッシュを付与する
+    path_hash = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:12]
+    file_name = f'{os.path.basename(abs_path)}.{path_hash}{CACHE_SUFFIX}'
+    return os.path.join(cache_dir, file_name)
+
+
+def loadDiskCache(abs_path, digest):
+    """ディスクキャッシュからコンパイル済みの命令列を読み込む
+
+    Args:
+        abs_path (str): コマンドファイルの絶対パス
+        digest (str): コマンドファイルの内容のハッシュ
+
+    Returns:
+        Program or None: 内容が一致するキャッシュがない場合はNone
+    """
+    cache_path = getCachePath(abs_path)
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError as e:
+        return None
+    except Exception as e:
+        getMyLogger(__name__).warning(f'キャッシュを読み込めないため再コンパイルします: {cache_path} ({e})')
+        return None
+
+    if cached.get('version') != CACHE_VERSION or cached.get('digest') != digest:
+        return None
+    return cached['program']
+
+
+def saveDiskCache(abs_path, digest, program):
+    """コンパイル済みの命令列をディスクキャッシュに保存する
+
+    Args:
+        abs_path (str): コマンドファイルの絶対パス
+        digest (str): コマンドファイルの内容のハッシュ
+        program (Program): 保存する命令列
+
+    Note:
+        保存に失敗した場合は警告のみ出力して処理を継続する。
+    """
+    cache_path = getCachePath(abs_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'digest': digest, 'program': program}, f)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        getMyLogger(__name__).warning(f'キャッシュを保存できませんでした: {cache_path} ({e})')
+
+
+def loadProgram(file_path, encoding='utf-8'):
+    """コンパイル済みの命令列を取得する(キャッシュ利用)
+
+    同じ実行内ではパス・更新日時・サイズが変わらない限りコンパイル結果を再利用する。
+    更新日時等が変わった場合は内容のハッシュを比較し、内容が同じなら再利用する。
+    program_cache.diskがTrueの場合はディスクにも保存し、次回起動時に再利用する。
+
+    Args:
+        file_path (str): コマンドファイルのパス
+        encoding (str, optional): ファイルの文字コード
+
+    Returns:
+        Program: コンパイル済みの命令列
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        SyntaxError: 制御構文の対応が取れていない場合
+
+    Params:
+        program_cache.memory (bool): 同じ実行内でコンパイル結果を再利用するか
+        program_cache.disk (bool): コンパイル結果をディスクに保存・再利用するか
+
+    Note:
+        ディスクキャッシュはpickle形式のため、信頼できないフォルダを保存先にしないこと。
+    """
+    use_memory = getParam('program_cache.memory', True, cast_type=bool)
+    use_disk   = getParam('program_cache.disk', False, cast_type=bool)
+    if not use_memory and not use_disk:
+        return compileFile(file_path, encoding)
+
+    abs_path = os.path.abspath(file_path)
+    try:
+        file_stat = os.stat(abs_path)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f'指定されたファイルが見つかりません: "{file_path}"')
+
+    cached = _program_cache.get(abs_path) if use_memory else None
+    if cached and cached[0] == file_stat.st_mtime_ns and cached[1] == file_stat.st_size:
+        return cached[3]
+
+    with open(abs_path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    if cached and cached[2] == digest:
+        program = cached[3]
+    else:
+        program = loadDiskCache(abs_path, digest) if use_disk else None
+        if program is None:
+            lines = io.StringIO(content.decode(encoding), newline=None).readlines()
+            program = compileLines(lines, file_path)
+            if use_disk:
+                saveDiskCache(abs_path, digest, program)
+        else:
+            getMyLogger(__name__).debug(f'ディスクキャッシュを利用します: {file_path}')
+
+    if use_memory:
+        _program_cache[abs_path] = (file_stat.st_mtime_ns, file_stat.st_size, digest, program)
+    return program
+
+
+def isBlockStart(line):
+    """閉じるまで実行できないブロック(ループ・サブルーチン定義)の開始行か判定する
+
+    Args:
+        line (str): コマンドファイルの1行
+
+    Returns:
+        bool: ループ・defの開始行の場合True
+    """
+    line = line.strip()
+    if line == '' or line.startswith('#'):
+        return False
+    action, _ = patternMatchSplit(':', line)
+    return action in BLOCK_START_KINDS
@@ -8,9 +8,9 @@ Pylance (pyright) の未使用 import 警告はこのファイル単体で無視
 
 # libモジュール定義（再エクスポートの窓口）
 from lib.loggerSetting import getMyLogger
-from lib.paramSetting  import getParam, setParam, hasParam, loadParams
+from lib.paramSetting  import getParam, setParam, hasParam, delParam, loadParams
 from lib.shutdownSetting import register_shutdown_hook
-from lib.decoratorSetting import instrumented, retryCounter
+from lib.decoratorSetting import instrumented, retryCounter, getRetryTimeLeft
 from lib.customFunction import (
 	patternMatchSplit,
 	sepSplit,
@@ -31,9 +31,9 @@ import os
 # 明示的に公開する名前を定義することで再エクスポートの意図を明確にする
 __all__ = [
 	'getMyLogger',
-	'getParam', 'setParam', 'hasParam', 'loadParams',
+	'getParam', 'setParam', 'hasParam', 'delParam', 'loadParams',
 	'register_shutdown_hook',
-	'instrumented', 'retryCounter',
+	'instrumented', 'retryCounter', 'getRetryTimeLeft',
 	'patternMatchSplit', 'sepSplit', 'tableDisplay', 'false_list', 'toBool',
 	'encode_url_component', 'decode_url_component',
     'time', 'sys', 're', 'os',
@@ -1,23 +1,28 @@
 import re
 import sys
+from functools import lru_cache
 from lib.loggerSetting import getMyLogger
 from lib.paramSetting  import getParam, setParam
 
 
+@lru_cache(maxsize=None)
+def compileSplitPattern(separator):
+    # 区切り文字ごとにコンパイル済みパターンを使い回す
+    return re.compile(rf'^(.+?){re.escape(separator)}(.*)$')
+
+
 def patternMatchSplit(separator, line):
-    logger = getMyLogger(__name__)
-    pattern = rf'^(.+?){re.escape(separator)}(.*)$'
-    
-    compiled = re.compile(pattern)
+    compiled = compileSplitPattern(separator)
 
     # 1. グループ数を調べる
     num_groups = compiled.groups
     if num_groups != 2:
-        logger.critical(f'パターン不正:{pattern}')
+        logger = getMyLogger(__name__)
+        logger.critical(f'パターン不正:{compiled.pattern}')
         sys.exit()
     
     # 2. マッチしたら分割
-    match = re.search(pattern, line)
+    match = compiled.search(line)
     if match:
         arg1 = match.group(1).strip()
         arg2 = match.group(2).strip()
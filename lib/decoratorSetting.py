@@ -1,139 +1,585 @@
+import asyncio
+import random
 import threading
 import time
+from contextvars import ContextVar
 from lib.paramSetting import getParam, setParam
 from lib.loggerSetting import getMyLogger
+from lib.traceSetting import formatTraceArgs
+import lib.traceSetting as traceSetting
+import lib.metricsSetting as metricsSetting
 from functools import wraps
 import inspect
 
-nest = 0
-hide = False
+# 呼び出しログのネストの深さ・引数を非表示にするか
+# (実行コンテキストごとに保持し、gatherのタスクや別スレッドのログが互いに影響しないようにする)
+nest = ContextVar('instrumented_nest', default=0)
+hide = ContextVar('instrumented_hide', default=False)
 
 from tqdm import tqdm
-import threading
-import time
 
-def show_elapsed(start_time, stop_event):
-    pbar = tqdm(
-        total=1.0, 
-        bar_format="{desc}", 
-        position=0,  # positionを0に固定
-        leave=False,  # 終了後バーを残さない
-        ncols=50,    # 表示幅を固定
-    )
-    while not stop_event.is_set():
-        elapsed = time.perf_counter() - start_time
-        seconds = int(elapsed)
-        milliseconds = int((elapsed - seconds) * 1000)
-        pbar.set_description_str(
-            f"Elapsed time: {seconds}.{milliseconds:03d}s"
-        )
-        pbar.refresh()
-        MEASURE_INTERVAL = float(getParam('MEASURE_INTERVAL', '0.01'))
-        time.sleep(MEASURE_INTERVAL)
-    pbar.close()
+class ElapsedTicker:
+    """計測中の関数の経過時間を1行で表示する共有スレッド
+
+    計測中の関数(timer=True)を登録簿で管理し、1つのスレッドがまとめて再描画する。
+    計測中の関数がない間はスレッドは待機し、表示も消す。
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        # トークン→(関数名, 開始時刻)
+        self.timers = {}
+        self.next_token = 0
+        self.thread = None
+
+    def start(self, name, start_time):
+        """計測を登録する
+
+        Args:
+            name (str): 表示する関数名
+            start_time (float): 開始時刻(time.perf_counter)
+
+        Returns:
+            int: stopに渡すトークン
+        """
+        with self.condition:
+            token = self.next_token
+            self.next_token += 1
+            self.timers[token] = (name, start_time)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='ElapsedTicker', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return token
+
+    def stop(self, token):
+        """計測の登録を解除する
+
+        Args:
+            token (int): startの戻り値
+        """
+        with self.condition:
+            self.timers.pop(token, None)
+            self.condition.notify()
+
+    def formatStatus(self):
+        now = time.perf_counter()
+        return ' > '.join(f'{name} {now - start_time:.3f}s' for name, start_time in self.timers.values())
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.timers:
+                    self.condition.wait()
+            # 表示間隔は計測が始まるたびに1回だけ取得する
+            interval = float(getParam('MEASURE_INTERVAL', '0.01'))
+            pbar = tqdm(
+                total=1.0,
+                bar_format="{desc}",
+                position=0,  # positionを0に固定
+                leave=False,  # 終了後バーを残さない
+                ncols=80,    # 表示幅を固定
+            )
+            while True:
+                with self.condition:
+                    if not self.timers:
+                        break
+                    status = self.formatStatus()
+                pbar.set_description_str(f"Elapsed time: {status}")
+                pbar.refresh()
+                with self.condition:
+                    if self.timers:
+                        self.condition.wait(interval)
+            pbar.close()
+
+
+# 経過時間の表示(ch.levelがDEBUGの場合のみ利用)
+ticker = ElapsedTicker()
+
+# Falseの場合、instrumentedは関数を呼び出すだけで何もしない(setInstrumentEnabledで切替)
+enabled = True
+
+def setInstrumentEnabled(flag):
+    """instrumentedによる呼び出しログ・計測を有効/無効にする
+
+    Args:
+        flag (bool): Falseの場合は関数を呼び出すだけにする
+    """
+    global enabled
+    enabled = bool(flag)
+
+
+class InstrumentedFunction:
+    """instrumentedで装飾した関数ごとの情報
+
+    シグネチャの解析結果とロガーを保持し、呼び出しごとに作り直さない。
+    """
+    __slots__ = ('func', 'name', 'timer', 'log_level', 'signature', 'arg_names', 'defaults', 'logger')
+
+    def __init__(self, func, timer, log_level):
+        self.func      = func
+        self.name      = func.__name__
+        self.timer     = timer
+        self.log_level = log_level
+        self.signature = inspect.signature(func)
+        params = self.signature.parameters.values()
+        # 通常の引数のみの場合はbindせずに引数名と対応付ける
+        if all(param.kind is param.POSITIONAL_OR_KEYWORD for param in params):
+            self.arg_names = tuple(param.name for param in params)
+        else:
+            self.arg_names = None
+        self.defaults = {param.name: param.default for param in params if param.default is not param.empty}
+        # ロガー名はroot_logger_nameに依存するため初回呼び出し時に取得する
+        self.logger = None
+
+    def getLogger(self):
+        if self.logger is None:
+            self.logger = getMyLogger(self.name)
+        return self.logger
+
+    def bindArguments(self, args, kwargs):
+        """引数名と値(デフォルト値を含む)を対応付ける"""
+        names = self.arg_names
+        arguments = None
+        if names is not None and len(args) <= len(names):
+            arguments = {}
+            for index, name in enumerate(names):
+                if index < len(args):
+                    arguments[name] = args[index]
+                elif name in kwargs:
+                    arguments[name] = kwargs[name]
+                elif name in self.defaults:
+                    arguments[name] = self.defaults[name]
+                else:
+                    arguments = None
+                    break
+        if arguments is None:
+            bound_args = self.signature.bind(*args, **kwargs)
+            bound_args.apply_defaults()
+            arguments = bound_args.arguments
+        return arguments
+
+    def begin(self, args, kwargs):
+        """呼び出しの開始を記録する
+
+        Returns:
+            InstrumentedCall or None: 記録が不要な場合(ログレベルが無効、hide指定なし、トレース・メトリクス無効)はNone
+        """
+        temp_hide = getParam('temp_hide', False)
+        if temp_hide:
+            hide.set(True)
+            setParam('temp_hide', False)
+
+        is_logged = self.getLogger().isEnabledFor(self.log_level)
+        tracer = traceSetting.tracer
+        metrics = metricsSetting.registry
+        if not is_logged and not temp_hide and tracer is None and metrics is None:
+            return None
+        call = InstrumentedCall(self, temp_hide, is_logged, tracer, metrics)
+        call.start(args, kwargs)
+        return call
+
+
+class InstrumentedCall:
+    """instrumentedで計測する1回の呼び出し
+
+    同期関数・コルーチン関数のどちらのラッパーからも同じ形式でログを出力する。
+    """
+    __slots__ = ('info', 'temp_hide', 'is_logged', 'tracer', 'metrics', 'trace_args', 'signature', 'ticker_token', 'start_time')
+
+    def __init__(self, info, temp_hide, is_logged, tracer, metrics):
+        self.info      = info
+        self.temp_hide = temp_hide
+        self.is_logged = is_logged
+        self.tracer    = tracer
+        self.metrics   = metrics
+        self.trace_args   = None
+        self.signature    = None
+        self.ticker_token = None
+        self.start_time   = None
+
+    def start(self, args, kwargs):
+        info = self.info
+        if self.tracer is not None or self.metrics is not None:
+            self.start_time = time.perf_counter()
+        if not self.is_logged and self.tracer is None:
+            return
+
+        is_hidden = hide.get()
+        arguments = None if is_hidden else info.bindArguments(args, kwargs)
+        if self.tracer is not None:
+            self.trace_args = {'args': '***'} if is_hidden else formatTraceArgs(arguments)
+            if not self.is_logged:
+                return
+
+        self.signature = '***' if is_hidden else ", ".join(f"{k}={v!r}" for k, v in arguments.items())
+
+        depth = nest.get() + 1
+        nest.set(depth)
+        prefix = " " * (depth - 1) + "→"
+        info.logger.log(info.log_level, f"|{prefix} Run    {info.name}({self.signature})")
+
+        if info.timer and self.start_time is None:
+            self.start_time = time.perf_counter()
+
+        if info.timer and getParam('ch.level') == 'DEBUG':
+            self.ticker_token = ticker.start(info.name, self.start_time)
+
+    def end(self, status, log_suffix=''):
+        if self.tracer is not None or self.metrics is not None:
+            end_time = time.perf_counter()
+            failed = status == 'Failed'
+            if self.tracer is not None:
+                self.tracer.add(self.info.name, self.start_time, end_time, self.trace_args, failed)
+            if self.metrics is not None:
+                self.metrics.observe(self.info.func.__module__, self.info.name, end_time - self.start_time, failed)
+        if not self.is_logged:
+            return
+        mark = "X" if status == 'Failed' else "←"
+        depth = nest.get()
+        prefix = " " * (depth - 1) + mark
+        nest.set(depth - 1)
+        message = f"|{prefix} {status:<6} {self.info.name}({self.signature})"
+        if status == 'Done':
+            message += f" {log_suffix}"
+        self.info.logger.log(self.info.log_level, message)
+
+    def done(self, result):
+        if not self.is_logged:
+            self.end('Done')
+            return
+        elapsed = time.perf_counter() - self.start_time if self.info.timer else 0
+        log_suffix  = f"(Elapsed: {elapsed:.3f}s)" if self.info.timer  else ""
+        log_suffix += f"(return: {result})" if result is not None else ""
+        self.end('Done', log_suffix)
+
+    def close(self):
+        if self.ticker_token is not None:
+            ticker.stop(self.ticker_token)
+
+        if self.temp_hide:
+            hide.set(False)
+
 
 def instrumented(timer=False, log_level=10):
+    """関数の呼び出し・終了・失敗をログに出力するデコレータ
+
+    Args:
+        timer (bool): Trueの場合は実行時間も出力する
+        log_level (int): ログレベル
+
+    Note:
+        ロガーのレベルでlog_levelが無効な場合は引数の文字列化を行わずに呼び出す。
+        setInstrumentEnabled(False)の場合は関数を呼び出すだけにする。
+    """
     def decorator(func):
+        info = InstrumentedFunction(func, timer, log_level)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled:
+                    return await func(*args, **kwargs)
+                call = info.begin(args, kwargs)
+                if call is None:
+                    return await func(*args, **kwargs)
+                try:
+                    result = await func(*args, **kwargs)
+                except (KeyboardInterrupt, SystemExit) as e:
+                    call.end('Quit')
+                    raise
+                except Exception as e:
+                    call.end('Failed')
+                    raise
+                finally:
+                    call.close()
+                call.done(result)
+                return result
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            global nest, hide
-            
-            temp_hide = getParam('temp_hide', False)
-            if temp_hide:
-                hide = True
-                setParam('temp_hide', False)
-            
+            if not enabled:
+                return func(*args, **kwargs)
+            call = info.begin(args, kwargs)
+            if call is None:
+                return func(*args, **kwargs)
             try:
-                func_name = func.__name__
-                logger = getMyLogger(func_name)
-
-                bound_args = inspect.signature(func).bind(*args, **kwargs)
-                bound_args.apply_defaults()
-                
-                signature = ", ".join(f"{k}={v!r}" for k, v in bound_args.arguments.items())
-                if hide:
-                    signature = '***'
-
-                nest += 1
-                prefix = " " * (nest - 1) + "→"
-                logger.log(log_level, f"|{prefix} Run    {func_name}({signature})")
-
-                stop_event = None
-                timer_thread = None
-                start_time = time.perf_counter() if timer else None
-
-                if timer and getParam('ch.level') == 'DEBUG':
-                    stop_event = threading.Event()
-                    timer_thread = threading.Thread(
-                        target=show_elapsed,
-                        args=(start_time, stop_event)
-                    )
-                    timer_thread.start()
-
                 result = func(*args, **kwargs)
-
-                elapsed = time.perf_counter() - start_time if timer else 0
-                log_suffix  = f"(Elapsed: {elapsed:.3f}s)" if timer  else ""
-                log_suffix += f"(return: {result})" if result is not None else ""
-                prefix = " " * (nest - 1) + "←"
-                nest -= 1
-
-                logger.log(log_level, f"|{prefix} Done   {func_name}({signature}) {log_suffix}")
             except (KeyboardInterrupt, SystemExit) as e:
-                prefix = " " * (nest - 1) + "←"
-                nest -= 1
-                logger.log(log_level, f"|{prefix} Quit   {func_name}({signature})")
+                call.end('Quit')
                 raise
             except Exception as e:
-                prefix = " " * (nest - 1) + "X"
-                nest -= 1
-                logger.log(log_level, f"|{prefix} Failed {func_name}({signature})")
+                call.end('Failed')
                 raise
             finally:
-                if stop_event is not None:
-                    stop_event.set()
-                    timer_thread.join()
-                
-                if temp_hide:
-                    hide = False
-
+                call.close()
+            call.done(result)
             return result
         return wrapper
     return decorator
 
-def retryCounter(max_retry=None, retry_interval=None, breakException=None):
+class RetryPolicy:
+    """リトライの待機時間と打ち切り条件
+
+    n回目のリトライ前の待機秒は min(max_interval, interval * backoff**(n-1)) に
+    ±jitterの割合の揺らぎを加えた値とする(max_intervalが0の場合は上限なし)。
+
+    Attributes:
+        max_retry (int): 最大リトライ回数
+        interval (float): 初回の待機秒
+        backoff (float): 待機秒の倍率
+        max_interval (float): 待機秒の上限(0の場合は上限なし)
+        jitter (float): 待機秒に加える揺らぎの割合(0～1)
+        deadline (float): 1回の呼び出しでリトライを続ける最大秒数(0の場合は無制限)
+    """
+    __slots__ = ('max_retry', 'interval', 'backoff', 'max_interval', 'jitter', 'deadline')
+
+    def __init__(self, max_retry, interval, backoff, max_interval, jitter, deadline):
+        self.max_retry    = int(max_retry)
+        self.interval     = float(interval)
+        self.backoff      = float(backoff)
+        self.max_interval = float(max_interval)
+        self.jitter       = float(jitter)
+        self.deadline     = float(deadline)
+
+    def delay(self, retry_count):
+        """retry_count回目のリトライ前の待機秒"""
+        base = self.interval * self.backoff ** (retry_count - 1)
+        if self.max_interval > 0:
+            base = min(self.max_interval, base)
+        if self.jitter:
+            base *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+
+class RetryStat:
+    """アクションごとのリトライの集計
+
+    Attributes:
+        calls (int): 呼び出し回数
+        retried (int): リトライが発生した呼び出しの回数
+        attempts (int): 実行回数(初回を含む)
+        gave_up (int): リトライ回数または期限の超過で失敗した回数
+        lost_time (float): 失敗した実行と待機に費やした秒数
+    """
+    __slots__ = ('calls', 'retried', 'attempts', 'gave_up', 'lost_time')
+
+    def __init__(self):
+        self.calls     = 0
+        self.retried   = 0
+        self.attempts  = 0
+        self.gave_up   = 0
+        self.lost_time = 0.0
+
+
+# (モジュール名, 関数名)→RetryStat
+retry_stats = {}
+# 並列に実行するアクション(parallel.mode: thread, gather)から集計を更新するためのロック
+_retry_stats_lock = threading.Lock()
+# リトライの集計を終了時に出力するよう登録済みか
+_summary_registered = False
+# 実行中のリトライの期限(time.perf_counter)。入れ子の呼び出しは外側の期限も守る
+_retry_deadline = ContextVar('retry_deadline', default=None)
+
+
+def getRetryTimeLeft():
+    """実行中のリトライの期限までの残り秒数
+
+    アクション内の要素検索などのポーリングは、残り時間がない場合に待機を打ち切り、
+    待機秒も残り時間までに抑える。
+
+    Returns:
+        float or None: 残り秒数。期限がない場合はNone
+    """
+    deadline = _retry_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.perf_counter()
+
+
+def printRetrySummary():
+    """リトライが発生したアクションの集計を出力する"""
+    with _retry_stats_lock:
+        rows = [(f'{module}.{name}', stat) for (module, name), stat in retry_stats.items() if stat.retried]
+    if not rows:
+        return
+    rows.sort(key=lambda row: row[1].lost_time, reverse=True)
+    print('--- retry summary (sorted by lost time) ---')
+    print(f'{"lost[s]":>9} {"calls":>6} {"retried":>8} {"attempts":>9} {"gave_up":>8}  action')
+    for name, stat in rows:
+        print(f'{stat.lost_time:>9.3f} {stat.calls:>6} {stat.retried:>8} {stat.attempts:>9} {stat.gave_up:>8}  {name}')
+
+
+class RetryCall:
+    """retryCounterで装飾した関数の1回の呼び出し"""
+    __slots__ = ('name', 'module', 'policy', 'stat', 'deadline', 'retry_count', 'token')
+
+    def __init__(self, func, policy):
+        global _summary_registered
+        self.name   = func.__name__
+        self.module = func.__module__
+        self.policy = policy
+        self.retry_count = 0
+
+        # 同名のアクション(p.clickとu.click、同期版と非同期版など)はモジュールで区別する
+        key = (func.__module__, func.__qualname__)
+        with _retry_stats_lock:
+            stat = retry_stats.get(key)
+            if stat is None:
+                stat = retry_stats[key] = RetryStat()
+                if not _summary_registered and getParam('retry.summary', False, cast_type=bool):
+                    from lib.shutdownSetting import register_shutdown_hook
+                    register_shutdown_hook(printRetrySummary, process_wide=True)
+                    _summary_registered = True
+            stat.calls += 1
+        self.stat = stat
+
+        outer_deadline = _retry_deadline.get()
+        deadline = time.perf_counter() + policy.deadline if policy.deadline > 0 else None
+        if outer_deadline is not None and (deadline is None or outer_deadline < deadline):
+            deadline = outer_deadline
+        self.deadline = deadline
+        self.token = _retry_deadline.set(deadline)
+
+    def attempted(self, elapsed=None):
+        """1回の実行が終わったことを記録する(elapsedは失敗した場合の所要秒)"""
+        with _retry_stats_lock:
+            self.stat.attempts += 1
+            if elapsed is not None:
+                self.stat.lost_time += elapsed
+
+    def nextDelay(self, error):
+        """次のリトライまでの待機秒を決める
+
+        Returns:
+            float or None: 待機秒。リトライしない場合はNone
+        """
+        logger = getMyLogger(self.name)
+        if self.retry_count >= self.policy.max_retry:
+            self.giveUp()
+            return None
+
+        delay = self.policy.delay(self.retry_count + 1)
+        if self.deadline is not None and time.perf_counter() + delay > self.deadline:
+            logger.warning(f'リトライの期限を超えるため中止します: {self.name} ({self.retry_count}回リトライ済み)')
+            self.giveUp()
+            return None
+
+        with _retry_stats_lock:
+            if self.retry_count == 0:
+                self.stat.retried += 1
+            self.stat.lost_time += delay
+        self.retry_count += 1
+        metrics = metricsSetting.registry
+        if metrics is not None:
+            metrics.countRetry(self.module, self.name)
+        logger.debug(f'{delay:.3f}秒後にリトライします({self.retry_count}/{self.policy.max_retry}): {error}')
+        return delay
+
+    def giveUp(self):
+        with _retry_stats_lock:
+            self.stat.gave_up += 1
+        metrics = metricsSetting.registry
+        if metrics is not None:
+            metrics.countRetry(self.module, self.name, gave_up=True)
+
+    def close(self):
+        _retry_deadline.reset(self.token)
+
+
+def retryCounter(max_retry=None, retry_interval=None, breakException=None,
+                 backoff=None, max_interval=None, jitter=None, deadline=None):
+    """例外が発生した場合に待機時間を伸ばしながら再実行するデコレータ
+
+    各引数は値またはパラメータのキー(str)で指定する。省略した場合はretry.*のパラメータを使う。
+
+    Args:
+        max_retry (int or str, optional): 最大リトライ回数
+        retry_interval (float or str, optional): 初回の待機秒
+        breakException (list[type], optional): リトライせずにそのまま送出する例外
+        backoff (float or str, optional): 待機秒の倍率
+        max_interval (float or str, optional): 待機秒の上限(0は上限なし)
+        jitter (float or str, optional): 待機秒に加える揺らぎの割合
+        deadline (float or str, optional): 1回の呼び出しでリトライを続ける最大秒数(0は無制限)
+
+    Params:
+        retry.max_count, retry.interval, retry.backoff, retry.max_interval,
+        retry.jitter, retry.deadline: 省略時の設定
+        retry.summary (bool): Trueの場合、終了時にリトライの集計を出力する
+
+    Note:
+        入れ子の呼び出し(アクション内の要素検索など)は外側の期限を超えて待機しない。
+    """
     if breakException is None:
         breakException = []
 
+    def resolve(value, key, default):
+        if isinstance(value, str):
+            return getParam(value)
+        if value is not None:
+            return value
+        return getParam(key, default)
+
+    def getRetryPolicy():
+        return RetryPolicy(
+            resolve(max_retry,      'retry.max_count',    20),
+            resolve(retry_interval, 'retry.interval',     0.5),
+            resolve(backoff,        'retry.backoff',      1),
+            resolve(max_interval,   'retry.max_interval', 0),
+            resolve(jitter,         'retry.jitter',       0),
+            resolve(deadline,       'retry.deadline',     0),
+        )
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            # 待機中も他のタスクが進むようにasyncio.sleepで待つ
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                call = RetryCall(func, getRetryPolicy())
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            result = await func(*args, **kwargs)
+                            call.attempted()
+                            return result
+                        except tuple(breakException) as e:
+                            call.attempted()
+                            logger = getMyLogger(func.__name__)
+                            logger.warning(str(e))
+                            raise
+                        except Exception as e:
+                            call.attempted(time.perf_counter() - started)
+                            delay = call.nextDelay(e)
+                            if delay is None:
+                                raise
+                            await asyncio.sleep(delay)
+                finally:
+                    call.close()
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            retry_count = 0            
-            _max_retry = (
-                getParam(max_retry) if isinstance(max_retry, str)
-                else max_retry if max_retry is not None
-                else getParam('retry.max_count', 20)
-            )
-            _retry_interval = (
-                getParam(retry_interval) if isinstance(retry_interval, str)
-                else retry_interval if retry_interval is not None
-                else getParam('retry.interval', 0.5)
-            )
-            while True:
-                try:
-                    result = func(*args, **kwargs)
-                    return result
-                except tuple(breakException) as e:
-                    logger = getMyLogger(func.__name__)
-                    logger.warning(str(e))
-                    raise
-                except Exception as e:
-                    logger = getMyLogger(func.__name__)
-                    logger.debug(str(e))
-                    if retry_count >= _max_retry:
+            call = RetryCall(func, getRetryPolicy())
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        result = func(*args, **kwargs)
+                        call.attempted()
+                        return result
+                    except tuple(breakException) as e:
+                        call.attempted()
+                        logger = getMyLogger(func.__name__)
+                        logger.warning(str(e))
                         raise
-                    retry_count += 1
-                    time.sleep(_retry_interval)
-                    
+                    except Exception as e:
+                        call.attempted(time.perf_counter() - started)
+                        delay = call.nextDelay(e)
+                        if delay is None:
+                            raise
+                        time.sleep(delay)
+            finally:
+                call.close()
         return wrapper
     return decorator
@@ -20,7 +20,12 @@ class AbbreviatedFormatter(logging.Formatter):
         record.levelname = self.LEVEL_ABBR.get(record.levelname, record.levelname)
         return super().format(record)
 
-def setLogger():
+def setLogger(fh_path=None):
+    """ロガーを設定する
+
+    Args:
+        fh_path (str, optional): ログファイルのパス。省略した場合はfh.path
+    """
     global logger
     root_logger_name = getParam('root_logger_name', 'CommandRPA')
     logger = getLogger(root_logger_name)
@@ -29,7 +34,8 @@ def setLogger():
     if logger.handlers:
         logger.handlers.clear()
 
-    fh_path     = getParam('fh.path', '.\\log\\trace.log')
+    if fh_path is None:
+        fh_path = getParam('fh.path', '.\\log\\trace.log')
     max_bytes    = getParam('fh.max_bytes', 1048576)
     backup_count = getParam('fh.backup_count', 3)
     encoding    = getParam('fh.encoding', 'utf-8')
@@ -64,7 +70,10 @@ def setLogger():
     logger.addHandler(fh)
     logger.addHandler(ch)
 
+    # どのハンドラにも出力されないレベルはisEnabledForで判定して文字列化を省く
+    logger.setLevel(min(fh_level, ch_level))
+
     return logger
 
 def getMyLogger(name):
-    return getLogger(f'{getParam("root_logger_name")}.{name}')
+    return getLogger(f'{getParam("root_logger_name", "CommandRPA")}.{name}')
@@ -0,0 +1,285 @@
+'''instrumented・retryCounterの呼び出しを集計するメトリクス(Prometheusのテキスト形式)
+
+metrics.enabled: Trueの場合、アクション(コマンドとして呼び出す関数)ごとの呼び出し回数・失敗回数・
+実行時間のヒストグラム・リトライ回数を集計し、定期的および終了時にファイルへ出力する。
+行の実行(executeLine)やファイルの読み込み(readFile)などの内部処理は集計しない。
+metrics.portを指定した場合はlocalhostのHTTPサーバでも公開する。
+
+出力したファイルはnode_exporterのtextfile collectorで収集できる。
+p95の実行時間は histogram_quantile(0.95, rate(rpa_action_duration_seconds_bucket[5m])) で求める。
+'''
+import os
+import sys
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lib.paramSetting import getParam
+from lib.shutdownSetting import register_shutdown_hook
+from lib.loggerSetting import getMyLogger
+
+logger = getMyLogger(__name__)
+
+# 有効なメトリクス(無効の場合はNone)
+registry = None
+
+# 実行時間のヒストグラムの既定の境界(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# アクションを登録するモジュールの属性(コマンド名→アクション関数)
+ACTION_TABLES = ('action_list', 'flow_action_list', 'block_action_list')
+
+
+class ActionMetrics:
+    """1つの関数の集計値
+
+    Attributes:
+        calls (int): 呼び出し回数
+        errors (int): 例外で終了した回数
+        retries (int): retryCounterによる再実行の回数
+        gave_up (int): retryCounterが再実行を打ち切った回数
+        bucket_counts (list[int]): ヒストグラムの境界ごとの件数(累積ではない)
+        duration_sum (float): 実行時間の合計(秒)
+    """
+    __slots__ = ('calls', 'errors', 'retries', 'gave_up', 'bucket_counts', 'duration_sum')
+
+    def __init__(self, bucket_count):
+        self.calls   = 0
+        self.errors  = 0
+        self.retries = 0
+        self.gave_up = 0
+        # 末尾は+Inf
+        self.bucket_counts = [0] * (bucket_count + 1)
+        self.duration_sum  = 0.0
+
+
+def escapeLabel(value):
+    """ラベルの値をPrometheusのテキスト形式でエスケープする"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatNumber(value):
+    """Prometheusのテキスト形式の数値にする"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """関数(モジュール名, 関数名)ごとのメトリクスを保持する
+
+    呼び出し元のスレッドと出力用のスレッド(定期出力・HTTPサーバ)から参照するためロックで保護する。
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets))
+        # (module, action)→ActionMetrics
+        self.actions = {}
+        # (module, action)→アクションか(内部処理の場合False)
+        self.action_keys = {}
+        self.lock = threading.Lock()
+
+    def isAction(self, module, action):
+        """モジュールのアクションの一覧(action_list等)に登録された関数か
+
+        Args:
+            module (str): モジュール名
+            action (str): 関数名
+
+        Returns:
+            bool: コマンドとして呼び出されるアクションの場合True
+        """
+        key = (module, action)
+        is_action = self.action_keys.get(key)
+        if is_action is None:
+            mod = sys.modules.get(module)
+            is_action = any(
+                getattr(func, '__name__', None) == action
+                for table in ACTION_TABLES
+                for func in getattr(mod, table, {}).values()
+            )
+            self.action_keys[key] = is_action
+        return is_action
+
+    def getMetrics(self, module, action):
+        key = (module, action)
+        metrics = self.actions.get(key)
+        if metrics is None:
+            metrics = self.actions[key] = ActionMetrics(len(self.buckets))
+        return metrics
+
+    def observe(self, module, action, elapsed, failed):
+        """1回の呼び出しを記録する
+
+        Args:
+            module (str): モジュール名
+            action (str): 関数名
+            elapsed (float): 実行時間(秒)
+            failed (bool): 例外で終了した場合True
+        """
+        # elapsed <= 境界 となる最初の境界(超えた場合は+Inf)
+        index = bisect_left(self.buckets, elapsed)
+        with self.lock:
+            if not self.isAction(module, action):
+                return
+            metrics = self.getMetrics(module, action)
+            metrics.calls += 1
+            if failed:
+                metrics.errors += 1
+            metrics.bucket_counts[index] += 1
+            metrics.duration_sum += elapsed
+
+    def countRetry(self, module, action, gave_up=False):
+        """retryCounterによる再実行(または打ち切り)を記録する
+
+        Args:
+            module (str): モジュール名
+            action (str): 関数名
+            gave_up (bool): 再実行を打ち切った場合True
+        """
+        with self.lock:
+            if not self.isAction(module, action):
+                return
+            metrics = self.getMetrics(module, action)
+            if gave_up:
+                metrics.gave_up += 1
+            else:
+                metrics.retries += 1
+
+    def render(self):
+        """Prometheusのテキスト形式で出力する
+
+        Returns:
+            str: 出力内容
+        """
+        counters = (
+            ('rpa_action_calls_total',         'calls',   '関数の呼び出し回数'),
+            ('rpa_action_errors_total',        'errors',  '例外で終了した回数'),
+            ('rpa_action_retries_total',       'retries', 'retryCounterによる再実行の回数'),
+            ('rpa_action_retry_gave_up_total', 'gave_up', 'retryCounterが再実行を打ち切った回数'),
+        )
+        with self.lock:
+            snapshot = []
+            for (module, action), metrics in sorted(self.actions.items()):
+                labels = f'module="{escapeLabel(module)}",action="{escapeLabel(action)}"'
+                values = {attr: getattr(metrics, attr) for _, attr, _ in counters}
+                snapshot.append((labels, values, list(metrics.bucket_counts), metrics.duration_sum))
+
+        lines = []
+        for metric_name, attr, help_text in counters:
+            lines.append(f'# HELP {metric_name} {help_text}')
+            lines.append(f'# TYPE {metric_name} counter')
+            for labels, values, _, _ in snapshot:
+                lines.append(f'{metric_name}{{{labels}}} {values[attr]}')
+
+        metric_name = 'rpa_action_duration_seconds'
+        lines.append(f'# HELP {metric_name} 関数の実行時間(秒)')
+        lines.append(f'# TYPE {metric_name} histogram')
+        bounds = self.buckets + (float('inf'),)
+        for labels, _, bucket_counts, duration_sum in snapshot:
+            cumulative = 0
+            for bound, count in zip(bounds, bucket_counts):
+                cumulative += count
+                lines.append(f'{metric_name}_bucket{{{labels},le="{formatNumber(bound)}"}} {cumulative}')
+            lines.append(f'{metric_name}_sum{{{labels}}} {formatNumber(duration_sum)}')
+            lines.append(f'{metric_name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_path):
+        """ファイルに出力する(収集中に不完全な内容を読まれないよう置き換えで書き込む)
+
+        Args:
+            file_path (str): 出力先のファイルパス
+        """
+        out_dir = os.path.dirname(file_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        temp_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(self.render())
+        os.replace(temp_path, file_path)
+
+
+def startServer(port):
+    """localhostでメトリクスを公開するHTTPサーバを起動する
+
+    Args:
+        port (int): 待ち受けるポート番号
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバ
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f'metrics: {format % args}')
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
+
+
+def enableMetrics():
+    """メトリクスの集計を開始し、定期的および終了時にファイルへ出力する
+
+    Params:
+        metrics.output (str): 出力先のファイルパス。空の場合はファイル出力しない
+        metrics.interval (float): 定期出力の間隔(秒)。0の場合は終了時のみ出力する
+        metrics.port (int): localhostで公開するポート番号。0の場合は公開しない
+        metrics.buckets (str): 実行時間のヒストグラムの境界(秒、カンマ区切り)
+    """
+    global registry
+    if registry is not None:
+        return registry
+
+    buckets = getParam('metrics.buckets', '')
+    if buckets:
+        registry = MetricsRegistry(float(bucket) for bucket in str(buckets).split(','))
+    else:
+        registry = MetricsRegistry()
+
+    output   = getParam('metrics.output', './log/metrics.prom')
+    interval = getParam('metrics.interval', 60, cast_type=float)
+    port     = getParam('metrics.port', 0, cast_type=int)
+
+    stop_event = threading.Event()
+    exporter = None
+    if output and interval > 0:
+        def exportLoop():
+            while not stop_event.wait(interval):
+                try:
+                    registry.write(output)
+                except Exception as e:
+                    logger.warning(f'メトリクスの出力に失敗しました: {e}')
+        exporter = threading.Thread(target=exportLoop, name='MetricsExporter', daemon=True)
+        exporter.start()
+
+    server = None
+    if port:
+        server = startServer(port)
+        print(f'metrics: http://127.0.0.1:{port}/metrics')
+
+    def writeMetrics():
+        stop_event.set()
+        # 定期出力と同じ一時ファイルに書き込まないよう、出力中の場合は終了を待つ
+        if exporter is not None:
+            exporter.join()
+        if server is not None:
+            server.shutdown()
+        if output:
+            registry.write(output)
+            print(f'metrics: {output}')
+
+    register_shutdown_hook(writeMetrics)
+    return registry
@@ -1,45 +1,398 @@
 import pyperclip
 import re
 import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from ruamel.yaml import YAML
 
+# 共有のパラメータ(スコープ外で設定した値。スコープからは読み取り専用の基底として参照する)
 parameters = {}
 
+
+class ParamIndex:
+    """ドット区切りのパラメータキーの階層索引
+
+    'app_path.chrome'のようなキーを区切りごとの入れ子の辞書で保持し、
+    接頭辞('app_path')配下のキーの列挙・削除を配下の件数分の処理で行う。
+    値はparametersに保持し、索引はキーのみを持つ。
+    yamlの最上位の数値・日付などの文字列でないキーは接頭辞で検索できないため索引に含めない。
+    """
+    # ノード内でキーの終端を表す印(区切りの文字列と重複しない)
+    LEAF = None
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key):
+        if not isinstance(key, str):
+            return
+        node = self.root
+        for part in key.split('.'):
+            child = node.get(part)
+            if child is None:
+                child = node[part] = {}
+            node = child
+        node[self.LEAF] = True
+
+    def remove(self, key):
+        if not isinstance(key, str):
+            return
+        path = []
+        node = self.root
+        for part in key.split('.'):
+            child = node.get(part)
+            if child is None:
+                return
+            path.append((node, part))
+            node = child
+        node.pop(self.LEAF, None)
+        # 空になったノードを取り除く
+        for parent, part in reversed(path):
+            if parent[part]:
+                break
+            del parent[part]
+
+    def findNode(self, prefix):
+        node = self.root
+        if not prefix:
+            return node
+        for part in prefix.split('.'):
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def iterKeys(self, prefix=''):
+        """接頭辞配下のキー(接頭辞と一致するキーを含む)を列挙する
+
+        Args:
+            prefix (str): 接頭辞(区切り単位で一致を判定する。空の場合は全て)
+
+        Yields:
+            str: パラメータのキー
+        """
+        node = self.findNode(prefix)
+        if node is None:
+            return
+        stack = [(prefix, node)]
+        while stack:
+            key, node = stack.pop()
+            if self.LEAF in node:
+                yield key
+            children = [(f'{key}.{part}' if key else part, child) for part, child in node.items() if part is not self.LEAF]
+            stack.extend(reversed(children))
+
+    def removeSubtree(self, prefix):
+        """接頭辞配下のキーを索引から取り除く
+
+        Args:
+            prefix (str): 接頭辞(空の場合は全て)
+
+        Returns:
+            list[str]: 取り除いたキー
+        """
+        keys = list(self.iterKeys(prefix))
+        if not prefix:
+            self.root = {}
+            return keys
+        parent_prefix, _, last = prefix.rpartition('.')
+        parent = self.findNode(parent_prefix)
+        if parent is not None and last in parent:
+            del parent[last]
+            if parent_prefix and not parent:
+                self.remove(parent_prefix)
+        return keys
+
+    def rebuild(self, keys):
+        self.root = {}
+        for key in keys:
+            self.add(key)
+
+
+# parametersのキーの階層索引
+param_index = ParamIndex()
+# 索引の更新・列挙の排他(値の参照はロックしない)
+_index_lock = threading.Lock()
+
+# delParamで未設定を表す値
+_UNSET = object()
+
+# パラメータのキー→値の変換関数
+# 最初に値が設定された時点の型で決まり、以降の設定では同じ型に変換する
+_casters = {}
+
+
+# Falseとみなす文字列(customFunction.false_list。循環参照防止のため初回の変換時に取得する)
+_false_values = None
+
+def castBool(value):
+    """bool型のパラメータへの変換('a=b'、'a!=b'の形式は比較結果とする)"""
+    global _false_values
+    if type(value) is bool:
+        return value
+    text = str(value)
+    if '=' in text:
+        from lib.customFunction import toBool
+        return toBool(text)
+    if _false_values is None:
+        from lib.customFunction import false_list
+        _false_values = frozenset(false_list)
+    return text.strip().lower() not in _false_values
+
+
+def makeCaster(value_type):
+    """指定した型のパラメータへの変換関数を作成する
+
+    Args:
+        value_type (type): パラメータの型
+
+    Returns:
+        Callable[[Any], Any]: 値を変換する関数(同じ型の値はそのまま返す)
+    """
+    if value_type is bool:
+        return castBool
+
+    def cast(value):
+        if type(value) is value_type:
+            return value
+        return value_type(str(value))
+    return cast
+
+
+def matchPrefix(key, prefix):
+    """キーが接頭辞配下か(区切り単位で判定する。空の接頭辞は全てに一致する)"""
+    if not prefix:
+        return True
+    return isinstance(key, str) and (key == prefix or key.startswith(prefix + '.'))
+
+
+class ParamScope:
+    """実行コンテキスト(スレッド・タスク)ごとのパラメータのスコープ
+
+    親のスコープ(最も外側は共有のparameters)の値を読み取り専用で参照し、
+    設定・削除はこのスコープのみに記録する(copy-on-write)。
+    exportを呼び出すまで親や他のスコープには反映しない。
+
+    Attributes:
+        parent (ParamScope or None): 親のスコープ(Noneの場合は共有のparameters)
+        values (dict): このスコープで設定したキー→値
+        casters (dict): このスコープで設定したキー→変換関数
+        deleted (set): このスコープで削除したキー
+    """
+    __slots__ = ('parent', 'values', 'casters', 'deleted')
+
+    def __init__(self, parent=None):
+        self.parent  = parent
+        self.values  = {}
+        self.casters = {}
+        self.deleted = set()
+
+    def lookup(self, key):
+        """値を取得する(未設定の場合は_UNSET)"""
+        scope = self
+        while scope is not None:
+            value = scope.values.get(key, _UNSET)
+            if value is not _UNSET:
+                return value
+            if key in scope.deleted:
+                return _UNSET
+            scope = scope.parent
+        return parameters.get(key, _UNSET)
+
+    def set(self, key, value, cast_type=None, disable_cast=False):
+        if disable_cast:
+            self.casters.pop(key, None)
+        else:
+            if cast_type is not None:
+                caster = self.casters[key] = makeCaster(cast_type)
+            else:
+                caster = self.casters.get(key)
+                if caster is None:
+                    current = self.lookup(key)
+                    if current is not _UNSET and current is not None:
+                        caster = self.casters[key] = makeCaster(type(current))
+            if caster is not None:
+                value = caster(value)
+        self.values[key] = value
+        self.deleted.discard(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.casters.pop(key, None)
+        self.deleted.add(key)
+
+    def keys(self, prefix=''):
+        """接頭辞配下の参照可能なキーを取得する"""
+        if self.parent is None:
+            with _index_lock:
+                inherited = list(parameters) if not prefix else list(param_index.iterKeys(prefix))
+        else:
+            inherited = self.parent.keys(prefix)
+        keys = [key for key in inherited if key not in self.values and key not in self.deleted]
+        keys.extend(key for key in self.values if matchPrefix(key, prefix))
+        return keys
+
+    def export(self, exclude=()):
+        """このスコープで設定・削除したパラメータを親のスコープへ反映する
+
+        Args:
+            exclude (Iterable[str]): 反映しないキー(戻り値のreturnなど)
+        """
+        with useScope(self.parent):
+            for key in self.deleted:
+                if key not in exclude:
+                    delParam(key)
+            for key, value in self.values.items():
+                if key not in exclude:
+                    setParam(key, value, disable_cast=True)
+
+
+# 実行中のスコープ(Noneの場合は共有のparametersを直接参照・更新する)
+_current_scope = ContextVar('param_scope', default=None)
+
+
+def getScope():
+    """実行中のパラメータのスコープを取得する
+
+    Returns:
+        ParamScope or None: スコープ外の場合はNone
+    """
+    return _current_scope.get()
+
+
+@contextmanager
+def useScope(scope):
+    """指定したスコープでパラメータを参照・設定する
+
+    Args:
+        scope (ParamScope or None): 使用するスコープ(Noneの場合は共有のparameters)
+
+    Yields:
+        ParamScope or None: 指定したスコープ
+    """
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def paramScope(parent=_UNSET):
+    """新しいスコープでパラメータを参照・設定する
+
+    スコープ内で設定した値はスコープ内のみで有効になり、終了後は元に戻る。
+    呼び出し元に残す場合はスコープのexportを呼び出す。
+
+    Args:
+        parent (ParamScope or None, optional): 親のスコープ。省略した場合は実行中のスコープ
+            (別スレッドで使う場合は呼び出し元のgetScope()の結果を渡す)
+
+    Returns:
+        ContextManager[ParamScope]: 作成したスコープを返すコンテキストマネージャ
+
+    Examples:
+        >>> with paramScope() as scope:
+        ...     setParam('return', 1)   # 呼び出し元のreturnは変わらない
+        ...     scope.export(exclude=('return',))
+    """
+    if parent is _UNSET:
+        parent = _current_scope.get()
+    return useScope(ParamScope(parent))
+
+
 def setParam(key, value, cast_type=None, disable_cast=False):
-    from lib.customFunction import toBool
+    """パラメータを設定する
+
+    設定済みのパラメータは既存の値と同じ型に変換して設定する。
+
+    Args:
+        key (str): パラメータのキー
+        value (Any): 設定する値
+        cast_type (type, optional): 変換する型(以降はこの型のパラメータとして扱う)
+        disable_cast (bool): Trueの場合は変換せずにそのまま設定する(以降は設定した値の型になる)
+
+    Raises:
+        KeyError: 予約済みのパラメータ(clip, input等)を設定しようとした場合
+        ValueError: 既存の値の型に変換できない場合
+    """
+    if key in reservedParams:
+        raise KeyError(f"パラメータ '{key}' は予約されているため設定できません。")
+
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.set(key, value, cast_type, disable_cast)
+        return
+
     if disable_cast:
+        if key not in parameters:
+            addIndex(key)
         parameters[key] = value
+        _casters.pop(key, None)
         return
-    
+
     if cast_type is not None:
-        parameters[key] = cast_type(value)
-    
-    if hasParam(key):
-        cast_type = type(getParam(key))
-        try:
-            if cast_type is bool:
-                value = toBool(str(value))
-            else:
-                value = cast_type(str(value))
-        except (ValueError, TypeError) as e:
-            raise
-    
-    parameters[key] = value
+        if key not in parameters:
+            addIndex(key)
+        caster = _casters[key] = makeCaster(cast_type)
+    else:
+        # 変換関数がある場合は設定済み(delParamで変換関数も削除する)
+        caster = _casters.get(key)
+        if caster is None:
+            current = parameters.get(key)
+            if current is None:
+                # 未設定の場合はそのまま設定する(型は次回の設定時に決まる)
+                if key not in parameters:
+                    addIndex(key)
+                parameters[key] = value
+                return
+            caster = _casters[key] = makeCaster(type(current))
+
+    parameters[key] = caster(value)
+
+
+def addIndex(key):
+    with _index_lock:
+        param_index.add(key)
+
 
 def getParam(key, default_value=None, cast_type=None):
-    value = None
-    if key in reservedParams:
-        value = reservedParams[key]()
-    elif hasParam(key):
-        value = parameters[key]
-    elif default_value is not None:
-        value = default_value
-        setParam(key, value)
-            
+    """パラメータを取得する
+
+    Args:
+        key (str): パラメータのキー
+        default_value (Any, optional): 未設定の場合に設定して返す値
+        cast_type (type, optional): 変換して返す型
+
+    Returns:
+        Any: パラメータの値
+
+    Raises:
+        KeyError: 未設定でdefault_valueも指定されていない場合
+        ValueError: cast_typeに変換できない場合
+
+    Note:
+        スコープ内では、スコープで設定した値→親のスコープ→共有のparametersの順に参照する。
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        value = parameters.get(key)
+    else:
+        value = scope.lookup(key)
+        if value is _UNSET:
+            value = None
     if value is None:
-        raise KeyError(f"パラメータ '{key}' が設定されていません。")
-    
-    if not cast_type:
+        if key in reservedParams:
+            value = getReservedParam(key)
+        elif default_value is not None:
+            value = default_value
+            setParam(key, value)
+        if value is None:
+            raise KeyError(f"パラメータ '{key}' が設定されていません。")
+
+    if cast_type is None or type(value) is cast_type:
         return value
     try:
         if cast_type is bool:
@@ -50,6 +403,31 @@ def getParam(key, default_value=None, cast_type=None):
         raise ValueError(f"パラメータ '{key}' を {cast_type.__name__} に変換できません: {e}")
 
 
+def restoreParams(params):
+    """共有のパラメータを全て置き換える
+
+    Args:
+        params (dict): キー→値
+    """
+    with _index_lock:
+        parameters.clear()
+        parameters.update(params)
+        _casters.clear()
+        param_index.rebuild(parameters)
+
+
+def snapshotParams():
+    """実行中のスコープから参照できるパラメータを取得する
+
+    Returns:
+        dict: キー→値(スコープ外の場合は共有のparametersの複製)
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return dict(parameters)
+    return {key: scope.lookup(key) for key in scope.keys()}
+
+
 def getReservedParams(key):
     if key == 'clip':
         return pyperclip.paste()
@@ -72,6 +450,12 @@ def getReservedParams(key):
         
 
 def getClip():
+    """クリップボードの内容を取得する(改行はLFに揃える)
+
+    Note:
+        Linuxではxclip/xsel等を呼び出すため、呼び出しごとにプロセスを起動する。
+        ${clip}はgetReservedParamでclip_cache_ttl秒キャッシュした値を返す。
+    """
     result = pyperclip.paste()
     result = re.sub(r'\r\n?|\n', r'\n', result)
     return result
@@ -91,10 +475,230 @@ def getInput():
         return user_input
 
 
-def loadParams(file_path, encoding='utf-8'):
+# キャッシュの形式(変更した場合は既存のキャッシュを使わない)
+PARAM_CACHE_VERSION = 2
+# 読み込んだキャッシュ(保存先, 絶対パス→((更新日時, サイズ, エンコーディング), 最上位のキー, (キー, 値)のリスト))
+_param_cache = (None, {})
+# 保存していない読込結果があるか(起動時の読込が終わった時点と終了時にまとめて保存する)
+_param_cache_dirty = False
+# キャッシュの更新の排他(パラメータファイルの監視スレッドからも読み込むため)
+_param_cache_lock = threading.Lock()
+
+
+def getParamCache():
+    """パラメータファイルの読込結果のキャッシュを取得する(初回のみファイルから読み込む)
+
+    Returns:
+        tuple[str, dict]: (保存先, 絶対パス→読込結果)。保存先が空の場合はキャッシュしない
+
+    Params:
+        PARAM_CACHE_FILE (str): 保存先。空(既定)の場合はキャッシュしない
+
+    Note:
+        キャッシュはpickleで読み込むため、他のユーザーが書き込めない場所を指定すること。
+    """
+    global _param_cache, _param_cache_dirty
+    cache_path = getParam('PARAM_CACHE_FILE', '')
+    if _param_cache[0] == cache_path:
+        return _param_cache
+
+    entries = {}
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('version') == PARAM_CACHE_VERSION:
+                entries = cached['files']
+        except Exception as e:
+            from lib.loggerSetting import getMyLogger
+            getMyLogger(__name__).warning(f'パラメータのキャッシュを読み込めないため再作成します: {cache_path} ({e})')
+    _param_cache = (cache_path, entries)
+    _param_cache_dirty = False
+    return _param_cache
+
+
+def saveParamCache():
+    """パラメータファイルの読込結果のキャッシュを保存する(前回の保存以降に解析したファイルがある場合のみ)
+
+    Note:
+        ファイルを解析するごとには保存せず、起動時のパラメータの読込後と終了時に呼び出す。
+    """
+    global _param_cache_dirty
+    with _param_cache_lock:
+        cache_path, entries = _param_cache
+        if not cache_path or not _param_cache_dirty:
+            return
+        _param_cache_dirty = False
+        entries = dict(entries)
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'version': PARAM_CACHE_VERSION, 'files': entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except Exception as e:
+        from lib.loggerSetting import getMyLogger
+        getMyLogger(__name__).warning(f'パラメータのキャッシュを保存できませんでした: {cache_path} ({e})')
+
+
+# 値の読込用のyamlローダー(初回の読込時に作成する)
+_safe_yaml = None
+
+def getSafeYaml():
+    """値の読込用のyamlローダーを取得する
+
+    コメント・書式を保持しないsafeローダーを使う(ruamel.yaml.clibがある場合はCの実装で解析する)。
+    """
+    global _safe_yaml
+    if _safe_yaml is None:
+        _safe_yaml = YAML(typ='safe', pure=False)
+    return _safe_yaml
+
+
+def flattenParams(data, parent_key=''):
+    """入れ子の辞書をドット区切りのキーと値の組にする
+
+    Args:
+        data (dict): yamlの読込結果
+        parent_key (str): 親のキー
+
+    Returns:
+        list[tuple[str, Any]]: (キー, 値)のリスト(ファイルの記述順)
+    """
+    items = []
+    for k, v in data.items():
+        key_path = f"{parent_key}.{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flattenParams(v, key_path))
+        else:
+            items.append((key_path, v))
+    return items
+
+
+def promptParams(target_file, text, encoding):
+    """値が'?'の項目の入力を求め、入力した値をファイルに書き戻す
+
+    書き戻す際にコメント・書式を保持するため、round-tripのローダーで読み直す。
+
+    Args:
+        target_file (str): ファイルのパス
+        text (str): ファイルの内容
+        encoding (str): 文字コード
+
+    Returns:
+        list[tuple[str, Any]]: (キー, 値)のリスト(入力した値を含む)
+    """
     yaml = YAML()
     yaml.preserve_quotes = True
+    data = yaml.load(text)
+
+    items = []
+    def recursive_update(d, parent_key=''):
+        for k, v in d.items():
+            key_path = f"{parent_key}.{k}" if parent_key else k
+            if isinstance(v, dict):
+                recursive_update(v, key_path)
+            elif v == '?':
+                new_value = input(f"「{key_path}」の値を入力してください: ")
+                d[k] = new_value
+                items.append((key_path, new_value))
+            else:
+                items.append((key_path, v))
+
+    recursive_update(data)
+    with open(target_file, 'w', encoding=encoding) as f:
+        yaml.dump(data, f)
+    return items
+
+
+def parseParamFile(target_file, encoding, allow_prompt=True):
+    """yamlファイルを解析し、ドット区切りのキーと値の組にする
+
+    値が'?'の項目がある場合のみ、入力を求めてファイルに書き戻す。
+
+    Args:
+        target_file (str): ファイルのパス
+        encoding (str): 文字コード
+        allow_prompt (bool): Falseの場合は'?'の項目の入力を求めずに例外とする
+
+    Returns:
+        tuple[list, list, bool]: (最上位のキー, (キー, 値)のリスト, 入力を求めたか)
+
+    Raises:
+        ValueError: allow_promptがFalseで、値が'?'の項目がある場合
+    """
+    with open(target_file, 'r', encoding=encoding) as f:
+        text = f.read()
+
+    data = getSafeYaml().load(text)
+    if data is None:
+        return [], [], False
+    top_keys = list(data)
+
+    items = flattenParams(data)
+    if any(isinstance(value, str) and value == '?' for _, value in items):
+        if not allow_prompt:
+            raise ValueError(f"値が'?'の項目があるため入力が必要です: {target_file}")
+        return top_keys, promptParams(target_file, text, encoding), True
+    return top_keys, items, False
+
 
+def readParamFile(target_file, encoding='utf-8', allow_prompt=True):
+    """yamlファイルを読み込み、ドット区切りのキーと値の組にする(パラメータは設定しない)
+
+    ファイルの(更新日時, サイズ, エンコーディング)がキャッシュと一致する場合はyamlを解析しない。
+
+    Args:
+        target_file (str): ファイルのパス
+        encoding (str): 文字コード
+        allow_prompt (bool): Falseの場合は'?'の項目の入力を求めずに例外とする
+
+    Returns:
+        tuple[list, list]: (最上位のキー, (キー, 値)のリスト)
+
+    Raises:
+        ValueError: allow_promptがFalseで、値が'?'の項目がある場合
+    """
+    global _param_cache_dirty
+    abs_path = os.path.abspath(target_file)
+    file_stat = os.stat(abs_path)
+    stamp = (file_stat.st_mtime_ns, file_stat.st_size, encoding)
+    with _param_cache_lock:
+        cache_path, entries = getParamCache()
+        cached = entries.get(abs_path) if cache_path else None
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    top_keys, items, updated = parseParamFile(target_file, encoding, allow_prompt)
+    # 入力を求めた場合はファイルを書き換えたため、次回の読込時にキャッシュする
+    if cache_path and not updated:
+        with _param_cache_lock:
+            entries[abs_path] = (stamp, top_keys, items)
+            _param_cache_dirty = True
+    return top_keys, items
+
+
+def loadParams(file_path, encoding='utf-8', replace=False):
+    """yamlファイルのパラメータを読み込む
+
+    入れ子の値は'app_path.chrome'のようにドット区切りのキーで設定する。
+    読込結果はファイルのパス・更新日時・サイズをキーにキャッシュし、
+    変更がないファイルは次回以降の起動でもyamlを解析せずに設定する。
+
+    Args:
+        file_path (str): ファイルのパス(見つからない場合はPARAM_FOLDERから探す)
+        encoding (str): 文字コード
+        replace (bool): Trueの場合、ファイルの最上位のキー配下の既存のパラメータを削除してから読み込む
+            (ファイルから消えた項目も反映する)
+
+    Raises:
+        FileNotFoundError: ファイルが見つからない場合
+
+    Params:
+        PARAM_CACHE_FILE (str): キャッシュの保存先。空の場合はキャッシュしない
+    """
     search_dir = getParam('PARAM_FOLDER', '')
     full_path = os.path.join(search_dir, file_path)
     
@@ -104,37 +708,83 @@ def loadParams(file_path, encoding='utf-8'):
         target_file = full_path
     else:
         raise FileNotFoundError(f"ファイルが見つかりません: '{file_path}' or '{full_path}'")
-    
-    with open(target_file, 'r', encoding=encoding) as f:
-        data = yaml.load(f)
 
-    def recursive_update(d, parent_key=''):
-        updated = False
-        for k, v in d.items():
-            key_path = f"{parent_key}.{k}" if parent_key else k
-            if isinstance(v, dict):
-                if recursive_update(v, key_path):
-                    updated = True
-            elif v == '?':
-                new_value = input(f"「{key_path}」の値を入力してください: ")
-                d[k] = new_value
-                updated = True
-                setParam(key_path, new_value)
-            else:
-                setParam(key_path, v)
-        return updated
+    top_keys, items = readParamFile(target_file, encoding)
 
-    updated = recursive_update(data)
-    if updated:
-        with open(file_path, 'w', encoding=encoding) as f:
-            yaml.dump(data, f)
+    if replace:
+        for k in top_keys:
+            # 文字列でないキー(数値・日付)は値をそのままのキーで、配下の値を文字列のキー('1.a'等)で保持している
+            if not isinstance(k, str):
+                delParam(k)
+                k = str(k)
+            delParams(k)
+
+    for key_path, value in items:
+        setParam(key_path, value)
 
 
 def hasParam(key):
+    scope = _current_scope.get()
+    if scope is not None:
+        return scope.lookup(key) is not _UNSET or key in reservedParams
     return key in parameters or key in reservedParams
 
-def showAllParams():
-    for key in parameters:
+def delParam(key):
+    """パラメータを削除する(未設定の場合は何もしない)
+
+    Args:
+        key (str): 削除するパラメータのキー
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.delete(key)
+        return
+    if parameters.pop(key, _UNSET) is not _UNSET:
+        with _index_lock:
+            param_index.remove(key)
+    _casters.pop(key, None)
+
+def listParams(prefix=''):
+    """接頭辞配下のパラメータのキーを取得する
+
+    Args:
+        prefix (str): 'app_path'のような接頭辞(区切り単位で一致を判定する)。空の場合は全て
+
+    Returns:
+        list[str]: キー(接頭辞と一致するキーを含む)
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        return scope.keys(prefix)
+    with _index_lock:
+        if not prefix:
+            return list(parameters)
+        return list(param_index.iterKeys(prefix))
+
+def delParams(prefix):
+    """接頭辞配下のパラメータを全て削除する
+
+    Args:
+        prefix (str): 'app_path'のような接頭辞
+
+    Returns:
+        int: 削除したパラメータの件数
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        keys = scope.keys(prefix)
+        for key in keys:
+            scope.delete(key)
+        return len(keys)
+    with _index_lock:
+        keys = param_index.removeSubtree(prefix)
+    for key in keys:
+        parameters.pop(key, None)
+        _casters.pop(key, None)
+    return len(keys)
+
+def showAllParams(prefix=''):
+    for key in listParams(prefix):
         showParam(key)
 
 def showParam(key):
@@ -148,3 +798,54 @@ reservedParams = {
     'input': getInput,
     '?'    : getInput,
 }
+
+# 値をキャッシュする予約済みパラメータ(キー→有効期間(秒)のパラメータキー)
+reserved_cache_ttl = {
+    'clip' : 'clip_cache_ttl',
+}
+
+# キャッシュした予約済みパラメータ(キー→(値, 有効期限))
+_reserved_cache = {}
+
+
+def getReservedParam(key):
+    """予約済みパラメータの値を取得する
+
+    reserved_cache_ttlに定義したキーは、有効期間内であれば前回取得した値を返す。
+
+    Args:
+        key (str): 予約済みパラメータのキー
+
+    Returns:
+        Any: パラメータの値
+
+    Params:
+        clip_cache_ttl (float): ${clip}をキャッシュする秒数(0の場合はキャッシュしない)
+    """
+    ttl_key = reserved_cache_ttl.get(key)
+    if ttl_key is None:
+        return reservedParams[key]()
+
+    now = time.monotonic()
+    cached = _reserved_cache.get(key)
+    if cached is not None and now < cached[1]:
+        return cached[0]
+    value = reservedParams[key]()
+    ttl = getParam(ttl_key, 0.0, cast_type=float)
+    if ttl > 0:
+        _reserved_cache[key] = (value, now + ttl)
+    return value
+
+
+def invalidateReservedParams(key=None):
+    """予約済みパラメータのキャッシュを破棄する
+
+    クリップボードを書き換える可能性があるアクションの実行後に呼び出す。
+
+    Args:
+        key (str, optional): 破棄するキー。省略した場合は全て
+    """
+    if key is None:
+        _reserved_cache.clear()
+    else:
+        _reserved_cache.pop(key, None)
@@ -0,0 +1,382 @@
+'''シナリオの行・アクションごとの実行時間の計測(プロファイル)
+
+profile.enabled: Trueの場合、通常アクションの行ごとに実行時間・回数・失敗回数を記録し、
+終了時に時間の長い順にコンソールとファイル(JSON/CSV)へ出力する。
+
+profile.actionsに指定したアクションは、実行中のみcProfileで関数単位の計測を行い、
+終了時に全呼び出しを合算した.pstatsファイルと上位の関数をコンソールへ出力する。
+'''
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from lib.paramSetting import getParam
+from lib.shutdownSetting import register_shutdown_hook
+from lib.loggerSetting import getMyLogger
+
+logger = getMyLogger(__name__)
+
+# 有効なプロファイラ(無効の場合はNone)
+profiler = None
+# 有効なアクション単位のcProfile(無効の場合はNone)
+action_profiler = None
+
+
+class ProfileStat:
+    """1つの行またはアクションの集計値
+
+    Attributes:
+        count (int): 実行回数
+        failures (int): 失敗回数
+        total (float): 合計時間(秒)。readやcallの行は呼び出し先の時間を含む
+        self_time (float): 呼び出し先の行の時間を除いた合計時間(秒)
+        max (float): 1回あたりの最大時間(秒)
+    """
+    __slots__ = ('count', 'failures', 'total', 'self_time', 'max')
+
+    def __init__(self):
+        self.count     = 0
+        self.failures  = 0
+        self.total     = 0.0
+        self.self_time = 0.0
+        self.max       = 0.0
+
+    def add(self, elapsed, self_time, failed):
+        self.count += 1
+        self.total += elapsed
+        self.self_time += self_time
+        if elapsed > self.max:
+            self.max = elapsed
+        if failed:
+            self.failures += 1
+
+    def toDict(self):
+        return {
+            'count'    : self.count,
+            'failures' : self.failures,
+            'total'    : round(self.total, 6),
+            'self'     : round(self.self_time, 6),
+            'mean'     : round(self.total / self.count, 6) if self.count else 0.0,
+            'max'      : round(self.max, 6),
+        }
+
+
+class Profiler:
+    """行(file:line)・アクションごとの実行時間を集計する
+
+    Note:
+        self_timeは入れ子の呼び出し(read/call)の時間を除いた値。
+        実行中の行はスレッド・タスクごとに保持するため、readParallel(parallel.mode: thread)や
+        gather(async_mode)で同時に実行した行の時間が互いに混ざることはない。
+        gatherの行は同時に実行した各ファイルの時間の合計を除くため、自己時間は0になる場合がある。
+    """
+    def __init__(self):
+        # (file_path, line_no)→(行の文字列, コマンド名, ProfileStat)
+        self.lines = {}
+        # コマンド名→ProfileStat
+        self.actions = {}
+        # 実行中の行の呼び出し先の合計時間([秒]の1要素のリスト。スレッド・タスクごとに独立)
+        self.child_time = ContextVar('profile_child_time', default=None)
+        # 集計の更新の排他(複数のスレッドから記録するため)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, instruction):
+        """命令の実行時間を計測する
+
+        Args:
+            instruction (Instruction): 実行する命令
+        """
+        parent_time = self.child_time.get()
+        child_time = [0.0]
+        token = self.child_time.set(child_time)
+        failed = True
+        start = time.perf_counter()
+        try:
+            yield
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - start
+            self.child_time.reset(token)
+            if parent_time is not None:
+                parent_time[0] += elapsed
+            self.record(instruction, elapsed, max(0.0, elapsed - child_time[0]), failed)
+
+    def record(self, instruction, elapsed, self_time, failed):
+        with self.lock:
+            self.recordStat(instruction, elapsed, self_time, failed)
+
+    def recordStat(self, instruction, elapsed, self_time, failed):
+        key = (instruction.file_path, instruction.line_no)
+        entry = self.lines.get(key)
+        if entry is None:
+            entry = self.lines[key] = (instruction.line, instruction.command, ProfileStat())
+        entry[2].add(elapsed, self_time, failed)
+
+        stat = self.actions.get(instruction.command)
+        if stat is None:
+            stat = self.actions[instruction.command] = ProfileStat()
+        stat.add(elapsed, self_time, failed)
+
+    def lineRows(self):
+        """行ごとの集計を自己時間の長い順に返す
+
+        Returns:
+            list[dict]: 行ごとの集計
+        """
+        rows = []
+        for (file_path, line_no), (line, command, stat) in self.lines.items():
+            row = {'location': f'{file_path}:{line_no}', 'line': line, 'action': command}
+            row.update(stat.toDict())
+            rows.append(row)
+        rows.sort(key=lambda row: row['self'], reverse=True)
+        return rows
+
+    def actionRows(self):
+        """アクションごとの集計を自己時間の長い順に返す
+
+        Returns:
+            list[dict]: アクションごとの集計
+        """
+        rows = []
+        for command, stat in self.actions.items():
+            row = {'action': command}
+            row.update(stat.toDict())
+            rows.append(row)
+        rows.sort(key=lambda row: row['self'], reverse=True)
+        return rows
+
+    def printReport(self, top):
+        """集計結果をコンソールに出力する
+
+        Args:
+            top (int): 出力する最大件数
+        """
+        print(f'--- profile: lines (top {top}, sorted by self time) ---')
+        print(f'{"self[s]":>10} {"total[s]":>10} {"count":>7} {"fail":>5}  location / line')
+        for row in self.lineRows()[:top]:
+            print(f'{row["self"]:>10.3f} {row["total"]:>10.3f} {row["count"]:>7} {row["failures"]:>5}  {row["location"]}  {row["line"]}')
+        print(f'--- profile: actions (top {top}, sorted by self time) ---')
+        print(f'{"self[s]":>10} {"total[s]":>10} {"count":>7} {"fail":>5}  action')
+        for row in self.actionRows()[:top]:
+            print(f'{row["self"]:>10.3f} {row["total"]:>10.3f} {row["count"]:>7} {row["failures"]:>5}  {row["action"]}')
+
+    def writeReport(self, file_path):
+        """集計結果をファイルに出力する(拡張子が.csvの場合はCSV、それ以外はJSON)
+
+        Args:
+            file_path (str): 出力先のファイルパス
+        """
+        out_dir = os.path.dirname(file_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        if file_path.lower().endswith('.csv'):
+            fields = ['kind', 'location', 'line', 'action', 'count', 'failures', 'total', 'self', 'mean', 'max']
+            with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                for row in self.lineRows():
+                    writer.writerow({'kind': 'line', **row})
+                for row in self.actionRows():
+                    writer.writerow({'kind': 'action', **row})
+            return
+
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({'lines': self.lineRows(), 'actions': self.actionRows()}, f, ensure_ascii=False, indent=2)
+
+
+def getProfiler():
+    """有効なプロファイラを取得する
+
+    Returns:
+        Profiler or None: profile.enabledがFalseの場合はNone
+    """
+    return profiler
+
+
+def enableProfiler():
+    """プロファイラを有効にし、終了時にレポートを出力する
+
+    Params:
+        profile.top (int): コンソールに出力する最大件数
+        profile.output (str): レポートの出力先(.json or .csv)。空の場合はファイル出力しない
+    """
+    global profiler
+    if profiler is not None:
+        return profiler
+    profiler = Profiler()
+
+    def reportProfile():
+        top = getParam('profile.top', 20, cast_type=int)
+        profiler.printReport(top)
+        output = getParam('profile.output', '')
+        if output:
+            profiler.writeReport(output)
+            print(f'profile report: {output}')
+
+    register_shutdown_hook(reportProfile)
+    return profiler
+
+
+class ActionProfiler:
+    """指定したアクションの実行中のみcProfileで計測する
+
+    Attributes:
+        targets (dict): アクション関数→指定されたコマンド名
+        profiles (dict): コマンド名→cProfile.Profile(全呼び出しを合算)
+        skipped (dict): コマンド名→他の計測中のアクションと重なったため計測しなかった回数
+
+    Note:
+        cProfileはプロセス内で同時に1つしか有効にできないため、readParallel(parallel.mode: thread)や
+        gather(async_mode)で同時に実行したアクションは、先に開始した1つのみ計測する。
+    """
+    def __init__(self, targets):
+        self.targets  = targets
+        self.profiles = {}
+        self.skipped  = {}
+        # 計測中のコマンド名(実行コンテキストごと。計測中のアクションから呼び出した行は計測しない)
+        self.active = ContextVar('action_profile_active', default=None)
+        # 計測中のアクションの排他(計測を開始したスレッド・タスクのみが解放する)
+        self.lock = threading.Lock()
+
+    def measure(self, func):
+        """アクションの実行をcProfileで計測する
+
+        計測対象でない場合や、計測中のアクションから呼び出された場合(readで読み込んだ
+        ファイル内の行など)は何もしない。呼び出し先の時間は外側のアクションに含まれる。
+        他のスレッド・タスクのアクションを計測中の場合は計測せず、skippedに数える。
+
+        Args:
+            func (callable): 実行するアクション関数
+
+        Returns:
+            ContextManager: 計測を行うコンテキストマネージャ
+        """
+        name = self.targets.get(func)
+        if name is None or self.active.get() is not None:
+            return nullcontext()
+        if not self.lock.acquire(blocking=False):
+            self.skipped[name] = self.skipped.get(name, 0) + 1
+            return nullcontext()
+        return self.profile(name)
+
+    @contextmanager
+    def profile(self, name):
+        # measureで取得したロックを終了時に解放する
+        try:
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = cProfile.Profile()
+            token = self.active.set(name)
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self.active.reset(token)
+        finally:
+            self.lock.release()
+
+    def getStats(self, name=None):
+        """計測結果を取得する
+
+        Args:
+            name (str, optional): コマンド名。省略した場合は全アクションを合算する
+
+        Returns:
+            pstats.Stats or None: 計測結果。1回も実行していない場合はNone
+        """
+        if name is None:
+            profiles = list(self.profiles.values())
+        else:
+            profiles = [self.profiles[name]] if name in self.profiles else []
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def printReport(self, top):
+        """アクションごとに累積時間の長い関数をコンソールに出力する
+
+        Args:
+            top (int): 出力する最大件数
+        """
+        for name in self.profiles:
+            stats = self.getStats(name)
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats('cumulative').print_stats(top)
+            print(f'--- profile: {name} (cProfile, top {top}, sorted by cumulative time) ---')
+            print(stream.getvalue().strip('\n'))
+        for name, count in self.skipped.items():
+            print(f'profile: {name} は他のアクションの計測中に実行されたため{count}回計測しませんでした')
+
+    def writeReport(self, file_path):
+        """全アクションを合算した計測結果を.pstatsファイルに出力する
+
+        Args:
+            file_path (str): 出力先のファイルパス(pstats.Statsやsnakevizで読み込める)
+        """
+        out_dir = os.path.dirname(file_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        self.getStats().dump_stats(file_path)
+
+
+def getActionProfiler():
+    """有効なアクション単位のcProfileを取得する
+
+    Returns:
+        ActionProfiler or None: profile.actionsが空の場合はNone
+    """
+    return action_profiler
+
+
+def enableActionProfiler():
+    """profile.actionsに指定したアクションのcProfileを有効にし、終了時にレポートを出力する
+
+    Params:
+        profile.actions (str): 計測するコマンド名(カンマ区切り。'u.click'のようにモジュール名も指定できる)
+        profile.top (int): コンソールに出力する関数の最大件数
+        profile.actions_output (str): .pstatsファイルの出力先。空の場合はファイル出力しない
+    """
+    global action_profiler
+    if action_profiler is not None:
+        return action_profiler
+
+    # 循環参照防止のため関数内でインポート
+    from moduleList import getCommandIndex
+    index = getCommandIndex(getParam('module_priority'))
+    targets = {}
+    for name in getParam('profile.actions', '').split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in index:
+            logger.warning(f'profile.actionsに存在しないコマンドが指定されています: {name}')
+            continue
+        targets[index[name]] = name
+    action_profiler = ActionProfiler(targets)
+
+    def reportActionProfile():
+        if not action_profiler.profiles:
+            print('profile.actionsに指定したアクションは実行されませんでした')
+            return
+        top = getParam('profile.top', 20, cast_type=int)
+        action_profiler.printReport(top)
+        output = getParam('profile.actions_output', '')
+        if output:
+            action_profiler.writeReport(output)
+            print(f'profile stats: {output}')
+
+    register_shutdown_hook(reportActionProfile)
+    return action_profiler
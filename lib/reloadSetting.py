@@ -0,0 +1,166 @@
+'''実行中のパラメータファイルの変更の反映(ホットリロード)
+
+param_reload.enabled: Trueの場合、監視スレッドがPARAM_FOLDER(param_reload.folder)配下のyamlファイルの
+更新日時・サイズを定期的に確認し、変更されたファイルの値が変わった項目のみを反映する。
+反映は実行中のアクションの途中では行わず、次の行を実行する前にメインスレッドで行う。
+'''
+import os
+import threading
+import time
+from collections import deque
+from lib.paramSetting import getParam, setParam, readParamFile, useScope
+from lib.shutdownSetting import register_shutdown_hook
+from lib.loggerSetting import getMyLogger
+
+logger = getMyLogger(__name__)
+
+# 反映待ちの変更((ファイルのパス, (キー, 値)のリスト)。監視スレッドが追加し、applyReloadsで反映する)
+pending_reloads = deque()
+
+# 有効な監視(無効の場合はNone)
+watcher = None
+
+
+def applyReloads():
+    """監視スレッドが検出した変更をパラメータに反映する
+
+    Note:
+        readLinesが行の実行前に呼び出す。既存の値の型に変換できない値は反映しない。
+        実行中のスコープに関わらず共有のパラメータに反映する。
+    """
+    with useScope(None):
+        while pending_reloads:
+            try:
+                file_path, changes = pending_reloads.popleft()
+            except IndexError:
+                # 並列実行(parallel.mode: thread)の他のスレッドが先に反映した
+                break
+            applied = []
+            for key, value in changes:
+                try:
+                    setParam(key, value)
+                    applied.append(key)
+                except (KeyError, ValueError, TypeError) as e:
+                    logger.warning(f'パラメータを反映できませんでした: {key}={value!r} ({e})')
+            if applied:
+                logger.info(f'パラメータを再読込しました: {file_path} ({", ".join(applied)})')
+
+
+class ParamWatcher:
+    """パラメータファイルの変更を監視する
+
+    Attributes:
+        folder (str): 監視するフォルダ
+        interval (float): 確認の間隔(秒)
+        debounce (float): 変更後、更新が止まってから反映するまでの秒数
+    """
+    def __init__(self, folder, interval, debounce):
+        self.folder   = folder
+        self.interval = interval
+        self.debounce = debounce
+        # ファイルのパス→(更新日時, サイズ)
+        self.stamps = {}
+        # ファイルのパス→前回読み込んだ値(キー→値)
+        self.values = {}
+        # ファイルのパス→(変更後の(更新日時, サイズ), 最初に検出した時刻)
+        self.changing = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def scan(self):
+        """監視対象のファイルの(更新日時, サイズ)を取得する
+
+        Returns:
+            dict: ファイルのパス→(更新日時, サイズ)
+        """
+        stamps = {}
+        for root, _, files in os.walk(self.folder):
+            for filename in files:
+                if not filename.endswith('.yaml'):
+                    continue
+                file_path = os.path.join(root, filename)
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError:
+                    # 保存中に削除・置換された場合は次回に確認する
+                    continue
+                stamps[file_path] = (file_stat.st_mtime_ns, file_stat.st_size)
+        return stamps
+
+    def readValues(self, file_path):
+        _, items = readParamFile(file_path, allow_prompt=False)
+        return dict(items)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='ParamWatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        # 起動時の内容を変更前の値とする(キャッシュがある場合は解析しない)
+        self.stamps = self.scan()
+        for file_path in self.stamps:
+            try:
+                self.values[file_path] = self.readValues(file_path)
+            except Exception as e:
+                logger.debug(f'監視開始時に読み込めませんでした: {file_path} ({e})')
+                self.values[file_path] = {}
+
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f'パラメータファイルの監視に失敗しました: {e}')
+
+    def poll(self):
+        """変更されたファイルを確認し、更新が止まったファイルの変更を反映待ちにする"""
+        now = time.monotonic()
+        for file_path, stamp in self.scan().items():
+            if self.stamps.get(file_path) == stamp:
+                self.changing.pop(file_path, None)
+                continue
+
+            # 保存途中のファイルを読まないよう、更新が止まってからdebounce秒待つ
+            changing = self.changing.get(file_path)
+            if changing is None or changing[0] != stamp:
+                self.changing[file_path] = (stamp, now)
+                continue
+            if now - changing[1] < self.debounce:
+                continue
+            del self.changing[file_path]
+            self.stamps[file_path] = stamp
+
+            try:
+                values = self.readValues(file_path)
+            except Exception as e:
+                logger.warning(f'変更されたパラメータファイルを読み込めません: {file_path} ({e})')
+                continue
+            previous = self.values.get(file_path, {})
+            self.values[file_path] = values
+            changes = [(key, value) for key, value in values.items()
+                       if key not in previous or previous[key] != value]
+            if changes:
+                pending_reloads.append((file_path, changes))
+
+
+def enableParamReload():
+    """パラメータファイルの監視を開始する
+
+    Params:
+        param_reload.folder (str): 監視するフォルダ。空の場合はPARAM_FOLDER
+        param_reload.interval (float): 変更を確認する間隔(秒)
+        param_reload.debounce (float): 変更後、更新が止まってから反映するまでの秒数
+    """
+    global watcher
+    if watcher is not None:
+        return watcher
+    watcher = ParamWatcher(
+        getParam('param_reload.folder', '') or getParam('PARAM_FOLDER'),
+        getParam('param_reload.interval', 1.0, cast_type=float),
+        getParam('param_reload.debounce', 0.5, cast_type=float),
+    )
+    watcher.start()
+    register_shutdown_hook(watcher.stop)
+    return watcher
@@ -1,13 +1,39 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 _shutdown_hooks = []
+# 実行中の子シナリオの終了時に呼び出す関数(子シナリオの外ではNone)
+_scope_hooks = ContextVar('shutdown_scope_hooks', default=None)
+
+def register_shutdown_hook(func, process_wide=False):
+    """シャットダウン時に呼び出す関数を登録
 
-def register_shutdown_hook(func):
-    """シャットダウン時に呼び出す関数を登録"""
-    _shutdown_hooks.append(func)
+    子シナリオ(readParallel)の実行中に登録した関数は、その子シナリオの終了時に呼び出す。
 
-def run_shutdown_hooks():
+    Args:
+        func (Callable[[], None]): 引数なしの関数
+        process_wide (bool): Trueの場合、子シナリオの実行中でもプロセスの終了時に呼び出す
+    """
+    hooks = None if process_wide else _scope_hooks.get()
+    if hooks is None:
+        hooks = _shutdown_hooks
+    hooks.append(func)
+
+def run_shutdown_hooks(hooks=None):
     """登録された全てのシャットダウン処理を実行"""
-    for func in _shutdown_hooks:
+    for func in _shutdown_hooks if hooks is None else hooks:
         try:
             func()
         except Exception as e:
             print(f"[shutdown error] {func.__name__}: {e}")
+
+@contextmanager
+def shutdownScope():
+    """子シナリオの実行中に登録されたシャットダウン処理を、終了時(失敗した場合も)に実行する"""
+    hooks = []
+    token = _scope_hooks.set(hooks)
+    try:
+        yield hooks
+    finally:
+        _scope_hooks.reset(token)
+        run_shutdown_hooks(hooks)
@@ -0,0 +1,238 @@
+'''${...}形式の変数展開を行うテンプレート
+
+行の文字列を1回だけリテラル部と変数部に分解しておき、
+実行時は全ての変数を1パスで置換する。
+
+書式:
+    ${key}          パラメータkeyの値
+    ${key|default}  keyが未設定の場合はdefault
+    ${url.${site}}  キー自体に変数を含めることも可能
+'''
+from functools import lru_cache
+from lib.paramSetting import getParam, hasParam
+from lib.loggerSetting import getMyLogger
+
+# キーとデフォルト値の区切り文字
+DEFAULT_SEP = '|'
+
+
+class Placeholder:
+    """テンプレート内の変数部
+
+    Attributes:
+        key (str or Template): パラメータのキー(変数を含む場合はTemplate)
+        default (str or Template or None): 未設定時の値(指定がない場合はNone)
+    """
+    __slots__ = ('key', 'default')
+
+    def __init__(self, key, default):
+        self.key     = key
+        self.default = default
+
+
+class Template:
+    """リテラル部と変数部に分解済みの文字列
+
+    Attributes:
+        text (str): 元の文字列
+        parts (list[str or Placeholder]): 分解結果
+        is_static (bool): 変数部を含まない場合True
+    """
+    __slots__ = ('text', 'parts', 'is_static')
+
+    def __init__(self, text):
+        self.text      = text
+        self.parts     = parseTemplate(text)
+        self.is_static = all(part.__class__ is str for part in self.parts)
+
+    def render(self, cache=None, replaced=None):
+        """変数部をパラメータの値で置換した文字列を返す
+
+        Args:
+            cache (dict, optional): 取得済みの値(key→値)。同じキーは1回だけ取得する
+            replaced (list, optional): 置換内容(key, 値)の記録先
+
+        Returns:
+            str: 置換後の文字列
+
+        Raises:
+            KeyError: 未設定のパラメータをデフォルト値なしで参照した場合
+
+        Note:
+            reserved parameter(clip/input)も同じキーは1行につき1回だけ取得する。
+            置換後の値に含まれる${...}は再展開しない。
+        """
+        if self.is_static:
+            return self.text
+        if cache is None:
+            cache = {}
+
+        chunks = []
+        for part in self.parts:
+            if part.__class__ is str:
+                chunks.append(part)
+                continue
+
+            key = part.key
+            if key.__class__ is not str:
+                key = key.render(cache, replaced)
+
+            if key in cache:
+                chunks.append(cache[key])
+                continue
+
+            if hasParam(key):
+                value = str(getParam(key))
+                cache[key] = value
+            elif part.default is not None:
+                value = part.default
+                if value.__class__ is not str:
+                    value = value.render(cache, replaced)
+            else:
+                raise KeyError(f"パラメータ '{key}' が設定されていません。")
+
+            if replaced is not None:
+                replaced.append((key, value))
+            chunks.append(value)
+
+        return ''.join(chunks)
+
+
+def findClosingBrace(text, start):
+    """ネストを考慮して'${'に対応する'}'の位置を探す
+
+    Args:
+        text (str): 対象の文字列
+        start (int): '${'の直後の位置
+
+    Returns:
+        int: 対応する'}'の位置。見つからない場合は-1
+    """
+    depth = 0
+    pos = start
+    length = len(text)
+    while pos < length:
+        if text.startswith('${', pos):
+            depth += 1
+            pos += 2
+            continue
+        if text[pos] == '}':
+            if depth == 0:
+                return pos
+            depth -= 1
+        pos += 1
+    return -1
+
+
+def parsePlaceholder(inner):
+    """'${'と'}'の間の文字列をキーとデフォルト値に分解する
+
+    Args:
+        inner (str): '${'と'}'の間の文字列
+
+    Returns:
+        Placeholder: 変数部
+    """
+    # ネストした変数内の区切り文字は無視する
+    depth = 0
+    sep_pos = -1
+    for pos, char in enumerate(inner):
+        if inner.startswith('${', pos):
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == DEFAULT_SEP and depth == 0:
+            sep_pos = pos
+            break
+
+    if sep_pos == -1:
+        key, default = inner, None
+    else:
+        key, default = inner[:sep_pos], inner[sep_pos + 1:]
+
+    if '${' in key:
+        key = Template(key)
+    if default is not None and '${' in default:
+        default = Template(default)
+    return Placeholder(key, default)
+
+
+def parseTemplate(text):
+    """文字列をリテラル部と変数部に分解する
+
+    Args:
+        text (str): 対象の文字列
+
+    Returns:
+        list[str or Placeholder]: 分解結果
+
+    Note:
+        閉じられていない'${'と空の'${}'はリテラルとして扱う。
+    """
+    parts = []
+    literal_start = 0
+    pos = text.find('${')
+    while pos != -1:
+        end = findClosingBrace(text, pos + 2)
+        if end == -1:
+            break
+        inner = text[pos + 2:end]
+        if inner:
+            if pos > literal_start:
+                parts.append(text[literal_start:pos])
+            parts.append(parsePlaceholder(inner))
+            literal_start = end + 1
+        pos = text.find('${', end + 1)
+
+    if literal_start < len(text):
+        parts.append(text[literal_start:])
+    return parts
+
+
+@lru_cache(maxsize=4096)
+def compileTemplate(text):
+    """文字列をテンプレートに変換する(同じ文字列は使い回す)
+
+    Args:
+        text (str): 対象の文字列
+
+    Returns:
+        Template: 分解済みのテンプレート
+    """
+    return Template(text)
+
+
+def renderTemplates(templates):
+    """複数のテンプレートを1回で置換する
+
+    同じキーの値は1回だけ取得し、置換内容はまとめて1行でログ出力する。
+
+    Args:
+        templates (Iterable[Template]): 置換するテンプレート
+
+    Returns:
+        tuple[str]: 置換後の文字列(templatesと同じ順)
+
+    Raises:
+        KeyError: 未設定のパラメータをデフォルト値なしで参照した場合
+    """
+    cache = {}
+    replaced = []
+    results = tuple(template.render(cache, replaced) for template in templates)
+    if replaced:
+        logger = getMyLogger(__name__)
+        summary = ', '.join(f'${{{key}}} -> {value}' for key, value in replaced)
+        logger.info(f'変数を置換しました : {summary}')
+    return results
+
+
+def expandText(text):
+    """文字列の変数を置換する
+
+    Args:
+        text (str): 置換対象の文字列
+
+    Returns:
+        str: 置換後の文字列
+    """
+    return renderTemplates((compileTemplate(text),))[0]
@@ -0,0 +1,118 @@
+'''instrumentedの呼び出しをChromeのtrace event形式で記録する
+
+trace.enabled: Trueの場合、instrumentedで装飾した関数の呼び出しごとに
+開始時刻・所要時間・スレッド・引数を記録し、終了時にJSONファイルへ出力する。
+出力したファイルはPerfetto(https://ui.perfetto.dev)やchrome://tracingで開ける。
+'''
+import json
+import os
+import threading
+import time
+from lib.paramSetting import getParam
+from lib.shutdownSetting import register_shutdown_hook
+
+# 有効なトレース記録(無効の場合はNone)
+tracer = None
+
+# 引数の文字列の最大長(長い引数で出力が肥大化しないようにする)
+MAX_ARG_LENGTH = 200
+
+
+class TraceRecorder:
+    """trace eventを記録する
+
+    Attributes:
+        events (list[dict]): 記録したイベント
+        max_events (int): 記録する最大件数(超えた分は記録しない)
+    """
+    def __init__(self, max_events):
+        self.events = []
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.dropped = 0
+
+    def add(self, name, start, end, args, failed):
+        """1回の呼び出しを完了イベント(ph: X)として記録する
+
+        Args:
+            name (str): 関数名
+            start (float): 開始時刻(time.perf_counter)
+            end (float): 終了時刻(time.perf_counter)
+            args (dict or None): 引数(名前→repr)
+            failed (bool): 例外で終了した場合True
+        """
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        event = {
+            'name': name,
+            'cat' : 'failed' if failed else 'instrumented',
+            'ph'  : 'X',
+            'ts'  : round((start - self.origin) * 1_000_000, 1),
+            'dur' : round((end - start) * 1_000_000, 1),
+            'pid' : self.pid,
+            'tid' : threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def write(self, file_path):
+        """記録したイベントをJSONファイルに出力する
+
+        Args:
+            file_path (str): 出力先のファイルパス
+        """
+        out_dir = os.path.dirname(file_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        # スレッド名をタイムライン上に表示する
+        metadata = [{
+            'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread.ident,
+            'args': {'name': thread.name},
+        } for thread in threading.enumerate()]
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+def formatTraceArgs(arguments):
+    """引数をtrace eventのargsに変換する
+
+    Args:
+        arguments (dict): 引数名→値
+
+    Returns:
+        dict: 引数名→repr(最大MAX_ARG_LENGTH文字)
+    """
+    result = {}
+    for key, value in arguments.items():
+        text = repr(value)
+        if len(text) > MAX_ARG_LENGTH:
+            text = text[:MAX_ARG_LENGTH] + '...'
+        result[key] = text
+    return result
+
+
+def enableTracer():
+    """トレースの記録を開始し、終了時にファイルへ出力する
+
+    Params:
+        trace.output (str): 出力先のファイルパス
+        trace.max_events (int): 記録する最大件数
+    """
+    global tracer
+    if tracer is not None:
+        return tracer
+    tracer = TraceRecorder(getParam('trace.max_events', 1000000, cast_type=int))
+
+    def writeTrace():
+        output = getParam('trace.output', './log/trace.json')
+        tracer.write(output)
+        print(f'trace events: {output} ({len(tracer.events)} events)')
+        if tracer.dropped:
+            print(f'trace.max_eventsを超えたため{tracer.dropped}件を記録していません')
+
+    register_shutdown_hook(writeTrace)
+    return tracer
@@ -1,7 +1,7 @@
 '''既定で読み込まれる汎用コマンド(d)
 '''
 
-from lib.paramSetting import showAllParams, showParam
+from lib.paramSetting import showAllParams, showParam, listParams, paramScope
 import subprocess
 from lib.commonDefine import *
 
@@ -98,6 +98,27 @@ def setBoolAction(set_str):
     '''
     return setAction(set_str, cast_type=bool)
 
+@instrumented()
+def showAction(prefix=None):
+    """パラメータの一覧を表示する
+
+    Args:
+        prefix (str, optional): 'app_path'のようなキーの接頭辞。
+            指定した場合は配下のパラメータのみ表示する(全パラメータは走査しない)
+
+    Returns:
+        int: 表示したパラメータの件数
+
+    Examples:
+        >>> show: app_path
+        app_path.sakura=C:\\Program Files (x86)\\sakura\\sakura.exe
+        app_path.chrome=C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe
+    """
+    keys = listParams(prefix or '')
+    for key in keys:
+        showParam(key)
+    return len(keys)
+
 
 @instrumented(timer=True)
 def cmdAction(command=''):
@@ -206,11 +227,13 @@ def execAction(command):
 
 
 @instrumented()
-def loadAction(file_path):
+def loadAction(file_path_args):
     """パラメータファイルを読み込む
     
     Args:
-        file_path (str): 読み込むファイルのパス
+        file_path_args (str): 読み込むファイルのパス。
+            'replace=True'を続けた場合は、ファイルの最上位のキー配下の既存のパラメータを
+            削除してから読み込む(ファイルから消えた項目も反映する)
         
     Returns:
         None
@@ -218,17 +241,29 @@ def loadAction(file_path):
     Raises:
         FileNotFoundError: ファイルが存在しない場合
         SyntaxError: ファイル形式が不正な場合
+        ValueError: 第二引数がreplace=の形式でない場合
     
     Note:
         PARAM_FOLDER内のyamlファイルは起動時に読み込まれる。
         それ以外のファイルを読み込みたい場合に使用すること。
+
+    Examples:
+        >>> load: url.yaml, replace=True
     """
+    file_path, option = sepSplit(file_path_args)
+    replace = False
+    if option:
+        key, _, value = option.partition('=')
+        if key.strip() != 'replace' or not value:
+            raise ValueError(f'loadの第二引数はreplace=True/Falseの形式にしてください: {option}')
+        replace = value.strip().lower() not in false_list
+
     if not os.path.isfile(file_path):
         logger.error(f"ファイルが見つかりません: {file_path}")
         raise FileNotFoundError(f"指定されたファイルが存在しません: {file_path}")
 
     try:
-        loadParams(file_path)
+        loadParams(file_path, replace=replace)
         return None
     except SyntaxError as ve:
         logger.error(f"パラメータファイルの形式に誤りがあります: {file_path}")
@@ -381,17 +416,145 @@ def readAction(file_path_args):
     # 循環参照防止のため関数内でインポート
     from readLines import readFile
 
+    readFile(findCommandFile(file_path))
+
+
+def findCommandFile(file_path):
+    """コマンドファイルのパスを解決する
+
+    Args:
+        file_path (str): コマンドファイルのパス(COMMAND_FOLDERからの相対パスも可)
+
+    Returns:
+        str: 存在するファイルのパス
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+    """
     search_dir = getParam('COMMAND_FOLDER', '')
     join_path = os.path.join(search_dir, file_path)
     
     if   os.path.isfile(file_path):
-        target_file = file_path
+        return file_path
     elif os.path.isfile(join_path):
-        target_file = join_path
+        return join_path
     else:
         raise FileNotFoundError(f"ファイルが見つかりません: '{file_path}' or '{join_path}'")
 
-    readFile(target_file)
+
+@instrumented()
+def readParallelAction(file_paths_args):
+    """複数のコマンドファイルを並列に実行する
+
+    各ファイルは別プロセス(parallel.mode: threadの場合は別スレッド)で実行し、
+    呼び出し時点のパラメータを独立したスコープとして受け取る。
+    全て終了した後、各ファイルで設定されたパラメータを指定順に呼び出し元へ反映する。
+
+    Args:
+        file_paths_args (str): 実行するコマンドファイルのパス(カンマ区切り)。
+            key=valueを含む場合は全てのファイルのスコープのみに設定する
+
+    Returns:
+        None
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        Exception: 失敗したファイルがある場合(成功したファイルの結果は反映済み)
+
+    Params:
+        parallel.max_workers (int): 同時に実行する最大数(0の場合はCPU数+4、最大32)
+        parallel.mode (str): process(別プロセス)またはthread(別スレッド)
+
+    Examples:
+        >>> readParallel: job_a.txt, job_b.txt, job_c.txt, env=prod
+    """
+    file_paths = []
+    args = {}
+    for item in sepSplit(file_paths_args, split=0):
+        if '=' in item:
+            key, value = patternMatchSplit('=', item)
+            args[key] = value
+        elif item:
+            file_paths.append(findCommandFile(item))
+
+    if not file_paths:
+        raise ValueError('readParallelには1つ以上のファイルを指定してください')
+
+    from parallelLines import readParallel
+    readParallel(file_paths, args)
+
+
+@instrumented()
+def gatherAction(file_paths_args):
+    """複数のコマンドファイルを実行する(async_modeでは同時に実行する)
+
+    async_mode: Trueの場合は1つのイベントループ上で各ファイルを別のタスクとして同時に実行する。
+    それ以外の場合は指定順に1つずつ実行する。
+
+    Args:
+        file_paths_args (str): 実行するコマンドファイルのパス(カンマ区切り)。
+            key=valueを含む場合は実行するファイルのみに設定し、呼び出し元には残さない
+
+    Returns:
+        None
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+
+    Examples:
+        >>> gather: site_a.txt, site_b.txt
+    """
+    # 循環参照防止のため関数内でインポート
+    from readLines import readFile
+
+    with paramScope() as args_scope:
+        file_paths = []
+        for item in sepSplit(file_paths_args, split=0):
+            if '=' in item:
+                setAction(item)
+            elif item:
+                file_paths.append(findCommandFile(item))
+
+        # 各ファイルで設定したパラメータはargs_scopeへ反映し、引数のみのキーは呼び出し元へ残さない
+        arg_keys = set(args_scope.values)
+        for file_path in file_paths:
+            with paramScope() as scope:
+                readFile(file_path)
+            scope.export()
+            arg_keys -= set(scope.values) | scope.deleted
+    args_scope.export(exclude=arg_keys)
+
+
+@instrumented()
+def callAction(name_args):
+    """defで定義したサブルーチンを呼び出す
+
+    Args:
+        name_args (str): サブルーチン名と引数(カンマ区切りのkey=value)
+
+    Returns:
+        None
+
+    Raises:
+        KeyError: サブルーチンが定義されていない場合
+        ValueError: 第二引数以降がkey=valueの形式でない場合
+
+    Examples:
+        >>> def: greet
+        >>> print: hello ${name}
+        >>> end
+        >>> call: greet, name=alice
+        コンソール出力:hello alice
+
+    Note:
+        引数は呼び出し中のみ有効で、終了後は呼び出し前の値に戻る。
+        サブルーチン内でsetしたその他のパラメータは呼び出し後も残る(readと同じ)。
+    """
+    name, *args = sepSplit(name_args, split=0)
+
+    # 循環参照防止のため関数内でインポート
+    from readLines import callSubroutine
+    callSubroutine(name, args)
 
 
 @instrumented()
@@ -538,9 +701,13 @@ action_list = {
     'setFloat':   setFloatAction,
     'setStr':   setStrAction,
     'setBool':   setBoolAction,
+    'show':  showAction,
     'wait':  waitAction,
     'load':  loadAction,
     'read':  readAction,
+    'readParallel': readParallelAction,
+    'gather': gatherAction,
+    'call':  callAction,
     'cmd':   cmdAction,
     'exec':  execAction,
     'execAsync':  execAsyncAction,
@@ -552,3 +719,6 @@ action_list = {
     'check': checkAction,
     'hide': hideAction,
 }
+
+# クリップボードを書き換える可能性があるアクション(外部コマンド・Pythonの評価)
+clipboard_actions = ('cmd', 'exec', 'execAsync', 'eval')
@@ -0,0 +1,187 @@
+'''基本コマンド(d)の非同期版
+
+async_mode: Trueの場合にdモジュールの同名アクションの代わりに実行される。
+待機・外部コマンドの完了待ち・ファイル読込をコルーチンとして実行し、
+他のタスクの実行を妨げない。
+'''
+import asyncio
+import locale
+from lib.commonDefine import *
+from lib.paramSetting import paramScope
+from module.defaultActions import setAction, findCommandFile
+
+logger = getMyLogger(__name__)
+
+
+@instrumented()
+async def waitAction(wait_time=None):
+    """指定時間スリープする(待機中も他のタスクは進む)
+
+    Params:
+        default_wait_time: wait_timeを指定せずに実行した場合の待機時間（秒）
+    """
+    if wait_time is None:
+        wait_time = getParam('default_wait_time', 1)
+    await asyncio.sleep(float(wait_time))
+
+
+def decodeOutput(data):
+    """サブプロセスの出力をtext=Trueと同じエンコーディングで文字列にする"""
+    text = data.decode(locale.getpreferredencoding(False), errors='replace')
+    return text.replace('\r\n', '\n')
+
+
+@instrumented()
+async def cmdAction(command=''):
+    """シェルコマンドを実行する（シェル使用）
+
+    Note:
+        詳細は同期版(defaultActions.cmdAction)を参照してください。
+    """
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    stdout, stderr = decodeOutput(stdout), decodeOutput(stderr)
+    setParam('stdout', stdout)
+    setParam('stderr', stderr)
+    setParam('returncode', proc.returncode)
+
+    logger.info(f"[cmdAction] Return Code: {proc.returncode}")
+    logger.info(f"[cmdAction] STDOUT:\n{stdout}")
+    logger.info(f"[cmdAction] STDERR:\n{stderr}")
+
+    return proc.returncode
+
+
+@instrumented(timer=True)
+async def execAction(command):
+    """コマンドを実行し、出力を取得して完了まで待機する（シェル不使用）
+
+    Note:
+        詳細は同期版(defaultActions.execAction)を参照してください。
+    """
+    sep = getParam('sep', ',')
+    command_list = [arg.strip() for arg in command.split(sep)]
+
+    proc = await asyncio.create_subprocess_exec(
+        *command_list,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    setParam('pid', proc.pid)
+    stdout, stderr = await proc.communicate()
+    stdout, stderr = decodeOutput(stdout), decodeOutput(stderr)
+    setParam('stdout', stdout)
+    setParam('stderr', stderr)
+    setParam('returncode', proc.returncode)
+
+    logger.info(f"[execAction] PID: {proc.pid}")
+    logger.info(f"[execAction] Return Code: {proc.returncode}")
+    logger.info(f"[execAction] STDOUT:\n{stdout}")
+    logger.info(f"[execAction] STDERR:\n{stderr}")
+
+    return proc.returncode
+
+
+@instrumented()
+async def readAction(file_path_args):
+    """コマンドファイルを読み込んで実行する
+
+    Note:
+        詳細は同期版(defaultActions.readAction)を参照してください。
+    """
+    file_path, *args = sepSplit(file_path_args, split=0)
+    for arg in args:
+        if '=' in arg:
+            setAction(arg)
+        else:
+            raise Exception(f'第二引数以降はkey=valueの形式にしてください')
+
+    # 循環参照防止のため関数内でインポート
+    from readLinesAsync import readFileAsync
+    await readFileAsync(findCommandFile(file_path))
+
+
+@instrumented()
+async def callAction(name_args):
+    """defで定義したサブルーチンを呼び出す
+
+    Note:
+        詳細は同期版(defaultActions.callAction)を参照してください。
+    """
+    name, *args = sepSplit(name_args, split=0)
+
+    # 循環参照防止のため関数内でインポート
+    from readLinesAsync import callSubroutineAsync
+    await callSubroutineAsync(name, args)
+
+
+@instrumented()
+async def gatherAction(file_paths_args):
+    """複数のコマンドファイルを1つのイベントループ上で同時に実行する
+
+    各ファイルは別のタスクとして実行し、待機(wait, exec, p.*の要素待ちなど)の間に
+    他のファイルの処理を進める。全て終了するまで待機する。
+
+    Args:
+        file_paths_args (str): 実行するコマンドファイルのパス(カンマ区切り)。
+            key=valueを含む場合は各ファイルのみに設定し、呼び出し元には残さない
+
+    Raises:
+        Exception: 失敗したファイルがある場合(他のファイルは最後まで実行する)
+
+    Note:
+        各タスクは呼び出し時点のパラメータを参照する独立したスコープで実行し、
+        設定したパラメータ(returnを除く)は全て終了した後に指定順で呼び出し元へ反映する。
+        同じキーを複数のタスクが設定した場合は後のファイルの値を採用する。
+        p.*の操作対象のページもタスクごとに独立する。
+    """
+    # 循環参照防止のため関数内でインポート
+    from readLinesAsync import readFileAsync
+
+    async def readFileScoped(file_path):
+        with paramScope() as scope:
+            await readFileAsync(file_path)
+        return scope
+
+    # key=valueはrunChildThreadと同様に各ファイルの親のスコープへ設定する
+    with paramScope() as args_scope:
+        file_paths = []
+        for item in sepSplit(file_paths_args, split=0):
+            if '=' in item:
+                setAction(item)
+            elif item:
+                file_paths.append(findCommandFile(item))
+
+        arg_keys = set(args_scope.values)
+        results = await asyncio.gather(
+            *(readFileScoped(file_path) for file_path in file_paths),
+            return_exceptions=True,
+        )
+
+        errors = []
+        for file_path, result in zip(file_paths, results):
+            if isinstance(result, BaseException):
+                logger.error(f'gatherの実行に失敗 : {file_path} : {result}')
+                errors.append(file_path)
+                continue
+            result.export(exclude=('return',))
+            arg_keys -= set(result.values) | result.deleted
+    args_scope.export(exclude=arg_keys)
+    if errors:
+        raise Exception(f'gatherで失敗したファイルがあります: {", ".join(errors)}')
+
+
+# 同期版(defaultActions.action_list)と同じコマンド名で定義する
+action_list = {
+    'wait':   waitAction,
+    'cmd':    cmdAction,
+    'exec':   execAction,
+    'read':   readAction,
+    'call':   callAction,
+    'gather': gatherAction,
+}
@@ -5,6 +5,90 @@
 from lib.commonDefine import *
 logger = getMyLogger(__name__)
 
+class FlowState:
+    """1行ずつ実行する場合(対話モード)のif分岐状態
+
+    各フレームは(executed, matched)のタプルで保持する。
+    - executed: このブロックを実行するか
+    - matched : 以降のelif/elseをスキップするか
+    実行しないフレームの数(skip_depth)を更新時に数えておくことで、
+    ネストの深さに関わらずスキップ判定を定数時間で行う。
+    """
+    __slots__ = ('frames', 'skip_depth')
+
+    def __init__(self):
+        self.frames = []
+        self.skip_depth = 0
+
+    def isSkipping(self):
+        """通常アクションをスキップすべきか
+
+        Returns:
+            bool: 実行しないブロックの中にいる場合True
+        """
+        return self.skip_depth > 0
+
+    def push(self, executed, matched):
+        """ifのフレームを追加する
+
+        Args:
+            executed (bool): このブロックを実行するか
+            matched (bool): 以降のelif/elseをスキップするか
+        """
+        self.frames.append((executed, matched))
+        if not executed:
+            self.skip_depth += 1
+
+    def top(self):
+        """最も内側のフレームを取得する
+
+        Returns:
+            tuple[bool, bool] or None: (executed, matched)。if外の場合はNone
+        """
+        return self.frames[-1] if self.frames else None
+
+    def replaceTop(self, executed, matched):
+        """最も内側のフレームを更新する(elif/else)
+
+        Args:
+            executed (bool): このブロックを実行するか
+            matched (bool): 以降のelif/elseをスキップするか
+        """
+        old_executed, _ = self.frames[-1]
+        self.skip_depth += (not executed) - (not old_executed)
+        self.frames[-1] = (executed, matched)
+
+    def pop(self):
+        """最も内側のフレームを削除する(fi)"""
+        executed, _ = self.frames.pop()
+        if not executed:
+            self.skip_depth -= 1
+
+    def needsCondition(self, action):
+        """分岐条件の評価(変数置換)が必要か
+
+        スキップ中のif、すでに分岐済みのelifは条件を評価せずに状態のみ更新する。
+
+        Args:
+            action (str): フロー制御のコマンド名
+
+        Returns:
+            bool: 条件の評価が必要な場合True
+        """
+        if action == 'if':
+            return not self.isSkipping()
+        if action == 'elif':
+            return bool(self.frames) and not self.frames[-1][1]
+        return False
+
+    def __repr__(self):
+        return f'FlowState(frames={self.frames}, skip_depth={self.skip_depth})'
+
+
+# 対話モードのif分岐状態
+flow_state = FlowState()
+
+
 @instrumented()
 def ifAction(arg=None):
     """
@@ -15,19 +99,20 @@ def ifAction(arg=None):
 
     Returns:
         None
+
+    Note:
+        スキップ中のブロック内では条件を評価せず、elif/elseも含めて実行しない。
     """
+    # スキップ中は内側のブロックも全て実行しない
+    if flow_state.isSkipping():
+        flow_state.push(False, True)
+        return
+
     if arg is None:
         arg = ''
 
     result = toBool(arg)
-    
-    # push状態を記録（Trueならそのブロックを実行する）
-    flow_stack = getParam('flow_stack', [])
-    flow_stack.append({
-        'executed': result,  # このブロックを実行するか
-        'break': result      # 以降の elif/else をスキップするか
-    })
-    setParam('flow_stack', flow_stack, disable_cast=True)
+    flow_state.push(result, result)
 
 
 @instrumented()
@@ -45,23 +130,20 @@ def elifAction(arg=None):
         Exception('elif without if'): if文外で呼び出された場合
         ValueError: 引数がない場合
     """
-    flow_stack = getParam('flow_stack')
-    if not flow_stack:
+    frame = flow_state.top()
+    if frame is None:
         raise Exception('elif without if')
 
-    frame = flow_stack[-1]
-
-    if frame['break']:
-        frame['executed'] = False
+    _, matched = frame
+    if matched:
+        flow_state.replaceTop(False, True)
         return  # すでに条件マッチしてる → 以降スキップ
 
     if arg is None:
         raise ValueError('elifには引数が必要です')
 
     result = toBool(arg)
-    frame['executed'] = result
-    frame['break'] = result
-    setParam('flow_stack', flow_stack, disable_cast=True)
+    flow_state.replaceTop(result, result)
 
 
 @instrumented()
@@ -78,20 +160,16 @@ def elseAction():
     Raises:
         Exception('else without if'): if文外で呼び出された場合
     """
-    flow_stack = getParam('flow_stack')
-    if not flow_stack:
+    frame = flow_state.top()
+    if frame is None:
         logger.error(f'elseコマンドはifの後で使用してください')
         raise Exception('else without if')
 
-    frame = flow_stack[-1]
-
-    if frame['break']:
-        frame['executed'] = False
+    _, matched = frame
+    if matched:
+        flow_state.replaceTop(False, True)
     else:
-        frame['executed'] = True
-        frame['break'] = True
-
-    setParam('flow_stack', flow_stack, disable_cast=True)
+        flow_state.replaceTop(True, True)
 
     
 @instrumented()
@@ -108,13 +186,187 @@ def fiAction():
     Raises:
         Exception('fi without if'): if文外で呼び出された場合
     """
-    flow_stack = getParam('flow_stack')
-    if not flow_stack:
+    if flow_state.top() is None:
         logger.error(f'fiコマンドはifの後で使用してください')
         raise Exception('fi without if')
 
-    flow_stack.pop()
-    setParam('flow_stack', flow_stack, disable_cast=True)
+    flow_state.pop()
+
+
+@instrumented()
+def evalCondition(arg=None):
+    """
+    分岐条件を評価する(コンパイル済みのif/elif用)
+
+    Args:
+        arg (str): 変数置換済みの分岐条件(詳細はboolコマンド)
+
+    Returns:
+        bool: 条件の評価結果
+    """
+    if arg is None:
+        arg = ''
+    return toBool(arg)
+
+
+def iterLoopValues(key, values):
+    """ループの値を順にパラメータへ設定するイテレータ
+
+    Args:
+        key (str or None): 値を設定するパラメータキー(Noneの場合は設定しない)
+        values (Iterable): ループの値
+
+    Yields:
+        ループの値
+    """
+    for value in values:
+        if key:
+            setParam(key, value)
+        yield value
+
+
+@instrumented()
+def forAction(arg=None):
+    """
+    for～doneの間を値ごとに繰り返す
+
+    Args:
+        arg (str): 'key=値1,値2,...' または 'key=開始..終了'(整数の範囲、終了を含む)
+
+    Returns:
+        Iterator: 各値をパラメータkeyに設定しながら進むイテレータ
+
+    Raises:
+        ValueError: 引数がkey=値の形式でない場合
+
+    Examples:
+        >>> for: name=alice,bob
+        >>> print: hello ${name}
+        >>> done
+        ループごとにnameへalice, bobが設定される
+
+        >>> for: i=1..3
+        ループごとにiへ1, 2, 3が設定される
+
+    Note:
+        値の区切りはsepパラメータ。ループ中のbreak/continueも利用可能
+    """
+    if not arg or '=' not in arg:
+        raise ValueError(f'forはkey=値の形式で指定してください: {arg}')
+
+    key, values = patternMatchSplit('=', arg)
+    match = re.fullmatch(r'(-?\d+)\.\.(-?\d+)', values)
+    if match:
+        start, stop = int(match.group(1)), int(match.group(2))
+        step = 1 if start <= stop else -1
+        return iterLoopValues(key, range(start, stop + step, step))
+
+    if values == '':
+        return iterLoopValues(key, [])
+    return iterLoopValues(key, sepSplit(values, split=0))
+
+
+@instrumented()
+def whileAction(arg=None):
+    """
+    条件が真の間、while～doneの間を繰り返す
+
+    Args:
+        arg (str): ループ条件(詳細はboolコマンド)。ループごとに変数を置換して再評価する
+
+    Returns:
+        bool: 条件の評価結果
+    """
+    if arg is None:
+        arg = ''
+    return toBool(arg)
+
+
+@instrumented()
+def repeatAction(arg=None):
+    """
+    repeat～doneの間を指定回数繰り返す
+
+    Args:
+        arg (str): 回数、または'key=回数'(keyに1から回数までを設定する)
+
+    Returns:
+        Iterator: 回数分進むイテレータ
+
+    Raises:
+        ValueError: 回数が整数でない場合
+    """
+    key = None
+    count = arg or ''
+    if '=' in count:
+        key, count = patternMatchSplit('=', count)
+
+    try:
+        count = int(count)
+    except ValueError as e:
+        raise ValueError(f'repeatの回数は整数で指定してください: {arg}')
+
+    return iterLoopValues(key, range(1, count + 1))
+
+
+def breakAction():
+    """
+    最も内側のループ(for/while/repeat)を終了する
+
+    Raises:
+        SyntaxError: ループ外で呼び出された場合
+    """
+    raise SyntaxError('break outside loop')
+
+
+def continueAction():
+    """
+    最も内側のループの次の繰り返しへ進む
+
+    Raises:
+        SyntaxError: ループ外で呼び出された場合
+    """
+    raise SyntaxError('continue outside loop')
+
+
+def doneAction():
+    """
+    for/while/repeatのループを閉じる
+
+    Raises:
+        SyntaxError: ループ外で呼び出された場合
+    """
+    raise SyntaxError('done without loop')
+
+
+def defAction():
+    """
+    def～endの間をサブルーチンとして定義する(callコマンドで呼び出す)
+
+    Examples:
+        >>> def: greet
+        >>> print: hello ${name}
+        >>> end
+        >>> call: greet, name=alice
+
+    Note:
+        本体は定義時に1回だけコンパイルされ、呼び出しごとに再利用される。
+        defの行を実行した時点で定義されるため、callより前に記述すること。
+
+    Raises:
+        SyntaxError: コンパイル済みの命令列以外で呼び出された場合
+    """
+    raise SyntaxError('def outside compiled program')
+
+
+def endAction():
+    """
+    defのサブルーチン定義を閉じる
+
+    Raises:
+        SyntaxError: def外で呼び出された場合
+    """
+    raise SyntaxError('end without def')
 
 
 def flowHelpAction(action=None):
@@ -138,9 +390,10 @@ def flowHelpAction(action=None):
         >>> flowHelpAction()
         全フローアクションと説明を出力
     """
+    all_flow_actions = {**flow_action_list, **block_action_list}
     if action:
-        if action in flow_action_list:
-            action = flow_action_list[action]
+        if action in all_flow_actions:
+            action = all_flow_actions[action]
             doc = action.__doc__
             print(doc)
         else:
@@ -149,7 +402,7 @@ def flowHelpAction(action=None):
     else:
         doc_dict = {
             key: (value.__doc__.strip().splitlines()[0] if value.__doc__ else 'on going')
-            for key, value in flow_action_list.items()
+            for key, value in all_flow_actions.items()
         }
         tableDisplay(doc_dict, sort=False)
 
@@ -163,4 +416,16 @@ flow_action_list = {
     'elif': elifAction,
     'else': elseAction,
     'fi': fiAction,
-}
\ No newline at end of file
+}
+
+# ループ・サブルーチン定義(コンパイル済みの命令列でのみ実行される)
+block_action_list = {
+    'for': forAction,
+    'while': whileAction,
+    'repeat': repeatAction,
+    'break': breakAction,
+    'continue': continueAction,
+    'done': doneAction,
+    'def': defAction,
+    'end': endAction,
+}
@@ -168,4 +168,12 @@ action_list = {
     'release': releaseAction,
     'tap'    : tapAction,
     'list' : listAction
-}
\ No newline at end of file
+}
+
+# アクション実行後の待機秒(外部のUIを操作するため)
+pacing = 'READ_LINE_INTERVAL'
+
+# 待機しないアクション
+action_pacing = {
+    'list' : None,
+}
@@ -155,6 +155,26 @@ def searchElements(page, query):
 
 
 
+def normalizeQuery(query):
+    """検索クエリの種類(XPath、CSS、Textなど)を判別してPlaywrightの形式に補完する
+
+    Args:
+        query (str): 検索クエリ
+
+    Returns:
+        str: 'xpath=', 'css=', 'text='などを付けたクエリ
+    """
+    if query.startswith('/'):
+        return f'xpath={query}'
+    elif query.startswith('#') or query.startswith('.') or query.startswith('['):
+        return f'css={query}'
+    elif query.startswith('text=') or query.startswith('xpath=') or query.startswith('css=') or query.startswith('role='):
+        return query  # すでに書き方OK
+    else:
+        # プレーンな文字列はテキスト検索扱いにする
+        return f'text="{query}"'
+
+
 @instrumented(timer=True)
 def getElement(page, query, no_retry=False):
     """Playwrightで汎用的に要素を取得する関数。
@@ -186,20 +206,13 @@ def getElement(page, query, no_retry=False):
         XPathで一致する要素を取得。
 
     Params:
-        - p.max_retry (int): リトライ回数
-        - p.retry_interval (int): リトライ間隔
+        - p.find_max_retry (int): リトライ回数
+        - p.find_retry_interval (float): リトライ間隔
+
+    Note:
+        retryCounterで装飾したアクションから呼ばれた場合は、そのリトライの期限までで検索を打ち切る。
     """
-    
-    # クエリを自動判定して補完する
-    if query.startswith('/'):
-        query = f'xpath={query}'
-    elif query.startswith('#') or query.startswith('.') or query.startswith('['):
-        query = f'css={query}'
-    elif query.startswith('text=') or query.startswith('xpath=') or query.startswith('css=') or query.startswith('role='):
-        pass  # すでに書き方OK
-    else:
-        # プレーンな文字列はテキスト検索扱いにする
-        query = f'text="{query}"'
+    query = normalizeQuery(query)
 
     # 実際に要素を検索する
     max_retry = getParam('p.find_max_retry')
@@ -215,7 +228,12 @@ def getElement(page, query, no_retry=False):
             return element
         if no_retry:
             return None
-        time.sleep(interval)
+        # 呼び出し元のリトライの期限を超えて待機しない
+        time_left = getRetryTimeLeft()
+        if time_left is not None and time_left <= 0:
+            break
+        search_count += 1
+        time.sleep(interval if time_left is None else min(interval, time_left))
     
     logger.warning(f'要素が見つかりませんでした: {query} index={index}')
     return None
@@ -477,6 +495,20 @@ def uploadAction(query_file):
 def screenshotAction(file_path=None):
     global page
     
+    save_path = getScreenshotPath(file_path)
+    scale = getParam('p.screenshot.scale_type')
+    page.screenshot(path=save_path, full_page=True, type='png', scale=scale)
+
+
+def getScreenshotPath(file_path=None):
+    """スクリーンショットの保存先を決定する
+
+    Args:
+        file_path (str, optional): 保存先のファイルまたはフォルダ
+
+    Returns:
+        str: 保存先のファイルパス(上書きしない設定の場合は連番を付与)
+    """
     if not file_path:
         file_path = getParam('p.screenshot.default_dir')
 
@@ -499,9 +531,7 @@ def screenshotAction(file_path=None):
         while os.path.exists(save_path):
             save_path = f"{base}_{count}.{ext}"
             count += 1
-
-    scale = getParam('p.screenshot.scale_type')
-    page.screenshot(path=save_path, full_page=True, type='png', scale=scale)
+    return save_path
 
 
 @instrumented()
@@ -589,18 +619,29 @@ playwright_key_map = {
 @instrumented()
 def keyAction(keys):
     global page
+    page.keyboard.press(convertKeys(keys))
+
+
+def convertKeys(keys):
+    """'ctrl+a'形式のキー指定をPlaywrightのキー名に変換する
+
+    Args:
+        keys (str): '+'区切りのキー
+
+    Returns:
+        str: Playwrightのkeyboard.pressに渡すキー
+    """
     key_list = keys.lower().split('+')
     converted_keys = [
         playwright_key_map.get(k, k.upper() if len(k) == 1 else k.title())
         for k in key_list
     ]
-    combo = '+'.join(converted_keys)
-    page.keyboard.press(combo)
+    return '+'.join(converted_keys)
 
 
 @instrumented()
 def stopBrowser():
-    global p
+    global p, browser, context, page
     auto_close = getParam('p.browser.auto_close', True)
     if not auto_close:
         print(f"auto_close=Falseのため待機")
@@ -613,6 +654,8 @@ def stopBrowser():
             print('[OK]')
         except:
             print('[NG]')
+    # ワーカーのプロセス・スレッドで次の子シナリオが開く場合に起動し直す
+    p = browser = context = page = None
 
 
 action_list = {
@@ -631,4 +674,7 @@ action_list = {
     'key': keyAction,
     'doubleClick': doubleClickAction,
     'rightClick': rightClickAction,
-}
\ No newline at end of file
+}
+
+# アクション実行後の待機秒(外部のUIを操作するため)
+pacing = 'READ_LINE_INTERVAL'
@@ -0,0 +1,357 @@
+'''Playwrightでブラウザ操作(p)の非同期版
+
+async_mode: Trueの場合にpモジュールの各アクションの代わりに実行される。
+ブラウザ・コンテキストは共有し、操作対象のページはタスク(gatherで起動したシナリオ)ごとに保持する。
+'''
+import asyncio
+from contextvars import ContextVar
+from playwright.async_api import async_playwright
+from lib.commonDefine import *
+from module.playwrightActions import normalizeQuery, urlParamSearch, convertKeys, getScreenshotPath
+
+p       = None
+browser = None
+context = None
+# 操作対象のページ(タスクごとに独立)
+current_page = ContextVar('current_page', default=None)
+# ブラウザの起動を1回にするためのロック
+_init_lock = None
+logger = getMyLogger(__name__)
+
+
+@instrumented()
+async def initBrowser():
+    global p, browser, context, _init_lock
+    from readLinesAsync import registerAsyncShutdownHook
+
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if context is not None:
+            return
+
+        executable_path = getParam('p.browser.executable_path')
+        if hasParam(f'app_path.{executable_path}'):
+            executable_path = getParam(f'app_path.{executable_path}')
+        is_headless = getParam('p.browser.is_headless')
+
+        p = await async_playwright().start()
+        registerAsyncShutdownHook(stopBrowser)
+        browser = await p.chromium.launch(
+            headless=is_headless,
+            executable_path=executable_path
+        )
+        context = await browser.new_context()
+
+
+def getPage():
+    """操作対象のページを取得する
+
+    Returns:
+        Page: 現在のタスクのページ
+
+    Raises:
+        Exception: open前に呼び出された場合
+    """
+    page = current_page.get()
+    if page is None:
+        raise Exception('ページが開かれていません。先にopenを実行してください')
+    return page
+
+
+@instrumented()
+async def openAction(url, new_page=True):
+    """指定されたURLをブラウザで開く（新規タブ）。
+
+    Note:
+        詳細は同期版(playwrightActions.openAction)を参照してください。
+        開いたページは実行中のタスクの操作対象になり、他のタスクには影響しません。
+    """
+    page = current_page.get()
+    if context is None:
+        await initBrowser()
+
+    if new_page or page is None:
+        page = await context.new_page()
+        current_page.set(page)
+
+    dialog_auto_accept = getParam('p.browser.dialog_auto_accept', True)
+    if dialog_auto_accept:
+        page.on("dialog", lambda dialog: asyncio.ensure_future(dialog.accept()))
+    else:
+        page.on("dialog", lambda dialog: asyncio.ensure_future(dialog.dismiss()))
+
+    await page.goto(urlParamSearch(url))
+
+
+@instrumented()
+async def gotoAction(url):
+    """指定されたURLへ現在のブラウザタブで移動する。"""
+    await openAction(url, new_page=False)
+
+
+@instrumented()
+async def tabAction(num_str):
+    """指定されたインデックスのタブ（ページ）に切り替える。"""
+    index = int(num_str)
+    try:
+        page = context.pages[index]
+        await page.bring_to_front()
+    except Exception as e:
+        logger.warning(f'指定されたインデックスのタブがありません: {num_str} ({e})')
+        raise
+    current_page.set(page)
+
+
+async def searchElements(page, query):
+    elements = []
+
+    # まずメインページを探す
+    elements.extend(await page.locator(query).element_handles())
+
+    # すべてのフレームで探す
+    for frame in page.frames:
+        try:
+            elements.extend(await frame.locator(query).element_handles())
+        except Exception as e:
+            # フレームが壊れてる場合など無視
+            logger.debug(f"frame error: {e}")
+
+    return elements
+
+
+@instrumented(timer=True)
+async def getElement(page, query, no_retry=False):
+    """Playwrightで汎用的に要素を取得する関数。
+
+    待機中はイベントループに制御を戻すため、他のタスクの操作を妨げない。
+
+    Params:
+        - p.find_max_retry (int): リトライ回数
+        - p.find_retry_interval (float): リトライ間隔
+    """
+    query = normalizeQuery(query)
+
+    max_retry = getParam('p.find_max_retry')
+    interval  = getParam('p.find_retry_interval')
+    index = getParam('p.find_index', 0)
+    for _ in range(max_retry):
+        elements = await searchElements(page, query)
+        if index < len(elements):
+            element = elements[index]
+            logger.debug(f'find_result: {element}')
+            return element
+        if no_retry:
+            return None
+        # 呼び出し元のリトライの期限を超えて待機しない
+        time_left = getRetryTimeLeft()
+        if time_left is not None and time_left <= 0:
+            break
+        await asyncio.sleep(interval if time_left is None else min(interval, time_left))
+
+    logger.warning(f'要素が見つかりませんでした: {query} index={index}')
+    return None
+
+
+async def findElement(query):
+    """操作対象のページから要素を取得する(見つからない場合は例外)"""
+    element = await getElement(getPage(), query)
+    if element is None:
+        raise TimeoutError(f"指定した要素が見つかりませんでした: {query}")
+    return element
+
+
+async def clickElement(element, method, button='left', click_count=1):
+    """p.click_method等の方式で要素をクリックする"""
+    if   method == 0:
+        await element.click(button=button, click_count=click_count, timeout=5)
+    elif method == 1:
+        await element.click(button=button, click_count=click_count, force=True)
+    elif method == 2:
+        # JavaScriptでクリック(右クリック・ダブルクリックはイベントを発行)
+        if button == 'right':
+            await element.evaluate("""el => {
+                el.dispatchEvent(new MouseEvent('contextmenu', { bubbles: true, cancelable: true, button: 2 }));
+            }""")
+        elif click_count == 2:
+            await element.evaluate("""el => {
+                el.dispatchEvent(new MouseEvent('dblclick', { bubbles: true, cancelable: true }));
+            }""")
+        else:
+            await element.evaluate("el => el.click()")
+    elif method == 3:
+        await element.hover()
+        await asyncio.sleep(1)
+        await element.click(button=button, click_count=click_count, timeout=5)
+    elif method == 4:
+        box = await element.bounding_box()
+        if box is None:
+            raise TimeoutError("座標取得できませんでした")
+        await getPage().mouse.click(
+            box['x'] + box['width'] / 2,
+            box['y'] + box['height'] / 2,
+            button=button,
+            click_count=click_count,
+        )
+    else:
+        raise TimeoutError('クリック方式の指定が不正です')
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def clickAction(query):
+    """Playwrightで要素をクリックする汎用アクション。
+
+    Params:
+        - p.click_method (int): クリック方法(同期版と同じ)
+    """
+    element = await findElement(query)
+    await clickElement(element, getParam('p.click_method', 0))
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def doubleClickAction(query):
+    """Playwrightで要素をダブルクリックする汎用アクション。
+
+    Params:
+        - p.double_click_method (int): ダブルクリック方法(同期版と同じ)
+    """
+    element = await findElement(query)
+    await clickElement(element, getParam('p.double_click_method', 0), click_count=2)
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def rightClickAction(query):
+    """Playwrightで要素を右クリックする汎用アクション。
+
+    Params:
+        - p.right_click_method (int): 右クリック方法(同期版と同じ)
+    """
+    element = await findElement(query)
+    await clickElement(element, getParam('p.right_click_method', 0), button='right')
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def inputAction(query_text):
+    query, text = sepSplit(query_text)
+    element = await findElement(query)
+    await element.fill(text)
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def selectAction(query_search):
+    query, search = sepSplit(query_search)
+    element = await findElement(query)
+
+    # まず一致する <option> を探す（value か innerText）
+    for option in await element.query_selector_all('option'):
+        value = await option.get_attribute('value')
+        text = await option.inner_text()
+        if search == value or search == text:
+            if value is not None:
+                await element.select_option(value=value)
+            else:
+                await element.select_option(label=text)
+            return
+    return False  # 一致するものがなかった
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def focusAction(query):
+    element = await findElement(query)
+    await element.focus()
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def waitAction(query=None):
+    page = getPage()
+    if query is None:
+        await page.wait_for_load_state(state=getParam('p.wait_state'))
+        return
+
+    element = None
+    while element is None:
+        element = await getElement(page, query)
+
+
+@instrumented()
+@retryCounter(breakException=[KeyboardInterrupt, TimeoutError])
+async def uploadAction(query_file):
+    query, file_path = sepSplit(query_file)
+    element = await findElement(query)
+
+    # ダブルクォーテーション囲みの場合は除去する
+    if file_path.startswith('"') and file_path.endswith('"'):
+        file_path = file_path[1:-1]
+    await element.set_input_files(file_path)
+
+
+@instrumented()
+async def screenshotAction(file_path=None):
+    save_path = getScreenshotPath(file_path)
+    scale = getParam('p.screenshot.scale_type')
+    await getPage().screenshot(path=save_path, full_page=True, type='png', scale=scale)
+
+
+@instrumented()
+async def getAction(query):
+    element = await findElement(query)
+    text = await element.inner_text()
+    print(text)
+    setParam('text', text)
+
+
+@instrumented()
+async def existAction(query):
+    element = await getElement(getPage(), query, no_retry=True)
+    return bool(element)
+
+
+@instrumented()
+async def keyAction(keys):
+    await getPage().keyboard.press(convertKeys(keys))
+
+
+@instrumented()
+async def stopBrowser():
+    global p, browser, context
+    auto_close = getParam('p.browser.auto_close', True)
+    if not auto_close:
+        print(f"auto_close=Falseのため待機")
+        await asyncio.to_thread(input, 'Enter...>')
+
+    if p:
+        print("Stopping browser...", end=' ')
+        try:
+            await p.stop()
+            print('[OK]')
+        except Exception as e:
+            print('[NG]')
+            logger.warning(f'ブラウザの停止に失敗しました: {e}')
+    p = browser = context = None
+
+
+# 同期版(playwrightActions.action_list)と同じコマンド名で定義する
+action_list = {
+    'open' : openAction,
+    'goto' : gotoAction,
+    'tab'  : tabAction,
+    'click': clickAction,
+    'input': inputAction,
+    'select': selectAction,
+    'focus': focusAction,
+    'wait': waitAction,
+    'upload': uploadAction,
+    'screenshot': screenshotAction,
+    'get' : getAction,
+    'exist': existAction,
+    'key': keyAction,
+    'doubleClick': doubleClickAction,
+    'rightClick': rightClickAction,
+}
@@ -259,7 +259,12 @@ def find_element(queries, getAll=False):
                     break
         if elems != []:
             break
-        time.sleep(interval)
+        # 呼び出し元のリトライの期限を超えて待機しない
+        time_left = getRetryTimeLeft()
+        if time_left is not None and time_left <= 0:
+            break
+        search_count += 1
+        time.sleep(interval if time_left is None else min(interval, time_left))
 
     if getAll:
         return elems
@@ -483,4 +488,7 @@ action_list = {
     'kill' : killAction,
     'get'  : getAction,
     'connect': connectAction
-}
\ No newline at end of file
+}
+
+# アクション実行後の待機秒(外部のUIを操作するため)
+pacing = 'READ_LINE_INTERVAL'
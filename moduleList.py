@@ -49,4 +49,143 @@ def getModuleActions(module):
     return module_list[module].action_list
 
 def getModuleDescription(module):
-    return module_list[module].__doc__
\ No newline at end of file
+    return module_list[module].__doc__
+
+
+# コマンド索引のキャッシュ(作成時のmodule_priority, 索引)
+_command_index = (None, {})
+
+def buildCommandIndex(module_priority):
+    """コマンド名からアクション関数を引く索引を作成する
+
+    全モジュール(別名含む)の 'module.command' と、
+    module_priorityに含まれるモジュールのコマンド名を1つの辞書にまとめる。
+    コマンド名が重複する場合はmodule_priorityの先頭側を優先する。
+
+    Args:
+        module_priority (str): カンマ区切りのモジュール優先度
+
+    Returns:
+        dict: コマンド名(修飾名含む)→アクション関数
+
+    Raises:
+        KeyError: module_priorityに未定義のモジュールが含まれる場合
+    """
+    index = {}
+    for module, actions in ((name, mod.action_list) for name, mod in module_list.items()):
+        for command_name, func in actions.items():
+            index[f'{module}.{command_name}'] = func
+
+    # 先頭側が優先されるように逆順で上書きする
+    for module in reversed(module_priority.split(',')):
+        if module not in module_list:
+            raise KeyError(f'module_priorityに未定義のモジュールが含まれます: {module}')
+        index.update(getModuleActions(module))
+
+    return index
+
+def getCommandIndex(module_priority):
+    """module_priorityに対応するコマンド索引を取得する
+
+    module_priorityが前回と同じ場合は作成済みの索引を返し、
+    変更された場合(importコマンド等)のみ作り直す。
+
+    Args:
+        module_priority (str): カンマ区切りのモジュール優先度
+
+    Returns:
+        dict: コマンド名(修飾名含む)→アクション関数
+    """
+    global _command_index
+    priority, index = _command_index
+    if priority != module_priority:
+        index = buildCommandIndex(module_priority)
+        _command_index = (module_priority, index)
+    return index
+
+
+# アクション関数→待機秒のパラメータキー
+_pacing_index = None
+
+def getActionPacing(func):
+    """アクション実行後の待機秒を定義したパラメータキーを取得する
+
+    各モジュールは以下の属性で待機を宣言する。
+    - pacing (str): モジュール内の全アクションに適用するパラメータキー
+    - action_pacing (dict): アクション名→パラメータキー(Noneの場合は待機しない)
+    宣言がないモジュール(default, flow等)のアクションは待機せずに連続実行する。
+
+    Args:
+        func (callable): アクション関数
+
+    Returns:
+        str or None: 待機秒のパラメータキー。待機しない場合はNone
+    """
+    global _pacing_index
+    if _pacing_index is None:
+        _pacing_index = {}
+        for mod in formal_module_list.values():
+            module_pacing = getattr(mod, 'pacing', None)
+            action_pacing = getattr(mod, 'action_pacing', {})
+            for command_name, action_func in mod.action_list.items():
+                _pacing_index[action_func] = action_pacing.get(command_name, module_pacing)
+    return _pacing_index.get(func)
+
+
+# 非同期版のモジュール(正式名称→モジュール名)
+# async_mode: Trueの場合、同名のコマンドは非同期版のアクションで実行する
+async_module_list = {
+    'default': 'module.defaultAsyncActions',
+    'page'   : 'module.playwrightAsyncActions',
+}
+
+# クリップボードを書き換える可能性があるアクション関数
+_clipboard_index = None
+
+def isClipboardAction(func):
+    """クリップボードを書き換える可能性があるアクションか(実行後に${clip}のキャッシュを破棄する)
+
+    待機(pacing)を宣言したUI操作のアクション(Ctrl+Cの送信など)と、
+    各モジュールのclipboard_actions(アクション名のリスト)に含まれるアクションが該当する。
+
+    Args:
+        func (callable): アクション関数(同期版)
+
+    Returns:
+        bool: 該当する場合True
+    """
+    global _clipboard_index
+    if _clipboard_index is None:
+        _clipboard_index = set()
+        for mod in formal_module_list.values():
+            clipboard_actions = getattr(mod, 'clipboard_actions', ())
+            for command_name, action_func in mod.action_list.items():
+                if command_name in clipboard_actions or getActionPacing(action_func):
+                    _clipboard_index.add(action_func)
+    return func in _clipboard_index
+
+
+# アクション関数(同期版)→非同期版のアクション関数
+_async_index = None
+
+def getAsyncAction(func):
+    """アクション関数の非同期版を取得する
+
+    非同期版のモジュールはasync_modeで初めて必要になった時点で読み込む。
+
+    Args:
+        func (callable): アクション関数(同期版)
+
+    Returns:
+        callable or None: 非同期版のアクション関数(コルーチン関数)。定義がない場合はNone
+    """
+    global _async_index
+    if _async_index is None:
+        import importlib
+        _async_index = {}
+        for formal, module_name in async_module_list.items():
+            async_actions = importlib.import_module(module_name).action_list
+            for command_name, action_func in formal_module_list[formal].action_list.items():
+                if command_name in async_actions:
+                    _async_index[action_func] = async_actions[command_name]
+    return _async_index.get(func)
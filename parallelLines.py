@@ -0,0 +1,208 @@
+'''複数のcommandファイルをワーカープールで並列実行する
+
+子シナリオはそれぞれ別プロセス(parallel.mode: threadの場合は別スレッド)で実行し、
+親のパラメータを独立したスコープとして受け取る。終了後に子が変更したパラメータを
+指定順に親へマージする。
+'''
+import os
+import pickle
+import multiprocessing
+import contextvars
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lib.paramSetting import getParam, setParam, restoreParams, snapshotParams, paramScope, getScope
+from lib.loggerSetting import getMyLogger
+from lib.shutdownSetting import shutdownScope
+
+logger = getMyLogger(__name__)
+
+
+def isPicklable(value):
+    """ワーカープロセスに受け渡し可能な値か
+
+    Args:
+        value (Any): 判定する値
+
+    Returns:
+        bool: pickle化できる場合True
+    """
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def takeSnapshot():
+    """子シナリオに渡すパラメータとサブルーチンのスナップショットを作成する
+
+    Returns:
+        tuple[dict, dict]: (パラメータ, サブルーチン)
+
+    Note:
+        ブラウザのページなど、プロセス間で受け渡しできない値は含めない。
+    """
+    from readLines import subroutine_list
+    params = {}
+    for key, value in snapshotParams().items():
+        if isPicklable(value):
+            params[key] = value
+        else:
+            logger.debug(f'並列実行に渡せないため除外しました : {key}')
+    return params, dict(subroutine_list)
+
+
+def runChild(file_path, snapshot, args):
+    """ワーカープロセスで子シナリオを実行する
+
+    Args:
+        file_path (str): 実行するcommandファイルのパス
+        snapshot (tuple[dict, dict]): takeSnapshotの結果
+        args (dict): 子シナリオのみに設定するパラメータ(key→値)
+
+    Returns:
+        dict: 子シナリオで追加・変更されたパラメータ(key→値)
+
+    Note:
+        argsで設定したパラメータと、アクションの戻り値(return)は返さない。
+        ログはワーカーごとのファイル(fh.pathにプロセスIDを付けたパス)に出力する。
+        子シナリオで登録したシャットダウン処理(ブラウザの停止など)は終了時に実行する。
+    """
+    params, subroutines = snapshot
+    # モジュールの読込(PARAM_FOLDER等を参照する)のために一度復元する
+    restoreParams(params)
+
+    import lib.loggerSetting as loggerSetting
+    if loggerSetting.logger is None:
+        # 親・他のワーカーと同じファイルに書き込まないようにする
+        root, ext = os.path.splitext(getParam('fh.path', '.\\log\\trace.log'))
+        loggerSetting.setLogger(f'{root}.{os.getpid()}{ext}')
+
+    # 各モジュールは読込時に既定値(param/mod/*.yaml)を設定するため、読み込んでから親の値に戻す。
+    # プールのプロセスは使い回されるため、前の子シナリオの状態もここで消える
+    from readLines import readFile, subroutine_list
+    restoreParams(params)
+    for key, value in args.items():
+        setParam(key, value)
+    # 子シナリオのみのパラメータも含めた実行前の状態
+    initial = snapshotParams()
+
+    subroutine_list.clear()
+    subroutine_list.update(subroutines)
+
+    with shutdownScope():
+        readFile(file_path)
+
+    changed = {}
+    for key, value in snapshotParams().items():
+        if key == 'return' or (key in initial and initial[key] == value):
+            continue
+        if isPicklable(value):
+            changed[key] = value
+    return changed
+
+
+def runChildThread(file_path, parent, args):
+    """ワーカースレッドで子シナリオを実行する(parallel.mode: thread)
+
+    子シナリオは呼び出し元のスコープを親とする独立したスコープで実行するため、
+    他の子シナリオや呼び出し元のパラメータ(return, stdout等)を書き換えない。
+
+    Args:
+        file_path (str): 実行するcommandファイルのパス
+        parent (ParamScope or None): 呼び出し元のスコープ
+        args (dict): 子シナリオのみに設定するパラメータ(key→値)
+
+    Returns:
+        dict: 子シナリオで追加・変更されたパラメータ(key→値)
+
+    Note:
+        子シナリオで登録したシャットダウン処理(ブラウザの停止など)は終了時に実行する。
+    """
+    from readLines import readFile
+    with paramScope(parent) as args_scope:
+        for key, value in args.items():
+            setParam(key, value)
+        with paramScope() as scope, shutdownScope():
+            readFile(file_path)
+
+    changed = {}
+    for key, value in scope.values.items():
+        if key == 'return':
+            continue
+        if args_scope.lookup(key) == value:
+            continue
+        changed[key] = value
+    return changed
+
+
+def readParallel(file_paths, args=None):
+    """複数のcommandファイルを並列に実行し、結果を親のパラメータにマージする
+
+    Args:
+        file_paths (list[str]): 実行するcommandファイルのパス
+        args (dict, optional): 全ての子シナリオに設定するパラメータ(key→値)
+
+    Returns:
+        dict: マージしたパラメータ(key→値)
+
+    Raises:
+        Exception: 失敗した子シナリオがある場合(成功した子の結果はマージ済み)
+
+    Params:
+        parallel.max_workers (int): 同時に実行する最大数(0の場合はCPU数+4、最大32)
+        parallel.mode (str): process(別プロセスで実行)またはthread(同じプロセスの別スレッドで実行)
+
+    Note:
+        同じキーを複数の子シナリオが変更した場合は、指定順で後の値を採用する。
+        threadは起動が速く、pickle化できない値(ブラウザのページなど)も子に渡せるが、
+        子シナリオのPythonの処理は同時に1つしか進まない(外部コマンド・待機は並行する)。
+    """
+    if not file_paths:
+        return {}
+
+    max_workers = getParam('parallel.max_workers', 0, cast_type=int)
+    if max_workers <= 0:
+        # 子シナリオは外部コマンドの待ち時間が主なため、CPU数より多めに実行する
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    max_workers = min(max_workers, len(file_paths))
+
+    mode = getParam('parallel.mode', 'process')
+    logger.info(f'並列実行を開始します(mode={mode}, workers={max_workers}) : {", ".join(file_paths)}')
+    if mode == 'thread':
+        parent = getScope()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='readParallel') as executor:
+            # 呼び出し元の実行コンテキスト(ログのネスト・プロファイルの実行中の行など)を引き継ぐ
+            futures = [
+                executor.submit(contextvars.copy_context().run, runChildThread, file_path, parent, args or {})
+                for file_path in file_paths
+            ]
+    elif mode == 'process':
+        snapshot = takeSnapshot()
+        # Windowsと同じ起動方式に揃え、実行環境によって子の状態が変わらないようにする
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            futures = [executor.submit(runChild, file_path, snapshot, args or {}) for file_path in file_paths]
+    else:
+        raise ValueError(f'parallel.modeにはprocessまたはthreadを指定してください: {mode}')
+
+    merged = {}
+    errors = []
+    for file_path, future in zip(file_paths, futures):
+        try:
+            changed = future.result()
+        except Exception as e:
+            logger.error(f'並列実行に失敗 : {file_path} : {e}')
+            errors.append(file_path)
+            continue
+        for key, value in changed.items():
+            if key in merged and merged[key] != value:
+                logger.warning(f'並列実行の結果が競合しました(後の値を採用) : {key} ({file_path})')
+            merged[key] = value
+
+    for key, value in merged.items():
+        setParam(key, value, disable_cast=True)
+    logger.info(f'並列実行が終了しました : 成功{len(file_paths) - len(errors)}件 失敗{len(errors)}件')
+
+    if errors:
+        raise Exception(f'並列実行に失敗したファイルがあります: {", ".join(errors)}')
+    return merged
@@ -1,94 +1,133 @@
 import sys
 import time
-import re
-from lib.paramSetting import getParam, setParam
-from module.flowActions import flow_action_list
+import inspect
+from contextlib import contextmanager, nullcontext
+from lib.paramSetting import getParam, setParam, delParam, invalidateReservedParams
+from module.flowActions import flow_action_list, block_action_list, flow_state, evalCondition, whileAction
+from compileLines import loadProgram, iterPrograms, openScenario, isStreamSource
+from compileLines import ProgramBuilder, isBlockStart
+from compileLines import KIND_ACTION, KIND_IF, KIND_ELIF, KIND_ELSE, KIND_FI
+from compileLines import KIND_WHILE, KIND_BREAK, KIND_CONTINUE, KIND_DONE, KIND_DEF, LOOP_KINDS
 from lib.decoratorSetting import *
 from lib.commonDefine import *
 from lib.loggerSetting import getMyLogger
+from lib.templateSetting import compileTemplate, renderTemplates
+from lib.profilerSetting import getProfiler, getActionProfiler
+from lib.reloadSetting import pending_reloads, applyReloads
 
 # モジュールロガーを取得
 logger = getMyLogger(__name__)
 
-from moduleList import module_list, getModuleActions
+from moduleList import getCommandIndex, getActionPacing, isClipboardAction
 
 @instrumented()
 def resolveCommand(command_name):
-    
-    pattern = r'^(.+?)\.(.*)$'
-    match = re.search(pattern, command_name)
-    if match:
-        module = match.group(1).strip()
-        command_name = match.group(2).strip()
-        module_actions = getModuleActions(module)
-        if command_name in module_actions:
-            return module_actions[command_name]
-        else:
-            raise KeyError('コマンドが見つかりません')
-    else:
-        module_priority = getParam('module_priority', 'd').split(',')
-        for module in module_priority:
-            module_actions = getModuleActions(module)
-            if command_name  in module_actions:
-                return module_actions[command_name]
-        else:
-            raise KeyError('コマンドが見つかりません')
+    """コマンド名からアクション関数を取得する
+
+    Args:
+        command_name (str): コマンド名('action' or 'module.action')
+
+    Returns:
+        callable: アクション関数
+
+    Raises:
+        KeyError: コマンドが見つからない場合
+
+    Params:
+        module_priority (str): 修飾なしのコマンドを解決するモジュール優先度
+    """
+    command_index = getCommandIndex(getParam('module_priority', 'd'))
+    if command_name in command_index:
+        return command_index[command_name]
+    raise KeyError(f'コマンドが見つかりません: {command_name}')
+
+def resolveAction(action, args):
+    """変数置換済みのコマンドからアクション関数と引数を決定する
+
+    Args:
+        action (str): コマンド部
+        args (str): 引数部
+
+    Returns:
+        tuple[callable, str] or None: (アクション関数, 引数)。スキップする場合はNone
+    """
+    if action in flow_action_list:
+        return flow_action_list[action], args
+    # スキップ対象の通常アクションは実行しない
+    if flow_state.isSkipping():
+        return None
+    if '=' in action:
+        return resolveCommand('set'), action
+    return resolveCommand(action), args
+
+
+def invokeAction(command_func, args):
+    """アクション関数を呼び出し、戻り値をreturnに設定する
+
+    Args:
+        command_func (callable): アクション関数
+        args (str): 引数部(空の場合は引数なしで呼び出す)
+
+    Returns:
+        Any: アクションの戻り値
+
+    Raises:
+        RuntimeError: 非同期エンジン専用のアクション(コルーチン)を呼び出した場合
+
+    Params:
+        return: アクションの戻り値(Noneの場合は更新しない)
+        profile.actions (str): 指定したアクションはcProfileで計測する
+
+    Note:
+        クリップボードを書き換える可能性があるアクションの実行後は${clip}のキャッシュを破棄する。
+    """
+    action_profiler = getActionProfiler()
+    try:
+        with nullcontext() if action_profiler is None else action_profiler.measure(command_func):
+            if args:
+                result = command_func(args)
+            else:
+                result = command_func()
+    finally:
+        if isClipboardAction(command_func):
+            invalidateReservedParams('clip')
+
+    if result is not None:
+        if inspect.iscoroutine(result):
+            result.close()
+            raise RuntimeError(f'{command_func.__name__}はasync_mode: Trueの場合のみ実行できます')
+        setParam('return', result, disable_cast=True)
+    return result
+
+
+def dispatchAction(action, args):
+    """変数置換済みのコマンドを解決して実行する
+
+    Args:
+        action (str): コマンド部
+        args (str): 引数部
+
+    Returns:
+        callable or None: 実行したアクション関数(スキップした場合はNone)
+
+    Params:
+        return: アクションの戻り値(Noneの場合は更新しない)
+    """
+    resolved = resolveAction(action, args)
+    if resolved is None:
+        return None
+    command_func, args = resolved
+    invokeAction(command_func, args)
+    return command_func
+
 
 @instrumented()
 def executeLine(action, args):
-    # 変数置換
-    pattern = r'\$\{(.+?)\}'
-    match = re.search(pattern, args)
-    if match:
-        key = match.group(1)
-        if hasParam(key):
-            value = str(getParam(key))
-            new_args = args.replace(f'${{{key}}}', value)
-            logger.info(f'変数を置換しました : ${{{key}}} -> {value}')
-            executeLine(action, new_args)
-            return
-        else:
-            logger.warning(f'変数を置換できません : ${{{key}}} -> {value}')
-            
-    # 変数置換
-    pattern = r'\$\{(.+?)\}'
-    match = re.search(pattern, action)
-    if match:
-        key = match.group(1)
-        if hasParam(key):
-            value = str(getParam(key))
-            new_action = action.replace(f'${{{key}}}', value)
-            logger.info(f'変数を置換しました : ${{{key}}} -> {value}')
-            executeLine(new_action, args)
-            return
-        else:
-            logger.warning(f'変数を置換できません : ${{{key}}} -> {value}')
-
     # フロー制御 or 通常アクション
     try:
-        # アクション関数を取得
-        if action in flow_action_list:
-            command_func = flow_action_list[action]
-        else:
-            # スキップ対象の通常アクションは実行しない
-            flow_stack = getParam('flow_stack', [])
-            is_skipping = any(not frame['executed'] for frame in flow_stack)
-            if is_skipping:
-                return
-            if '=' in action:
-                command_func = resolveCommand('set')
-                args = action
-            else:
-                command_func = resolveCommand(action)
-                
-        if args:
-            result = command_func(args)
-        else:
-            result = command_func()
-
-        if result is not None:
-            setParam('return', result, disable_cast=True)
-            
+        # 変数置換
+        args, action = renderTemplates((compileTemplate(args), compileTemplate(action)))
+        dispatchAction(action, args)
     except KeyboardInterrupt as e:
         raise
     except Exception as e:
@@ -109,54 +148,402 @@ def readLine(line):
     # コマンド：引数の分離
     action, args = patternMatchSplit(':', line)
     
-    # flow_stack ベースで「スキップすべき通常アクションかどうか」を判断
-    flow_stack = getParam('flow_stack', [])
-    is_skipping = any(not frame['executed'] for frame in flow_stack)
-
-    if is_skipping and action not in flow_action_list:
-        logger.debug(f'skipped({line})flow_stack:{flow_stack}')
+    # flow_state ベースで「スキップすべき通常アクションかどうか」を判断
+    if action in flow_action_list:
+        # 評価不要な条件は変数置換せずに分岐状態のみ更新する
+        if not flow_state.needsCondition(action):
+            args = ''
+    elif flow_state.isSkipping():
+        logger.debug(f'skipped({line}){flow_state}')
         return
         
     executeLine(action, args)
 
 
+# (コマンド名, module_priority)→アクション関数
+_resolved_commands = {}
+
+def resolveInstruction(instruction):
+    """命令のアクション関数を取得する
+
+    解決した関数はコマンド名とmodule_priorityごとに保持して再利用する。
+    命令は並列実行の子シナリオと共有するため、解決結果を命令には書き込まない。
+
+    Args:
+        instruction (Instruction): 対象の命令
+
+    Returns:
+        callable: アクション関数
+
+    Params:
+        module_priority (str): コマンド解決時のモジュール優先度
+    """
+    key = (instruction.command, getParam('module_priority', 'd'))
+    func = _resolved_commands.get(key)
+    if func is None:
+        func = _resolved_commands[key] = resolveCommand(instruction.command)
+    return func
+
+
 @instrumented()
-def readFile(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except FileNotFoundError as e:
-        raise FileNotFoundError(f'指定されたファイルが見つかりません: "{file_path}"')
-    
-    for line in lines:
-        line = line.strip()
+def executeInstruction(instruction):
+    """コンパイル済みの通常アクション命令を実行する
+
+    変数を含む命令は置換してからコマンドを解決する。
+    それ以外は解決済みのアクション関数を直接呼び出す。
+
+    Args:
+        instruction (Instruction): 実行する命令
+
+    Returns:
+        callable or None: 実行したアクション関数(実行後の待機の判定用)。スキップした場合はNone
+
+    Params:
+        return: アクションの戻り値(Noneの場合は更新しない)
+    """
+    if instruction.dynamic:
+        action, args = renderTemplates(instruction.templates)
+        return dispatchAction(action, args)
+
+    command_func = resolveInstruction(instruction)
+    invokeAction(command_func, instruction.args)
+    return command_func
+
+
+def renderArgs(instruction):
+    """命令の引数部の変数を置換する(制御構文の条件・ループ指定用)
+
+    Args:
+        instruction (Instruction): 対象の命令
+
+    Returns:
+        str: 置換後の引数部
+    """
+    if instruction.dynamic:
+        _, args = renderTemplates(instruction.templates)
+        return args
+    return instruction.args
+
+
+# ループの値を使い切ったことを表す
+_LOOP_END = object()
+
+
+def advanceLoop(instructions, header_index, loop_states):
+    """ループを次の繰り返しへ進める
+
+    Args:
+        instructions (list[Instruction]): 命令列
+        header_index (int): ループの開始(for/while/repeat)の位置
+        loop_states (dict): ループの開始位置→値のイテレータ
+
+    Returns:
+        int: 次に実行する命令の位置(ループ本体の先頭、または終了後)
+    """
+    header = instructions[header_index]
+    if header.kind == KIND_WHILE:
+        # whileは繰り返しごとに条件を再評価する
+        is_continued = whileAction(renderArgs(header))
+    else:
+        is_continued = next(loop_states[header_index], _LOOP_END) is not _LOOP_END
+
+    if is_continued:
+        return header_index + 1
+    loop_states.pop(header_index, None)
+    return header.end + 1
+
+
+def stepProgram(program):
+    """コンパイル済みの命令列の制御構文を処理し、実行する通常アクションの命令を順に返す
+
+    if/elifの条件が偽の場合はコンパイル時に確定したジャンプ先へ移動し、
+    実行しない分岐の行は評価しない。
+    ループ(for/while/repeat～done)は命令列内を移動して繰り返すため、
+    ファイルの再読み込みや再帰呼び出しは発生しない。
+    defはコンパイル済みの本体をサブルーチンとして登録する。
+
+    Args:
+        program (Program): 実行する命令列
+
+    Yields:
+        Instruction: 通常アクションの命令(呼び出し側で実行してから次へ進める)
+
+    Raises:
+        Exception: 制御構文の評価に失敗した場合
+    """
+    instructions = program.instructions
+    count = len(instructions)
+    pc = 0
+    # 偽の条件から次の分岐へジャンプした直後か
+    branching = False
+    # 実行中のループの状態(開始位置→値のイテレータ)
+    loop_states = {}
+    while pc < count:
+        instruction = instructions[pc]
+        kind = instruction.kind
+        if kind == KIND_ACTION:
+            # 監視スレッドが検出したパラメータファイルの変更を行の間で反映する
+            if pending_reloads:
+                applyReloads()
+            yield instruction
+            pc += 1
+            continue
         try:
-            readLine(line)
+            if kind == KIND_IF or (kind == KIND_ELIF and branching):
+                if evalCondition(renderArgs(instruction)):
+                    pc += 1
+                    branching = False
+                else:
+                    pc = instruction.jump
+                    branching = True
+            elif kind in (KIND_ELIF, KIND_ELSE):
+                if branching:
+                    # 条件が全て偽だった場合のelse
+                    pc += 1
+                    branching = False
+                else:
+                    # 実行済みの分岐から到達した場合はfiへ
+                    pc = instruction.end
+            elif kind == KIND_FI:
+                pc += 1
+                branching = False
+            elif kind in LOOP_KINDS:
+                if kind != KIND_WHILE:
+                    loop_states[pc] = block_action_list[kind](renderArgs(instruction))
+                pc = advanceLoop(instructions, pc, loop_states)
+            elif kind in (KIND_DONE, KIND_CONTINUE):
+                pc = advanceLoop(instructions, instruction.jump, loop_states)
+            elif kind == KIND_BREAK:
+                loop_states.pop(instruction.jump, None)
+                pc = instructions[instruction.jump].end + 1
+            elif kind == KIND_DEF:
+                defineSubroutine(renderArgs(instruction), instruction.body)
+                pc += 1
         except Exception as e:
-            logger.error(f'実行に失敗 : {line}', exc_info=True)
+            logger.error(f'実行に失敗 : {instruction.line}', exc_info=True)
             raise
-        except KeyboardInterrupt as e:
-            logger.warning('KeyboardInterrupt')
-            break
-        except SystemExit as e:
-            logger.info('SystemExit')
-            break
-        time.sleep(float(getParam('READ_LINE_INTERVAL')))
+
+
+def runProgram(program):
+    """コンパイル済みの命令列を実行する
+
+    制御構文はstepProgramで処理し、通常アクションのみをここで実行する。
+    待機はUIを操作するアクション(モジュールがpacingを宣言したもの)の後のみ行い、
+    パラメータ操作・フロー制御などは連続して実行する。
+
+    Args:
+        program (Program): 実行する命令列
+
+    Returns:
+        bool: 最後まで実行した場合True、quit等で中断した場合False
+
+    Raises:
+        Exception: 命令の実行に失敗した場合
+
+    Params:
+        READ_LINE_INTERVAL (float): UI操作アクションの実行後の待機秒(既定のpacing)
+        profile.enabled (bool): Trueの場合は行ごとの実行時間を計測する
+    """
+    profiler = getProfiler()
+    try:
+        for instruction in stepProgram(program):
+            try:
+                if profiler is None:
+                    command_func = executeInstruction(instruction)
+                else:
+                    with profiler.measure(instruction):
+                        command_func = executeInstruction(instruction)
+            except Exception as e:
+                logger.error(f'実行に失敗 : {instruction.line}', exc_info=True)
+                raise
+            pacing = getActionPacing(command_func)
+            if pacing:
+                time.sleep(float(getParam(pacing)))
+    except KeyboardInterrupt as e:
+        logger.warning('KeyboardInterrupt')
+        return False
+    except SystemExit as e:
+        logger.info('SystemExit')
+        return False
+    return True
+
+
+# 定義済みのサブルーチン(名前→本体の命令列)
+subroutine_list = {}
+
+def defineSubroutine(name, program):
+    """サブルーチンを定義する
+
+    Args:
+        name (str): サブルーチン名
+        program (Program): コンパイル済みの本体
+    """
+    if name in subroutine_list:
+        logger.info(f'サブルーチンを再定義しました : {name}')
+    subroutine_list[name] = program
+
+
+# 呼び出し前に未設定だったことを表す
+_UNSET = object()
+
+
+@contextmanager
+def subroutineScope(name, args=None):
+    """サブルーチン呼び出し中のみ有効なローカル変数を設定する
+
+    引数(key=value)を設定し、終了後は呼び出し前の値に戻す(未設定だった場合は削除する)。
+
+    Args:
+        name (str): サブルーチン名
+        args (list[str], optional): 'key=value'形式の引数
+
+    Yields:
+        Program: サブルーチンの本体
+
+    Raises:
+        KeyError: サブルーチンが定義されていない場合
+        ValueError: 引数がkey=valueの形式でない場合
+    """
+    if name not in subroutine_list:
+        raise KeyError(f'サブルーチンが定義されていません: {name}')
+
+    local_params = {}
+    for arg in args or []:
+        if '=' not in arg:
+            raise ValueError(f'callの第二引数以降はkey=valueの形式にしてください: {arg}')
+        key, value = patternMatchSplit('=', arg)
+        local_params[key] = value
+
+    # 呼び出し前の値を退避してからローカル変数を設定する
+    saved_params = {key: getParam(key) if hasParam(key) else _UNSET for key in local_params}
+    for key, value in local_params.items():
+        setParam(key, value, disable_cast=True)
+    try:
+        yield subroutine_list[name]
+    finally:
+        for key, value in saved_params.items():
+            if value is _UNSET:
+                delParam(key)
+            else:
+                setParam(key, value, disable_cast=True)
+
+
+@instrumented()
+def callSubroutine(name, args=None):
+    """サブルーチンを呼び出す
+
+    引数(key=value)は呼び出し中のみ有効なローカル変数として設定し、
+    終了後は呼び出し前の値に戻す(未設定だった場合は削除する)。
+
+    Args:
+        name (str): サブルーチン名
+        args (list[str], optional): 'key=value'形式の引数
+
+    Returns:
+        bool: 最後まで実行した場合True、quit等で中断した場合False
+
+    Raises:
+        KeyError: サブルーチンが定義されていない場合
+        ValueError: 引数がkey=valueの形式でない場合
+    """
+    with subroutineScope(name, args) as program:
+        return runProgram(program)
+
+
+def streamFile(file_path):
+    """コマンドファイルを逐次読み込みながら実行する
+
+    トップレベルの文(ブロックはfiまで)を読み込むごとにコンパイルして実行するため、
+    全行の読み込みを待たずに実行を開始し、メモリ使用量はファイルサイズに依存しない。
+
+    Args:
+        file_path (str): コマンドファイルのパス('-'の場合は標準入力)
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        SyntaxError: 制御構文の対応が取れていない場合
+    """
+    with openScenario(file_path) as f:
+        for program in iterPrograms(f, file_path):
+            if not runProgram(program):
+                break
+
+
+@instrumented()
+def readFile(file_path):
+    """コマンドファイルをコンパイルして実行する
+
+    コンパイル結果はキャッシュされ、同じファイルを繰り返しreadする場合は再利用する。
+
+    Args:
+        file_path (str): 実行するコマンドファイルのパス('-'の場合は標準入力)
+
+    Raises:
+        FileNotFoundError: ファイルが存在しない場合
+        SyntaxError: 制御構文の対応が取れていない場合
+
+    Params:
+        stream_mode (bool): Trueの場合は全行を読み込まずに逐次実行する
+        async_mode (bool): Trueの場合はasyncioの実行エンジン(readLinesAsync)で実行する
+
+    Note:
+        標準入力・名前付きパイプ(FIFO)はstream_modeに関わらず逐次実行する。
+    """
+    if getParam('async_mode', False, cast_type=bool):
+        # 循環参照防止のため関数内でインポート
+        from readLinesAsync import runFileAsync
+        runFileAsync(file_path)
+        return
+
+    if getParam('stream_mode', False, cast_type=bool) or isStreamSource(file_path):
+        streamFile(file_path)
+        return
+
+    program = loadProgram(file_path)
+    runProgram(program)
 
 
 def interactiveMode():
+    """対話形式でコマンドを1行ずつ実行する
+
+    ループ(for/while/repeat)・サブルーチン定義(def)はブロックが閉じるまで入力をまとめ、
+    コンパイルしてから実行する。
+    """
+    # 入力中のブロック(ループ)
+    builder = None
+    line_no = 0
     while True:
         try:
-            line = input('>').strip()
+            line = input('>' if builder is None else '...>').strip()
         except (KeyboardInterrupt, EOFError) as e:
             print()
             break  # ループを抜けて終了
+        line_no += 1
         try:
-            readLine(line)
+            if builder is None and isBlockStart(line):
+                builder = ProgramBuilder('<interactive>')
+            if builder is None:
+                if pending_reloads:
+                    applyReloads()
+                readLine(line)
+                continue
+
+            builder.addLine(line, line_no)
+            if not builder.isClosed():
+                continue
+            program = builder.build()
+            builder = None
+            # if分岐でスキップ中の場合はブロックごと実行しない
+            if flow_state.isSkipping():
+                continue
+            if not runProgram(program):
+                break
         except KeyboardInterrupt:
+            builder = None
             logger.warning('KeyboardInterrupt')
         except SystemExit:
             logger.info('SystemExit')
             break
         except Exception as e:
+            builder = None
             logger.error(f'実行に失敗 : {line}', exc_info=True)
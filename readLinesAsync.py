@@ -0,0 +1,203 @@
+'''asyncioで動作する実行エンジン
+
+制御構文の処理(stepProgram)は同期版のreadLinesと共通で、通常アクションの実行のみを
+イベントループ上で行う。非同期版が定義されたアクション(moduleList.async_module_list)は
+コルーチンとして実行するため、ページ操作の待機や外部コマンドの完了待ちの間も
+gatherで起動した他のシナリオが進む。
+'''
+import asyncio
+import inspect
+from contextlib import nullcontext
+from lib.paramSetting import getParam, setParam, invalidateReservedParams
+from lib.decoratorSetting import instrumented
+from lib.loggerSetting import getMyLogger
+from lib.templateSetting import renderTemplates
+from lib.profilerSetting import getProfiler, getActionProfiler
+from compileLines import loadProgram, iterPrograms, openScenario, isStreamSource
+from readLines import resolveAction, resolveInstruction, stepProgram, subroutineScope
+from moduleList import getActionPacing, getAsyncAction, isClipboardAction
+
+logger = getMyLogger(__name__)
+
+# 終了時に待機するコルーチン関数(ブラウザの停止など)
+_async_shutdown_hooks = []
+
+def registerAsyncShutdownHook(func):
+    """イベントループの終了前に呼び出すコルーチン関数を登録する
+
+    Args:
+        func (Callable[[], Awaitable]): 引数なしのコルーチン関数
+    """
+    if func not in _async_shutdown_hooks:
+        _async_shutdown_hooks.append(func)
+
+
+async def invokeActionAsync(command_func, args):
+    """アクション関数を呼び出し、戻り値をreturnに設定する
+
+    非同期版が定義されている場合はそちらを呼び出して完了を待つ。
+
+    Args:
+        command_func (callable): アクション関数(同期版)
+        args (str): 引数部(空の場合は引数なしで呼び出す)
+
+    Returns:
+        Any: アクションの戻り値
+
+    Params:
+        return: アクションの戻り値(Noneの場合は更新しない)
+        profile.actions (str): 指定したアクションはcProfileで計測する
+
+    Note:
+        cProfileの計測中に待機した場合は、gatherで同時に実行している他のタスクの処理も含まれる。
+        クリップボードを書き換える可能性があるアクションの実行後は${clip}のキャッシュを破棄する。
+    """
+    action_profiler = getActionProfiler()
+    measure = nullcontext() if action_profiler is None else action_profiler.measure(command_func)
+    writes_clipboard = isClipboardAction(command_func)
+
+    async_func = getAsyncAction(command_func)
+    if async_func is not None:
+        command_func = async_func
+
+    try:
+        with measure:
+            if args:
+                result = command_func(args)
+            else:
+                result = command_func()
+            if inspect.isawaitable(result):
+                result = await result
+    finally:
+        if writes_clipboard:
+            invalidateReservedParams('clip')
+
+    if result is not None:
+        setParam('return', result, disable_cast=True)
+    return result
+
+
+@instrumented()
+async def executeInstructionAsync(instruction):
+    """コンパイル済みの通常アクション命令を実行する(readLines.executeInstructionの非同期版)
+
+    Args:
+        instruction (Instruction): 実行する命令
+
+    Returns:
+        callable or None: 実行したアクション関数(同期版)。スキップした場合はNone
+    """
+    if instruction.dynamic:
+        action, args = renderTemplates(instruction.templates)
+        resolved = resolveAction(action, args)
+        if resolved is None:
+            return None
+        command_func, args = resolved
+        await invokeActionAsync(command_func, args)
+        return command_func
+
+    command_func = resolveInstruction(instruction)
+    await invokeActionAsync(command_func, instruction.args)
+    return command_func
+
+
+async def runProgramAsync(program):
+    """コンパイル済みの命令列を実行する(readLines.runProgramの非同期版)
+
+    Args:
+        program (Program): 実行する命令列
+
+    Returns:
+        bool: 最後まで実行した場合True、quit等で中断した場合False
+
+    Raises:
+        Exception: 命令の実行に失敗した場合
+
+    Params:
+        READ_LINE_INTERVAL (float): UI操作アクションの実行後の待機秒(既定のpacing)
+        profile.enabled (bool): Trueの場合は行ごとの実行時間を計測する
+    """
+    profiler = getProfiler()
+    try:
+        for instruction in stepProgram(program):
+            try:
+                if profiler is None:
+                    command_func = await executeInstructionAsync(instruction)
+                else:
+                    with profiler.measure(instruction):
+                        command_func = await executeInstructionAsync(instruction)
+            except Exception as e:
+                logger.error(f'実行に失敗 : {instruction.line}', exc_info=True)
+                raise
+            pacing = getActionPacing(command_func)
+            if pacing:
+                await asyncio.sleep(float(getParam(pacing)))
+    except KeyboardInterrupt as e:
+        logger.warning('KeyboardInterrupt')
+        return False
+    except SystemExit as e:
+        logger.info('SystemExit')
+        return False
+    return True
+
+
+@instrumented()
+async def callSubroutineAsync(name, args=None):
+    """サブルーチンを呼び出す(readLines.callSubroutineの非同期版)
+
+    Args:
+        name (str): サブルーチン名
+        args (list[str], optional): 'key=value'形式の引数
+
+    Returns:
+        bool: 最後まで実行した場合True、quit等で中断した場合False
+    """
+    with subroutineScope(name, args) as program:
+        return await runProgramAsync(program)
+
+
+@instrumented()
+async def readFileAsync(file_path):
+    """コマンドファイルをコンパイルして実行する(readLines.readFileの非同期版)
+
+    Args:
+        file_path (str): 実行するコマンドファイルのパス('-'の場合は標準入力)
+
+    Params:
+        stream_mode (bool): Trueの場合は全行を読み込まずに逐次実行する
+    """
+    if getParam('stream_mode', False, cast_type=bool) or isStreamSource(file_path):
+        with openScenario(file_path) as f:
+            for program in iterPrograms(f, file_path):
+                if not await runProgramAsync(program):
+                    break
+        return
+
+    program = loadProgram(file_path)
+    await runProgramAsync(program)
+
+
+async def mainAsync(file_path):
+    """イベントループ上でコマンドファイルを実行し、終了前に登録された後処理を行う
+
+    Args:
+        file_path (str): 実行するコマンドファイルのパス
+    """
+    try:
+        await readFileAsync(file_path)
+    finally:
+        for func in reversed(_async_shutdown_hooks):
+            try:
+                await func()
+            except Exception as e:
+                print(f"[shutdown error] {func.__name__}: {e}")
+        _async_shutdown_hooks.clear()
+
+
+def runFileAsync(file_path):
+    """新しいイベントループでコマンドファイルを実行する
+
+    Args:
+        file_path (str): 実行するコマンドファイルのパス
+    """
+    asyncio.run(mainAsync(file_path))
@@ -1,5 +1,10 @@
+import json
+import pickle
+import pstats
 import subprocess
 import sys
+import tempfile
+import time
 import unittest
 from pathlib import Path
 import pyperclip
@@ -9,10 +14,34 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
 
 class Test0100CommandCases(unittest.TestCase):
-    def run_command_file(self, command_file: str, *extra_args: str) -> str:
+    def run_command_file(self, command_file: str, *extra_args: str, stdin: str | None = None) -> str:
         process = subprocess.run(
             [sys.executable, "CommandRPA.py", command_file, *extra_args],
             cwd=PROJECT_ROOT,
+            input=stdin,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=30,
+        )
+
+        combined_output = (process.stdout or "") + "\n" + (process.stderr or "")
+
+        self.assertEqual(
+            process.returncode,
+            0,
+            msg=f"{command_file} failed with code {process.returncode}\n{combined_output}",
+        )
+        return combined_output
+
+    def run_interactive(self, command_file: str) -> str:
+        with open(PROJECT_ROOT / command_file, encoding="utf-8") as f:
+            commands = f.read()
+        process = subprocess.run(
+            [sys.executable, "CommandRPA.py"],
+            cwd=PROJECT_ROOT,
+            input=commands,
             capture_output=True,
             text=True,
             encoding="utf-8",
@@ -94,6 +123,416 @@ class Test0100CommandCases(unittest.TestCase):
         self.assertNotIn("L1=stop", output)
         self.assertNotIn("gate=closed", output)
 
+    def test_01_07_core_flow_jump(self):
+        output = self.run_command_file("tests/commands/01_core/01_07_flow_jump.txt")
+        self.assertIn("===== 01_07_flow_jump start =====", output)
+        self.assertIn("skip-branch", output)
+        self.assertIn("===== 01_07_flow_jump end =====", output)
+
+        self.assertNotIn("run-branch", output)
+        self.assertNotIn("else-branch", output)
+
+    def test_01_08_core_import_priority(self):
+        output = self.run_command_file("tests/commands/01_core/01_08_import_priority.txt")
+        self.assertIn("===== 01_08_import_priority start =====", output)
+        self.assertIn("qualified-command", output)
+        self.assertIn("default-eval=3", output)
+        self.assertIn("dt-eval=2024-01-02", output)
+        self.assertIn("===== 01_08_import_priority end =====", output)
+
+    def test_01_09_core_stream_mode(self):
+        output = self.run_command_file("tests/commands/01_core/01_09_stream.txt", "stream_mode=True")
+        self.assertIn("===== 01_09_stream start =====", output)
+        self.assertIn("stream-branch", output)
+        self.assertIn("===== 01_09_stream end =====", output)
+
+        self.assertNotIn("else-branch", output)
+        self.assertNotIn("after-quit", output)
+
+    def test_01_09_core_stream_stdin(self):
+        command_text = (PROJECT_ROOT / "tests/commands/01_core/01_09_stream.txt").read_text(encoding="utf-8")
+        output = self.run_command_file("-", stdin=command_text)
+        self.assertIn("===== 01_09_stream start =====", output)
+        self.assertIn("stream-branch", output)
+        self.assertIn("===== 01_09_stream end =====", output)
+
+        self.assertNotIn("else-branch", output)
+        self.assertNotIn("after-quit", output)
+
+    def test_01_10_core_pacing(self):
+        start_time = time.perf_counter()
+        output = self.run_command_file("tests/commands/01_core/01_10_pacing.txt", "READ_LINE_INTERVAL=1")
+        elapsed = time.perf_counter() - start_time
+        self.assertIn("===== 01_10_pacing start =====", output)
+        self.assertIn("count=10", output)
+        self.assertIn("===== 01_10_pacing end =====", output)
+
+        # set/print/if は待機しないため、READ_LINE_INTERVAL を行数分待たない
+        self.assertLess(elapsed, 15)
+
+    def test_01_12_core_read_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                output = self.run_command_file(
+                    "tests/commands/01_core/01_12_read_cache_parent.txt",
+                    "program_cache.disk=True",
+                    f"program_cache.dir={cache_dir}",
+                )
+                self.assertIn("===== 01_12_read_cache_parent start =====", output)
+                self.assertIn("[01_11_child] call=1", output)
+                self.assertIn("[01_11_child] call=2", output)
+                self.assertIn("[01_11_child] call=3", output)
+                self.assertIn("===== 01_12_read_cache_parent end =====", output)
+
+            cache_files = list(Path(cache_dir).glob("*.rpac"))
+            self.assertEqual(len(cache_files), 2, msg=f"{cache_files}")
+
+    def test_01_13_core_flow_loop(self):
+        output = self.run_command_file("tests/commands/01_core/01_13_flow_loop.txt")
+        self.assertIn("===== 01_13_flow_loop start =====", output)
+        self.assertIn("for=alice", output)
+        self.assertIn("for=carol", output)
+        self.assertIn("total=5050", output)
+        self.assertIn("while-count=3", output)
+        self.assertIn("repeat=1", output)
+        self.assertIn("repeat=2", output)
+        self.assertEqual(output.count("nested=x"), 2)
+        self.assertEqual(output.count("nested=y"), 2)
+        self.assertIn("===== 01_13_flow_loop end =====", output)
+
+        self.assertNotIn("for=bob", output)
+        self.assertNotIn("repeat=3", output)
+
+    def test_01_14_core_def_call(self):
+        output = self.run_command_file("tests/commands/01_core/01_14_def_call.txt")
+        self.assertIn("===== 01_14_def_call start =====", output)
+        self.assertIn("hello alice (hi)", output)
+        self.assertIn("hello bob (hey)", output)
+        self.assertIn("after-call name=global-name", output)
+        self.assertIn("greeted=bob", output)
+        self.assertEqual(output.count("countdown=3"), 2)
+        self.assertIn("===== 01_14_def_call end =====", output)
+
+    def test_01_15_core_interactive_flow(self):
+        output = self.run_interactive("tests/commands/01_core/01_15_interactive_flow.txt")
+        self.assertIn("===== 01_15_interactive_flow start =====", output)
+        self.assertIn("run-branch", output)
+        self.assertIn("nested-run", output)
+        self.assertIn("after-fi", output)
+        self.assertNotIn("skip-branch", output)
+        self.assertNotIn("inner-elif", output)
+        self.assertNotIn("inner-else", output)
+        self.assertNotIn("elif-after-match", output)
+        self.assertNotIn("else-branch", output)
+        self.assertNotIn("実行に失敗", output)
+        self.assertIn("===== 01_15_interactive_flow end =====", output)
+
+    def test_01_17_core_read_parallel(self):
+        started = time.perf_counter()
+        output = self.run_command_file("tests/commands/01_core/01_17_parallel_parent.txt")
+        elapsed = time.perf_counter() - started
+        self.assertIn("===== 01_17_parallel_parent start =====", output)
+        self.assertIn("[01_16_child_a] shared=yes parent=original", output)
+        self.assertIn("[01_16_child_b] shared=yes parent=original", output)
+        # 子シナリオは親が設定した値(モジュールの既定値ではない)で実行されること
+        self.assertIn("[01_16_child_c] default_wait_time=7 find_max_retry=42", output)
+        self.assertIn("merged result_a=done-a result_b=done-b result_c=done-c", output)
+        self.assertIn("merged parent_value=changed-by-b", output)
+        # 子シナリオが変更していない親の値はそのまま残ること
+        self.assertIn("parent default_wait_time=7 find_max_retry=42", output)
+        self.assertIn("parent shared=unset", output)
+        self.assertIn("===== 01_17_parallel_parent end =====", output)
+        # 3つの子シナリオ(各2秒)が重なって実行されること(順に実行すると6秒以上)
+        self.assertLess(elapsed, 6)
+        # 子シナリオで登録したシャットダウン処理はマージ前に実行されること
+        self.assertLess(output.index("[01_16_child_c] shutdown hook"), output.index("merged result_a="))
+
+    def test_01_17_core_read_parallel_thread_shutdown(self):
+        output = self.run_command_file("tests/commands/01_core/01_17_parallel_parent.txt", "parallel.mode=thread")
+        self.assertEqual(output.count("[01_16_child_c] shutdown hook"), 1)
+        self.assertLess(output.index("[01_16_child_c] shutdown hook"), output.index("merged result_a="))
+
+    def test_01_17_core_read_parallel_worker_log(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_path = Path(log_dir) / "trace.log"
+            output = self.run_command_file("tests/commands/01_core/01_17_parallel_parent.txt", f"fh.path={log_path}")
+            self.assertIn("===== 01_17_parallel_parent end =====", output)
+            # ワーカーは親とは別のファイル(プロセスIDを付けたパス)に出力すること
+            worker_logs = list(Path(log_dir).glob("trace.*.log"))
+            self.assertGreaterEqual(len(worker_logs), 1)
+            worker_text = "".join(path.read_text(encoding="utf-8") for path in worker_logs)
+            self.assertIn("[01_16_child_a]", worker_text)
+            self.assertIn("[01_16_child_b]", worker_text)
+            self.assertFalse(log_path.exists())
+
+    def test_01_17_core_profile_parallel_thread(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            json_path = Path(report_dir) / "profile.json"
+            output = self.run_command_file(
+                "tests/commands/01_core/01_17_parallel_parent.txt",
+                "parallel.mode=thread",
+                "profile.enabled=True",
+                f"profile.output={json_path}",
+            )
+            self.assertIn("===== 01_17_parallel_parent end =====", output)
+            report = json.loads(json_path.read_text(encoding="utf-8"))
+
+        # 同時に実行したスレッドの行の時間が互いに混ざらないこと
+        waits = [row for row in report["lines"] if row["line"] == "wait: 2"]
+        self.assertEqual(len(waits), 3)
+        for row in waits:
+            self.assertGreaterEqual(row["self"], 1.9)
+            self.assertLess(row["self"], 3)
+        parallel = next(row for row in report["lines"] if row["action"] == "readParallel")
+        self.assertGreaterEqual(parallel["total"], 1.9)
+        self.assertGreaterEqual(parallel["self"], 0)
+
+    def test_01_19_core_async_gather(self):
+        output = self.run_command_file("tests/commands/01_core/01_19_async_gather.txt", "async_mode=True")
+        self.assertIn("===== 01_19_async_gather start =====", output)
+        self.assertIn("hello async", output)
+        self.assertIn("[01_18_child_a] end returncode=0", output)
+        # child_aの待機中にchild_bが最後まで進むこと
+        order = [
+            output.index("[01_18_child_a] start"),
+            output.index("[01_18_child_b] start"),
+            output.index("[01_18_child_b] end"),
+            output.index("[01_18_child_a] end"),
+        ]
+        self.assertEqual(order, sorted(order))
+        self.assertIn("===== 01_19_async_gather end =====", output)
+
+    def test_01_19_core_gather_sequential(self):
+        output = self.run_command_file("tests/commands/01_core/01_19_async_gather.txt")
+        self.assertIn("hello async", output)
+        self.assertLess(output.index("[01_18_child_a] end"), output.index("[01_18_child_b] start"))
+        self.assertIn("===== 01_19_async_gather end =====", output)
+
+    def test_01_20_core_profile(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            json_path = Path(report_dir) / "profile.json"
+            output = self.run_command_file(
+                "tests/commands/01_core/01_20_profile.txt",
+                "profile.enabled=True",
+                f"profile.output={json_path}",
+            )
+            self.assertIn("===== 01_20_profile end =====", output)
+            self.assertIn("--- profile: lines", output)
+
+            report = json.loads(json_path.read_text(encoding="utf-8"))
+            lines = {row["location"].replace("\\", "/"): row for row in report["lines"]}
+            wait_row = lines["tests/commands/01_core/01_20_profile.txt:4"]
+            self.assertEqual(wait_row["count"], 3)
+            self.assertGreaterEqual(wait_row["self"], 0.3)
+            # readの行は呼び出し先の時間を自己時間に含まない
+            read_row = lines["tests/commands/01_core/01_20_profile.txt:6"]
+            self.assertLess(read_row["self"], read_row["total"])
+            self.assertEqual(report["lines"][0]["action"], "wait")
+            actions = {row["action"]: row for row in report["actions"]}
+            self.assertEqual(actions["wait"]["count"], 3)
+
+            csv_path = Path(report_dir) / "profile.csv"
+            self.run_command_file(
+                "tests/commands/01_core/01_20_profile.txt",
+                "profile.enabled=True",
+                f"profile.output={csv_path}",
+            )
+            header = csv_path.read_text(encoding="utf-8").splitlines()[0]
+            self.assertEqual(header, "kind,location,line,action,count,failures,total,self,mean,max")
+
+    def test_01_20_core_profile_actions(self):
+        for mode in ("False", "True"):
+            with self.subTest(async_mode=mode), tempfile.TemporaryDirectory() as report_dir:
+                stats_path = Path(report_dir) / "actions.pstats"
+                output = self.run_command_file(
+                    "tests/commands/01_core/01_20_profile.txt",
+                    f"async_mode={mode}",
+                    "profile.actions=d.wait",
+                    f"profile.actions_output={stats_path}",
+                )
+                self.assertIn("===== 01_20_profile end =====", output)
+                self.assertIn("--- profile: d.wait (cProfile", output)
+
+                stats = pstats.Stats(str(stats_path))
+                functions = {name for _, _, name in stats.stats}
+                self.assertTrue(any("sleep" in name for name in functions))
+                # 計測対象外のアクション(print)は含まない
+                self.assertNotIn("printAction", functions)
+
+        output = self.run_command_file(
+            "tests/commands/01_core/01_20_profile.txt",
+            "profile.actions=d.no_such_action",
+        )
+        self.assertIn("profile.actionsに存在しないコマンドが指定されています: d.no_such_action", output)
+
+    def test_01_20_core_profile_actions_parallel_thread(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            stats_path = Path(report_dir) / "actions.pstats"
+            output = self.run_command_file(
+                "tests/commands/01_core/01_17_parallel_parent.txt",
+                "parallel.mode=thread",
+                "profile.actions=d.wait",
+                f"profile.actions_output={stats_path}",
+            )
+            self.assertIn("===== 01_17_parallel_parent end =====", output)
+            self.assertIn("--- profile: d.wait (cProfile", output)
+            # 同時に実行した3つのwaitのうち、先に開始した1つのみ計測する
+            self.assertIn("profile: d.wait は他のアクションの計測中に実行されたため2回計測しませんでした", output)
+            stats = pstats.Stats(str(stats_path))
+            self.assertTrue(any("sleep" in name for _, _, name in stats.stats))
+
+    def test_01_21_core_instrumented_disabled(self):
+        output = self.run_command_file("tests/commands/01_core/01_01_basic.txt")
+        self.assertIn("Run    commandRPA", output)
+
+        output = self.run_command_file("tests/commands/01_core/01_01_basic.txt", "instrumented.enabled=False")
+        self.assertIn("===== 01_01_basic end =====", output)
+        self.assertNotIn("Run    commandRPA", output)
+
+    def test_01_22_core_elapsed_ticker(self):
+        output = self.run_command_file(
+            "tests/commands/01_core/01_22_elapsed_ticker.txt",
+            f"python={sys.executable}",
+            "ch.level=DEBUG",
+        )
+        self.assertIn("returncode=0", output)
+        self.assertIn("Elapsed time: execAction", output)
+        self.assertIn("===== 01_22_elapsed_ticker end =====", output)
+
+    def test_01_23_core_trace_events(self):
+        with tempfile.TemporaryDirectory() as trace_dir:
+            trace_path = Path(trace_dir) / "trace.json"
+            output = self.run_command_file(
+                "tests/commands/01_core/01_04_read_parent.txt",
+                "trace.enabled=True",
+                f"trace.output={trace_path}",
+            )
+            self.assertIn("===== 01_04_read_parent end =====", output)
+
+            trace = json.loads(trace_path.read_text(encoding="utf-8"))
+            events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+            names = {event["name"] for event in events}
+            self.assertIn("readAction", names)
+            self.assertIn("executeInstruction", names)
+            read_event = next(event for event in events if event["name"] == "readAction")
+            self.assertIn("01_03_read_child.txt", read_event["args"]["file_path_args"])
+            # 呼び出し先の命令はreadActionの時間内に収まる
+            children = [
+                event for event in events
+                if event["name"] == "executeInstruction"
+                and event["args"]["instruction"].startswith("<tests/commands/01_core/01_03_read_child.txt:")
+            ]
+            self.assertTrue(children)
+            for child in children:
+                self.assertGreaterEqual(child["ts"], read_event["ts"])
+                self.assertLessEqual(child["ts"] + child["dur"], read_event["ts"] + read_event["dur"] + 1)
+
+    def test_01_24_core_retry_backoff(self):
+        output = self.run_command_file(
+            "tests/commands/01_core/01_24_retry_backoff.txt",
+            "retry.max_count=3",
+            "retry.interval=0.05",
+            "retry.backoff=2",
+            "retry.summary=True",
+        )
+        self.assertIn("===== 01_24_retry_backoff start =====", output)
+        self.assertIn("--- retry summary (sorted by lost time) ---", output)
+        row = next(line for line in output.splitlines() if line.endswith("  module.playwrightActions.clickAction"))
+        lost, calls, retried, attempts, gave_up = row.split()[:5]
+        self.assertEqual((calls, retried, attempts, gave_up), ("1", "1", "4", "1"))
+        # 待機は0.05 + 0.1 + 0.2秒(backoff=2)
+        self.assertGreaterEqual(float(lost), 0.35)
+
+    def test_01_24_core_retry_summary_async(self):
+        output = self.run_command_file(
+            "tests/commands/01_core/01_24_retry_backoff.txt",
+            "async_mode=True",
+            "retry.max_count=2",
+            "retry.interval=0.05",
+            "retry.summary=True",
+        )
+        # 同名のアクションは同期版と非同期版を別の行に集計する
+        summary = output.split("--- retry summary (sorted by lost time) ---")[1]
+        rows = [line for line in summary.splitlines() if line.endswith(".clickAction")]
+        self.assertEqual(len(rows), 1)
+        self.assertTrue(rows[0].endswith("  module.playwrightAsyncActions.clickAction"))
+        self.assertEqual(rows[0].split()[1:5], ["1", "1", "3", "1"])
+
+    def test_01_24_core_retry_deadline(self):
+        output = self.run_command_file(
+            "tests/commands/01_core/01_24_retry_backoff.txt",
+            "retry.max_count=10",
+            "retry.interval=0.05",
+            "retry.backoff=2",
+            "retry.deadline=0.2",
+        )
+        self.assertIn("リトライの期限を超えるため中止します: clickAction (2回リトライ済み)", output)
+
+    def test_01_24_core_retry_metrics(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            metrics_path = Path(metrics_dir) / "metrics.prom"
+            output = self.run_command_file(
+                "tests/commands/01_core/01_24_retry_backoff.txt",
+                "retry.max_count=2",
+                "retry.interval=0.05",
+                "retry.backoff=2",
+                "metrics.enabled=True",
+                f"metrics.output={metrics_path}",
+            )
+            self.assertIn(f"metrics: {metrics_path}", output)
+
+            samples = {}
+            for line in metrics_path.read_text(encoding="utf-8").splitlines():
+                if line and not line.startswith("#"):
+                    name, value = line.rsplit(" ", 1)
+                    samples[name] = float(value)
+            click = 'module="module.playwrightActions",action="clickAction"'
+            self.assertEqual(samples[f"rpa_action_calls_total{{{click}}}"], 1)
+            self.assertEqual(samples[f"rpa_action_errors_total{{{click}}}"], 1)
+            self.assertEqual(samples[f"rpa_action_retries_total{{{click}}}"], 2)
+            self.assertEqual(samples[f"rpa_action_retry_gave_up_total{{{click}}}"], 1)
+            self.assertEqual(samples[f'rpa_action_duration_seconds_bucket{{{click},le="+Inf"}}'], 1)
+            self.assertGreaterEqual(samples[f"rpa_action_duration_seconds_sum{{{click}}}"], 0.15)
+            printed = 'module="module.defaultActions",action="printAction"'
+            self.assertEqual(samples[f"rpa_action_calls_total{{{printed}}}"], 1)
+            # 行の実行・ファイルの読み込みなどの内部処理は出力しない
+            actions = {name.split('action="')[1].split('"')[0] for name in samples}
+            self.assertFalse(actions & {"executeLine", "resolveCommand", "executeInstruction", "readFile", "getElement"})
+
+    def test_01_26_core_parallel_thread_scope(self):
+        output = self.run_command_file("tests/commands/01_core/01_26_scope_parallel.txt", "parallel.mode=thread")
+        self.assertIn("===== 01_26_scope_parallel start =====", output)
+        # 同時に実行した子シナリオのstdoutが互いに上書きされないこと
+        self.assertIn("[01_25_child_a] stdout=out-a", output)
+        self.assertIn("[01_25_child_b] stdout=out-b", output)
+        self.assertLess(output.index("[01_25_child_b] start"), output.index("[01_25_child_a] stdout="))
+        self.assertIn("merged result_a=done-a result_b=done-b", output)
+        self.assertIn("===== 01_26_scope_parallel end =====", output)
+
+    def test_01_27_core_gather_scope(self):
+        output = self.run_command_file("tests/commands/01_core/01_27_scope_gather.txt", "async_mode=True")
+        self.assertIn("===== 01_27_scope_gather start =====", output)
+        self.assertIn("[01_25_child_a] start tag=gather", output)
+        self.assertIn("[01_25_child_a] stdout=out-a", output)
+        self.assertIn("[01_25_child_b] stdout=out-b", output)
+        # key=valueは呼び出し元に残らず、子で設定した値のみ反映される
+        self.assertIn("merged result_a=done-a result_b=done-b tag=caller", output)
+        self.assertIn("===== 01_27_scope_gather end =====", output)
+
+    def test_01_27_core_gather_scope_sequential(self):
+        output = self.run_command_file("tests/commands/01_core/01_27_scope_gather.txt")
+        self.assertIn("[01_25_child_a] start tag=gather", output)
+        self.assertIn("merged result_a=done-a result_b=done-b tag=caller", output)
+        self.assertIn("===== 01_27_scope_gather end =====", output)
+
+    def test_01_28_core_parallel_thread_priority(self):
+        output = self.run_command_file("tests/commands/01_core/01_28_priority_parallel.txt", "parallel.mode=thread")
+        # 共有する命令列のコマンドは子シナリオごとのmodule_priorityで解決すること
+        self.assertIn("[01_28_d] eval=d", output)
+        self.assertIn("[01_28_dt] eval=dt", output)
+        self.assertIn("parent eval=d", output)
+        self.assertIn("===== 01_28_priority_parallel end =====", output)
+
     def test_02_01_params_cli_args(self):
         output = self.run_command_file(
             "tests/commands/02_params/02_01_cli_args.txt",
@@ -111,6 +550,133 @@ class Test0100CommandCases(unittest.TestCase):
         self.assertIn("input=from-default", output)
         self.assertIn("===== 02_02_input_default end =====", output)
 
+    def test_02_03_params_template(self):
+        output = self.run_command_file("tests/commands/02_params/02_03_template.txt")
+        self.assertIn("===== 02_03_template start =====", output)
+        self.assertIn("url=https://www.google.com", output)
+        self.assertIn("fallback=none-set", output)
+        self.assertIn("nested-default=google", output)
+        self.assertIn("multi=1-1-google", output)
+        self.assertIn("===== 02_03_template end =====", output)
+
+    def test_02_04_params_typed_set(self):
+        output = self.run_command_file("tests/commands/02_params/02_04_typed_set.txt")
+        self.assertIn("===== 02_04_typed_set start =====", output)
+        # 最初に設定した型で以降の値も変換する
+        self.assertIn("flag=False", output)
+        self.assertIn("flag=True", output)
+        self.assertIn("count=42", output)
+        self.assertIn("ratio=1.0", output)
+        self.assertIn("ratio=0.25", output)
+        self.assertIn("label=123", output)
+        self.assertIn("===== 02_04_typed_set end =====", output)
+
+    def test_02_05_params_tree(self):
+        output = self.run_command_file("tests/commands/02_params/02_05_param_tree.txt")
+        self.assertIn("===== 02_05_param_tree start =====", output)
+        self.assertIn("tree.b.c=2\ntree.b.d=3\ncount=2", output)
+        self.assertIn("tree.a=1\ntree.b.c=2\ntree.b.d=3\ncount=3", output)
+        self.assertIn("count=0", output)
+        # 区切り単位で一致を判定する
+        self.assertNotIn("treex=9", output)
+        self.assertIn("===== 02_05_param_tree end =====", output)
+
+    def test_02_06_params_snapshot_cache(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            cache_path = Path(work_dir) / "params.cache"
+            param_path = Path(work_dir) / "cache_test.yaml"
+            args = (f"param_file={param_path}", f"PARAM_CACHE_FILE={cache_path}")
+
+            param_path.write_text("cache_test:\n  value: first\n", encoding="utf-8")
+            output = self.run_command_file("tests/commands/02_params/02_06_param_cache.txt", *args)
+            self.assertIn("cached=first", output)
+            self.assertTrue(cache_path.is_file())
+            # loadで読み込んだファイルも終了時にまとめて保存されること
+            with open(cache_path, "rb") as f:
+                cached_files = pickle.load(f)["files"]
+            self.assertIn(str(param_path.resolve()), cached_files)
+
+            # キャッシュから読み込む
+            output = self.run_command_file("tests/commands/02_params/02_06_param_cache.txt", *args)
+            self.assertIn("cached=first", output)
+
+            # 変更したファイルのみ解析し直す
+            param_path.write_text("cache_test:\n  value: second-value\n", encoding="utf-8")
+            output = self.run_command_file("tests/commands/02_params/02_06_param_cache.txt", *args)
+            self.assertIn("cached=second-value", output)
+
+    def test_02_07_params_prompt_write_back(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            param_path = Path(work_dir) / "prompt_test.yaml"
+            param_path.write_text(
+                "prompt_test:\n  # 入力を求める\n  name: '?'\n  url: https://example.com/?q=1\n",
+                encoding="utf-8",
+            )
+            args = (f"param_file={param_path}", f"PARAM_CACHE_FILE={Path(work_dir) / 'params.cache'}")
+            output = self.run_command_file("tests/commands/02_params/02_07_param_prompt.txt", *args, stdin="answered\n")
+            self.assertIn("name=answered", output)
+            self.assertIn("url=https://example.com/?q=1", output)
+
+            # 入力した値はコメントを保持して書き戻す
+            rewritten = param_path.read_text(encoding="utf-8")
+            self.assertIn("# 入力を求める", rewritten)
+            self.assertIn("name: 'answered'", rewritten)
+
+            output = self.run_command_file("tests/commands/02_params/02_07_param_prompt.txt", *args)
+            self.assertIn("name=answered", output)
+
+    def test_02_08_params_hot_reload(self):
+        with tempfile.TemporaryDirectory() as param_dir:
+            param_path = Path(param_dir) / "reload_test.yaml"
+            param_path.write_text("reload_test:\n  value: before\n  other: kept\n", encoding="utf-8")
+            output = self.run_command_file(
+                "tests/commands/02_params/02_08_param_reload.txt",
+                f"python={sys.executable}",
+                f"param_file={param_path}",
+                f"param_reload.folder={param_dir}",
+                "param_reload.enabled=True",
+                "param_reload.interval=0.1",
+                "param_reload.debounce=0.2",
+            )
+            self.assertIn("before=before", output)
+            self.assertIn("after=after", output)
+            self.assertIn("other=kept", output)
+            # 値が変わった項目のみ反映する
+            self.assertIn("パラメータを再読込しました", output)
+            self.assertIn("(reload_test.value)", output)
+            self.assertIn("===== 02_08_param_reload end =====", output)
+
+    def test_02_09_params_load_replace(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            old_path = Path(work_dir) / "replace_old.yaml"
+            new_path = Path(work_dir) / "replace_new.yaml"
+            # 文字列でない最上位のキー(数値・日付)も読み込めること
+            old_path.write_text(
+                "replace_test:\n  a: old-a\n  b: old-b\n1: one\n2024-01-01: new-year\n",
+                encoding="utf-8",
+            )
+            new_path.write_text(
+                "replace_test:\n  a: new-a\n  c: new-c\n1:\n  x: one-x\n2024-01-01:\n  x: new-year-x\n",
+                encoding="utf-8",
+            )
+            output = self.run_command_file(
+                "tests/commands/02_params/02_09_param_replace.txt",
+                f"old_file={old_path}",
+                f"new_file={new_path}",
+            )
+            self.assertIn("===== 02_09_param_replace start =====", output)
+            self.assertIn("old a=old-a b=old-b", output)
+            # replaceを指定しない場合はファイルにない項目を残す
+            self.assertIn("merged a=new-a b=old-b", output)
+            # replace=Trueの場合は最上位のキー配下を置き換える
+            self.assertIn("replaced a=new-a b=removed c=new-c", output)
+            # 文字列でない最上位のキーの値もreplace=Trueで削除される
+            self.assertIn("old int_key=True", output)
+            self.assertIn("old date_key=True", output)
+            self.assertIn("replaced int_key=False int_child=one-x", output)
+            self.assertIn("replaced date_key=False date_child=new-year-x", output)
+            self.assertIn("===== 02_09_param_replace end =====", output)
+
     def test_03_01_reserved_clip(self):
         expected = "clip-from-test"
         try:
@@ -123,6 +689,24 @@ class Test0100CommandCases(unittest.TestCase):
         self.assertIn(f"clip={expected}", output)
         self.assertIn("===== 03_01_clip end =====", output)
 
+    def test_03_02_reserved_clip_cache(self):
+        expected = "clip-cache-test"
+        try:
+            pyperclip.copy(expected)
+        except pyperclip.PyperclipException as e:
+            self.skipTest(f"Clipboard is not available in this environment: {e}")
+
+        output = self.run_command_file(
+            "tests/commands/03_reserved/03_02_clip_cache.txt",
+            f"python={sys.executable}",
+            "clip_cache_ttl=60",
+        )
+        self.assertIn("===== 03_02_clip_cache start =====", output)
+        self.assertIn(f"first={expected} again={expected}", output)
+        # cmdの実行後はキャッシュの有効期間内でもクリップボードを読み直すこと
+        self.assertIn("after=clip-after-cmd", output)
+        self.assertIn("===== 03_02_clip_cache end =====", output)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)